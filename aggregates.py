@@ -0,0 +1,270 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from ingestion import FrameCache
+
+
+# Dimensiones del cubo de conteos
+dimensiones_cubo = ["YEAR", "COUNTRY", "STATE NUMBER", "KIT", "Intervenciones", "Explantaciones"]
+
+
+# Etiquetas ordenadas de una dimensión y código de cada fila (los valores vacíos van al final)
+def _codificar(serie):
+    codes, uniques = pd.factorize(serie, sort=True, use_na_sentinel=True)
+    etiquetas = list(uniques)
+    if (codes < 0).any():
+        codes = np.where(codes < 0, len(etiquetas), codes)
+        etiquetas.append(np.nan)
+    return codes, pd.Index(etiquetas)
+
+
+# Unión de etiquetas de dos ejes, ordenada y con el valor vacío al final
+def _unir_etiquetas(a, b):
+    valores = list(dict.fromkeys(v for v in list(a) + list(b) if pd.notna(v)))
+    try:
+        valores = sorted(valores)
+    except TypeError:
+        pass
+    if a.hasnans or b.hasnans:
+        valores.append(np.nan)
+    return pd.Index(valores)
+
+
+# Cubo denso de conteos de casos: un eje por dimensión. Los gráficos de resumen y los
+# filtros globales se responden recortando y sumando el cubo, sin recorrer el registro.
+class CountCube:
+    def __init__(self, counts, labels):
+        self.counts = counts
+        self.labels = labels
+        self.dims = list(labels)
+
+    @classmethod
+    def from_frame(cls, df, dims=dimensiones_cubo):
+        codes, labels = [], {}
+        for dim in dims:
+            serie = df[dim] if dim in df.columns else pd.Series(np.nan, index=df.index)
+            c, etiquetas = _codificar(serie)
+            codes.append(c)
+            labels[dim] = etiquetas.rename(dim)
+        shape = tuple(len(labels[dim]) for dim in dims)
+        if len(df) == 0:
+            return cls(np.zeros(shape, dtype=np.int64), labels)
+        flat = np.ravel_multi_index(codes, shape)
+        counts = np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape)
+        return cls(counts, labels)
+
+    @property
+    def nbytes(self):
+        return self.counts.nbytes
+
+    def total(self):
+        return int(self.counts.sum())
+
+    # Subcubo con solo los valores indicados en cada dimensión: {"COUNTRY": [...], "YEAR": [...]}
+    def seleccionar(self, filtros):
+        counts, labels = self.counts, dict(self.labels)
+        for dim, valores in filtros.items():
+            eje = self.dims.index(dim)
+            posiciones = np.flatnonzero(labels[dim].isin(valores))
+            counts = np.take(counts, posiciones, axis=eje)
+            labels[dim] = labels[dim][posiciones]
+        return CountCube(counts, labels)
+
+    # Conteos por las dimensiones indicadas (como un groupby(...).size(): sin valores
+    # vacíos en esas dimensiones ni combinaciones sin casos)
+    def sumar(self, dims):
+        dims = list(dims)
+        otros = tuple(i for i, dim in enumerate(self.dims) if dim not in dims)
+        arr = self.counts.sum(axis=otros)
+        conservados = [dim for dim in self.dims if dim in dims]
+        arr = np.moveaxis(arr, [conservados.index(dim) for dim in dims], range(len(dims)))
+
+        if len(dims) == 1:
+            index = self.labels[dims[0]]
+        else:
+            index = pd.MultiIndex.from_product([self.labels[dim] for dim in dims], names=dims)
+        serie = pd.Series(arr.ravel(), index=index)
+
+        mascara = serie.to_numpy() > 0
+        for nivel in range(len(dims)):
+            mascara &= pd.notna(index.get_level_values(nivel))
+        return serie[mascara]
+
+    # Suma (o resta, con signo=-1) de otro cubo con las mismas dimensiones. Las etiquetas
+    # nuevas se añaden a cada eje; se usa para actualizar el cubo con las filas que cambian.
+    def combinar(self, otro, signo=1):
+        labels = {dim: _unir_etiquetas(self.labels[dim], otro.labels[dim]).rename(dim) for dim in self.dims}
+        shape = tuple(len(labels[dim]) for dim in self.dims)
+        counts = np.zeros(shape, dtype=np.int64)
+        for cubo, factor in ((self, 1), (otro, signo)):
+            posiciones = [labels[dim].get_indexer(cubo.labels[dim]) for dim in self.dims]
+            counts[np.ix_(*posiciones)] += factor * cubo.counts
+        return CountCube(counts, labels)
+
+    # Valores con casos en una dimensión (opciones de los filtros)
+    def valores(self, dim):
+        return self.sumar([dim]).index.tolist()
+
+
+cube_cache = FrameCache()
+
+
+def get_count_cube(version, df, cache=cube_cache):
+    return cache.get_or_compute(version, lambda: CountCube.from_frame(df))
+
+
+# Códigos enteros de periodo de una columna de fechas (vacío si no hay fecha): meses desde el año 0
+# (año * 12 + mes - 1) y semanas desde la época, empezando en lunes
+def codigo_mes(fechas):
+    return fechas.dt.year * 12 + fechas.dt.month - 1
+
+
+def codigo_semana(fechas):
+    dias = (fechas - pd.Timestamp("1970-01-01")).dt.days
+    return (dias + 3) // 7
+
+
+# Etiquetas de los periodos: "2023-01", "2023Q1", "2023" y el lunes de la semana "2023-01-02"
+def _etiquetas_periodo(codigos, periodo):
+    codigos = np.asarray(codigos, dtype=np.int64)
+    if periodo == "W":
+        lunes = np.datetime64("1970-01-01") + (codigos * 7 - 3).astype("timedelta64[D]")
+        return [str(d) for d in lunes]
+    if periodo == "Q":
+        return [f"{c // 4}Q{c % 4 + 1}" for c in codigos]
+    if periodo == "Y":
+        return [str(c) for c in codigos]
+    return [f"{c // 12}-{c % 12 + 1:02d}" for c in codigos]
+
+
+# Dimensiones de los cubos del calendario (además del periodo)
+dimensiones_calendario = ["COUNTRY", "YEAR", "Intervenciones"]
+
+
+# Conteos de casos e intervenciones por periodo de la fecha del TAC (DATE) y país: un cubo mensual
+# y otro semanal con ejes de códigos enteros, más el año del registro para los filtros. Los
+# trimestres y años se obtienen sumando meses; el mapa de calor y las líneas de evolución anual
+# leen del mismo almacén. Se actualiza sumando y restando los cubos de las filas que cambian.
+class CalendarCounts:
+    def __init__(self, mensual, semanal):
+        self.mensual = mensual
+        self.semanal = semanal
+
+    @classmethod
+    def from_frame(cls, df):
+        fechas = df["DATE"] if "DATE" in df.columns else pd.Series(pd.NaT, index=df.index)
+        fechas = pd.to_datetime(fechas, errors="coerce")
+        base = pd.DataFrame({dim: df[dim] for dim in dimensiones_calendario if dim in df.columns}, index=df.index)
+        mensual = CountCube.from_frame(base.assign(MES=codigo_mes(fechas)), ["MES"] + dimensiones_calendario)
+        semanal = CountCube.from_frame(base.assign(SEMANA=codigo_semana(fechas)), ["SEMANA"] + dimensiones_calendario)
+        return cls(mensual, semanal)
+
+    @property
+    def nbytes(self):
+        return self.mensual.nbytes + self.semanal.nbytes
+
+    def seleccionar(self, filtros):
+        return CalendarCounts(self.mensual.seleccionar(filtros), self.semanal.seleccionar(filtros))
+
+    def combinar(self, otro, signo=1):
+        return CalendarCounts(self.mensual.combinar(otro.mensual, signo), self.semanal.combinar(otro.semanal, signo))
+
+    # Casos e intervenciones por periodo (filas, con fecha) y país (columnas), como arrays densos
+    def _periodo_pais(self, periodo):
+        cubo = self.semanal if periodo == "W" else self.mensual
+        dim = cubo.dims[0]
+        # Ejes: periodo, país, indicador de intervención (se suma el año)
+        counts = cubo.counts.sum(axis=cubo.dims.index("YEAR"))
+        periodos, paises = cubo.labels[dim], cubo.labels["COUNTRY"]
+        validos = np.flatnonzero(pd.notna(periodos))
+        counts = counts[validos][:, np.flatnonzero(pd.notna(paises))]
+        codigos = periodos[validos].to_numpy().astype(np.int64)
+        if periodo in ("Q", "Y"):
+            codigos = codigos // (3 if periodo == "Q" else 12)
+            codigos, grupos = np.unique(codigos, return_inverse=True)
+            agrupados = np.zeros((len(codigos),) + counts.shape[1:], dtype=counts.dtype)
+            np.add.at(agrupados, np.ravel(grupos), counts)
+            counts = agrupados
+        intervenidos = cubo.labels["Intervenciones"].get_indexer([1])[0]
+        intervenciones = counts[..., intervenidos] if intervenidos >= 0 else np.zeros(counts.shape[:2], dtype=counts.dtype)
+        return codigos, paises[pd.notna(paises)], counts.sum(axis=-1), intervenciones
+
+    # Intervenciones por periodo ("W", "M", "Q" o "Y") y país: solo los periodos con casos y los países
+    # con alguna intervención (como la tabla dinámica que sustituye)
+    def matriz(self, periodo="M"):
+        codigos, paises, casos, intervenciones = self._periodo_pais(periodo)
+        filas = casos.sum(axis=1) > 0
+        columnas = intervenciones.sum(axis=0) != 0
+        return pd.DataFrame(intervenciones[filas][:, columnas],
+                            index=pd.Index(_etiquetas_periodo(codigos[filas], periodo), name="Periodo"),
+                            columns=pd.Index(paises[columnas], name="COUNTRY"))
+
+    # Casos (o intervenciones) por año del registro y país, como CountCube.sumar(["YEAR", "COUNTRY"])
+    def anual(self, solo_intervenciones=False):
+        cubo = self.mensual.seleccionar({"Intervenciones": [1]}) if solo_intervenciones else self.mensual
+        return cubo.sumar(["YEAR", "COUNTRY"])
+
+
+calendar_cache = FrameCache()
+
+
+def get_calendar_counts(version, df, cache=calendar_cache):
+    return cache.get_or_compute(version, lambda: CalendarCounts.from_frame(df))
+
+
+# Columnas de medida con su matriz año × medida
+columnas_medida = ["b (screw length)", "a (elevator plate)"]
+
+
+class MatrizMedidas(NamedTuple):
+    conteos: pd.DataFrame  # años (filas) × medidas (columnas), casos con cada medida
+    totales: pd.Series  # casos por año (con y sin medida)
+    desconocidos: pd.Series  # casos por año sin medida
+
+
+# Conteos de casos por país, año y medida de tornillo y de placa: un cubo por columna de medida,
+# calculado en una pasada por versión. Con los filtros aplicados, la matriz año × medida responde
+# la frecuencia de cada medida, su evolución anual y los datos desconocidos sin recorrer el registro.
+class SizeCounts:
+    def __init__(self, cubos):
+        self.cubos = cubos  # columna de medida -> CountCube (COUNTRY, YEAR, medida)
+
+    @classmethod
+    def from_frame(cls, df, columnas=columnas_medida):
+        return cls({col: CountCube.from_frame(df, ["COUNTRY", "YEAR", col]) for col in columnas if col in df.columns})
+
+    @property
+    def nbytes(self):
+        return sum(cubo.nbytes for cubo in self.cubos.values())
+
+    def seleccionar(self, filtros):
+        return SizeCounts({col: cubo.seleccionar(filtros) for col, cubo in self.cubos.items()})
+
+    def combinar(self, otro, signo=1):
+        return SizeCounts({col: cubo.combinar(otro.cubos[col], signo) for col, cubo in self.cubos.items()})
+
+    # Casos por medida (con medida, de cualquier año), ordenados por medida
+    def frecuencia(self, columna):
+        return self.cubos[columna].sumar([columna]).rename("count").rename_axis(columna)
+
+    # Matriz año × medida de los años con casos, con los totales y los casos sin medida de cada año
+    def matriz(self, columna):
+        cubo = self.cubos[columna]
+        counts = cubo.counts.sum(axis=cubo.dims.index("COUNTRY"))
+        anios, medidas = cubo.labels["YEAR"], cubo.labels[columna]
+        filas = np.flatnonzero(pd.notna(anios) & (counts.sum(axis=1) > 0))
+        conocidas = np.flatnonzero(pd.notna(medidas))
+        counts = counts[filas]
+        index = pd.Index(anios[filas], name="YEAR")
+        totales = pd.Series(counts.sum(axis=1), index=index, name="total_cases")
+        return MatrizMedidas(pd.DataFrame(counts[:, conocidas], index=index, columns=medidas[conocidas]),
+                             totales, totales - counts[:, conocidas].sum(axis=1))
+
+
+size_cache = FrameCache()
+
+
+def get_size_counts(version, df, cache=size_cache):
+    return cache.get_or_compute(version, lambda: SizeCounts.from_frame(df))
@@ -0,0 +1,386 @@
+# Cálculos del dashboard como funciones puras: reciben el registro normalizado (o el cubo de
+# conteos / el índice de incidencias) y devuelven DataFrames o tuplas con nombre, sin Streamlit.
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from comparisons import compare_groups
+from correlations import correlation_matrix
+from funnel import conversion_funnel, tiempo_en_etapa
+from ingestion import FrameCache
+from resampling import correlacion_remuestreo, diferencia_medias_remuestreo
+from survival import duraciones, kaplan_meier
+
+
+variables_anatomicas = ["Índice de Haller", "Índice de Asimetría", "Índice de Corrección",
+                        "Rotación Esternal", "Elevación Potencial", "Anchura del Esternón (mínima)",
+                        "Anchura del Esternón (máxima)", "Densidad Esternal", "Densidad Cortical Esternal (superior)",
+                        "Densidad Cortical Esternal (inferior)"]
+
+variables_interes = ['Índice de Asimetría', 'Índice de Haller', 'Índice de Corrección', 'Rotación Esternal',
+                     'Densidad Esternal', 'Densidad Cortical Esternal (superior)', 'Densidad Cortical Esternal (inferior)',
+                     'b (screw length)', 'a (elevator plate)', 'Anchura del Esternón (mínima)',
+                     'Anchura del Esternón (máxima)', 'Elevación Potencial', 'Edad', 'Efectividad']
+
+correlation_pairs = [("Índice de Haller", "Elevación Potencial"),
+                     ("Índice de Asimetría", "Rotación Esternal"),
+                     ("Densidad Esternal", "Edad"),
+                     ("Efectividad", "Índice de Haller"),
+                     ("Efectividad", "Rotación Esternal")]
+
+
+# Resumen general
+
+class EstadoCasos(NamedTuple):
+    totales: pd.Series  # casos por estado, de mayor a menor
+    por_anio: pd.DataFrame  # YEAR, STATE NUMBER, Informes
+
+
+def estado_casos(cubo):
+    return EstadoCasos(cubo.sumar(["STATE NUMBER"]).sort_values(ascending=False),
+                       cubo.sumar(["YEAR", "STATE NUMBER"]).reset_index(name="Informes"))
+
+
+class EvolucionAnual(NamedTuple):
+    casos: pd.DataFrame  # YEAR, Casos, percentage (respecto al total de todos los años)
+    intervenciones: pd.DataFrame
+    explantaciones: pd.DataFrame
+
+
+def _por_anio(cubo):
+    conteos = cubo.sumar(["YEAR"]).reset_index(name="Casos")
+    conteos["percentage"] = (conteos["Casos"] / conteos["Casos"].sum()) * 100
+    return conteos
+
+
+def evolucion_anual(cubo):
+    return EvolucionAnual(_por_anio(cubo),
+                          _por_anio(cubo.seleccionar({"Intervenciones": [1]})),
+                          _por_anio(cubo.seleccionar({"Explantaciones": [1]})))
+
+
+class UsoKits(NamedTuple):
+    conteos: pd.Series  # casos por kit, de mayor a menor
+    por_estado: pd.DataFrame  # kits × estados
+    resumen: pd.DataFrame  # "n (p%)" por estado (filas) y kit (columnas)
+
+
+def uso_kits(cubo):
+    conteos = cubo.sumar(["KIT"]).sort_values(ascending=False)
+    por_estado = cubo.sumar(["KIT", "STATE NUMBER"]).unstack().fillna(0)
+    porcentajes = por_estado.div(por_estado.sum(axis=1), axis=0) * 100
+    texto = por_estado.astype(int).astype(str) + porcentajes.map(lambda p: f" ({p:.1f}%)")
+    resumen = texto.T
+    resumen.index = [f"Estado {estado}" for estado in resumen.index]
+    resumen.columns = [f"Kit {kit}" for kit in resumen.columns]
+    return UsoKits(conteos, por_estado, resumen)
+
+
+class FrecuenciaMedidas(NamedTuple):
+    tornillos: pd.Series  # casos por medida de tornillo, ordenados por medida
+    placas: pd.Series
+
+
+def frecuencia_medidas(medidas):
+    return FrecuenciaMedidas(medidas.frecuencia("b (screw length)"), medidas.frecuencia("a (elevator plate)"))
+
+
+# Casos por año con una medida concreta y su porcentaje sobre el total de casos del año (una
+# columna de la matriz año × medida)
+def evolucion_medida(medidas, columna, valor, nombre="count"):
+    matriz = medidas.matriz(columna)
+    conteos = matriz.conteos[valor] if valor in matriz.conteos.columns else pd.Series(0, index=matriz.totales.index)
+    conteos = pd.DataFrame({nombre: conteos.to_numpy(), "total_cases": matriz.totales.to_numpy()},
+                           index=matriz.totales.index)[conteos.to_numpy() > 0].reset_index()
+    conteos["percentage"] = (conteos[nombre] / conteos["total_cases"]) * 100
+    return conteos
+
+
+class DatosDesconocidos(NamedTuple):
+    tornillos: pd.DataFrame  # YEAR, known_cases, total_cases, unknown_cases, known/unknown_percentage
+    placas: pd.DataFrame
+
+
+def _conocidos_por_anio(matriz):
+    resultado = pd.DataFrame({"YEAR": matriz.totales.index,
+                              "known_cases": (matriz.totales - matriz.desconocidos).to_numpy(),
+                              "total_cases": matriz.totales.to_numpy(),
+                              "unknown_cases": matriz.desconocidos.to_numpy()})
+    resultado["known_percentage"] = (resultado["known_cases"] / resultado["total_cases"]) * 100
+    resultado["unknown_percentage"] = 100 - resultado["known_percentage"]
+    return resultado
+
+
+def datos_desconocidos(medidas):
+    return DatosDesconocidos(_conocidos_por_anio(medidas.matriz("b (screw length)")),
+                             _conocidos_por_anio(medidas.matriz("a (elevator plate)")))
+
+
+# Análisis comercial
+
+class Conversion(NamedTuple):
+    por_pais: pd.DataFrame  # COUNTRY, Informes Generados, Intervenciones, Tasa de Conversión
+    tasa_general: float  # porcentaje de informes con intervención
+
+
+def conversion(cubo):
+    casos = cubo.sumar(["COUNTRY"])
+    intervenciones = cubo.seleccionar({"Intervenciones": [1]}).sumar(["COUNTRY"]).reindex(casos.index, fill_value=0)
+    por_pais = pd.DataFrame({"Informes Generados": casos, "Intervenciones": intervenciones})
+    por_pais["Tasa de Conversión"] = por_pais["Intervenciones"] / por_pais["Informes Generados"]
+    total = cubo.total()
+    tasa = intervenciones.sum() / total * 100 if total > 0 else 0
+    return Conversion(por_pais.rename_axis("COUNTRY").reset_index(), tasa)
+
+
+# Embudo de conversión por estado del caso (desde el cubo), total o por país/año/kit
+def embudo_conversion(cubo, por=None):
+    return conversion_funnel(cubo, por)
+
+
+# Días entre las etapas del embudo que tienen fecha, total o por país/año/kit
+def tiempos_embudo(df, por=None):
+    return tiempo_en_etapa(df, por)
+
+
+# Intervenciones por periodo del TAC ("W", "M" o "Q"; filas) y país (columnas), sin países sin
+# intervenciones, a partir del almacén de conteos por calendario
+def intervenciones_por_periodo(calendario, periodo="M"):
+    return calendario.matriz(periodo)
+
+
+class TiemposTAC(NamedTuple):
+    tiempos: pd.DataFrame  # casos con ambas fechas: DATE, SURGERY DATE, Tiempo TAC a Intervención, COUNTRY, STATE NUMBER
+    positivos: pd.DataFrame  # tiempo > 0
+    negativos: pd.DataFrame  # tiempo < 0: informes TAC realizados después de la cirugía
+
+
+def tiempos_tac_intervencion(df):
+    fechas = df.dropna(subset=["DATE", "SURGERY DATE"])
+    tiempos = fechas[["DATE", "SURGERY DATE"]].assign(
+        **{"Tiempo TAC a Intervención": (fechas["SURGERY DATE"] - fechas["DATE"]).dt.days,
+           "COUNTRY": fechas["COUNTRY"], "STATE NUMBER": fechas["STATE NUMBER"]})
+    dias = tiempos["Tiempo TAC a Intervención"]
+    return TiemposTAC(tiempos, tiempos[dias > 0], tiempos[dias < 0])
+
+
+# Fecha de corte del registro para censurar: la del último informe (DATE), sin pasar de hoy. Las
+# cirugías y explantaciones programadas llevan fechas posteriores y no marcan el corte.
+def fecha_corte(df, hoy=None):
+    if "DATE" not in df.columns:
+        return pd.NaT
+    ultima = pd.to_datetime(df["DATE"], errors="coerce").max()
+    hoy = pd.Timestamp.today().normalize() if hoy is None else pd.Timestamp(hoy)
+    return min(ultima, hoy) if pd.notna(ultima) else pd.NaT
+
+
+# Curvas de Kaplan-Meier del tiempo entre dos fechas (TAC -> intervención, intervención -> explantación).
+# Los casos sin la fecha final se censuran en la fecha de corte en lugar de descartarse.
+def tiempo_hasta_evento(df, inicio, fin, corte, por_pais=False):
+    if inicio not in df.columns or fin not in df.columns:
+        return kaplan_meier([], [])
+    dias, evento, validos = duraciones(df[inicio], df[fin], corte)
+    estratos = df["COUNTRY"].astype(object).to_numpy()[validos] if por_pais and "COUNTRY" in df.columns else None
+    return kaplan_meier(dias[validos], evento[validos], estratos)
+
+
+# Análisis técnico
+
+class Estadisticas(NamedTuple):
+    media: float
+    desviacion: float
+    minimo: float
+    maximo: float
+    asimetria: float
+    curtosis: float
+
+
+def estadisticas_variable(serie):
+    from scipy.stats import kurtosis, skew
+
+    valores = serie.dropna().astype(float)
+    return Estadisticas(valores.mean(), valores.std(), valores.min(), valores.max(),
+                        skew(valores), kurtosis(valores))
+
+
+# Todas las parejas de variables a la vez: r, n, p-valor e intervalo de confianza (CorrelationMatrix)
+def matriz_correlacion(df, variables=variables_interes, metodo="pearson"):
+    return correlation_matrix(df, variables, metodo)
+
+
+# Interpretación de la correlación de Pearson según Taylor (1990)
+def interpretar_correlacion(r):
+    r = abs(r)
+    if r >= 0.80:
+        return "Muy fuerte"
+    if r >= 0.60:
+        return "Fuerte"
+    if r >= 0.40:
+        return "Moderada"
+    if r >= 0.20:
+        return "Débil"
+    return "Muy débil"
+
+
+class Correlacion(NamedTuple):
+    x: str
+    y: str
+    datos: pd.DataFrame  # pares completos (sin vacíos)
+    r: float
+    p_valor: float
+    n: int
+    interpretacion: str
+    ic_inferior: float = np.nan
+    ic_superior: float = np.nan
+
+
+# Correlación de una pareja; si ya se tiene la matriz de correlaciones se leen de ella r, p e IC
+def correlacion_par(df, x, y, matriz=None):
+    datos = df[[x, y]].apply(pd.to_numeric, errors='coerce').dropna()
+    if len(datos) < 2:
+        return Correlacion(x, y, datos, np.nan, np.nan, len(datos), "")
+    if matriz is None or x not in matriz.r.index or y not in matriz.r.index:
+        matriz = correlation_matrix(datos, [x, y])
+    par = matriz.par(x, y)
+    return Correlacion(x, y, datos, float(par["r"]), float(par["p_valor"]), par["n"],
+                       interpretar_correlacion(par["r"]), float(par["ic_inferior"]), float(par["ic_superior"]))
+
+
+# Gráficos agregados en el servidor: al navegador solo llegan los conteos por intervalo, los
+# cuantiles de la caja y una muestra de los puntos, no la columna completa
+
+class Histograma(NamedTuple):
+    conteos: np.ndarray
+    bordes: np.ndarray  # len(conteos) + 1
+    caja: dict  # q1, median, q3, lowerfence, upperfence, mean (como los calcula plotly)
+    atipicos: np.ndarray  # valores fuera de los bigotes
+    n: int
+
+
+def histograma(serie, nbins=20, max_atipicos=500):
+    valores = pd.to_numeric(serie, errors='coerce').dropna().to_numpy(np.float64)
+    if len(valores) == 0:
+        return Histograma(np.zeros(0, dtype=np.int64), np.zeros(1), {}, valores, 0)
+    conteos, bordes = np.histogram(valores, bins=nbins)
+    q1, mediana, q3 = np.quantile(valores, [0.25, 0.5, 0.75])
+    rango = q3 - q1
+    dentro = valores[(valores >= q1 - 1.5 * rango) & (valores <= q3 + 1.5 * rango)]
+    caja = {"q1": q1, "median": mediana, "q3": q3, "lowerfence": dentro.min(), "upperfence": dentro.max(),
+            "mean": valores.mean()}
+    atipicos = valores[(valores < caja["lowerfence"]) | (valores > caja["upperfence"])]
+    if len(atipicos) > max_atipicos:
+        atipicos = np.random.default_rng(0).choice(atipicos, max_atipicos, replace=False)
+    return Histograma(conteos, bordes, caja, atipicos, len(valores))
+
+
+# Muestra que conserva la densidad: cada celda de una rejilla 2D aporta puntos en proporción a los
+# que tiene, con al menos uno por celda ocupada para no perder las zonas poco pobladas
+def submuestreo(datos, x, y, max_puntos=5000, celdas=64, seed=0):
+    if len(datos) <= max_puntos:
+        return datos
+    rng = np.random.default_rng(seed)
+    valores_x = datos[x].to_numpy(np.float64)
+    valores_y = datos[y].to_numpy(np.float64)
+    cx = np.digitize(valores_x, np.histogram_bin_edges(valores_x, celdas)[1:-1])
+    cy = np.digitize(valores_y, np.histogram_bin_edges(valores_y, celdas)[1:-1])
+    celda = cx * celdas + cy
+    # Orden aleatorio dentro de cada celda: se conservan los primeros de cada una
+    orden = np.lexsort((rng.random(len(datos)), celda))
+    celda_ordenada = celda[orden]
+    inicio = np.r_[0, np.flatnonzero(np.diff(celda_ordenada)) + 1]
+    tamanos = np.diff(np.r_[inicio, len(orden)])
+    posicion = np.arange(len(orden)) - np.repeat(inicio, tamanos)
+    cupo = np.maximum(1, np.round(tamanos * max_puntos / len(datos))).astype(np.int64)
+    elegidos = np.sort(orden[posicion < np.repeat(cupo, tamanos)])
+    return datos.iloc[elegidos]
+
+
+class AjusteOLS(NamedTuple):
+    pendiente: float
+    ordenada: float
+    r2: float
+    x: np.ndarray  # extremos de la recta (mínimo y máximo de x)
+    y: np.ndarray
+
+
+# Recta de mínimos cuadrados y = pendiente·x + ordenada (la misma que trendline="ols")
+def ajuste_ols(datos, x, y):
+    vx = datos[x].to_numpy(np.float64)
+    vy = datos[y].to_numpy(np.float64)
+    if len(vx) < 2 or np.ptp(vx) == 0:
+        return AjusteOLS(np.nan, np.nan, np.nan, np.array([]), np.array([]))
+    pendiente, ordenada = np.polyfit(vx, vy, 1)
+    residuos = vy - (pendiente * vx + ordenada)
+    total = ((vy - vy.mean()) ** 2).sum()
+    r2 = 1 - (residuos ** 2).sum() / total if total > 0 else np.nan
+    extremos = np.array([vx.min(), vx.max()])
+    return AjusteOLS(float(pendiente), float(ordenada), float(r2), extremos, pendiente * extremos + ordenada)
+
+
+# Incidencias
+
+# Frecuencia de los valores de una o varias columnas (p. ej. tipos de incidencia)
+def frecuencia_valores(df, columnas):
+    valores = pd.concat([df[col] for col in columnas])
+    frecuencia = valores.value_counts()
+    frecuencia = frecuencia[frecuencia > 0].reset_index()  # las categorías sin casos no cuentan
+    frecuencia.columns = ['Tipo de Incidencia', 'Frecuencia']
+    return frecuencia
+
+
+# Medias de cada variable en un grupo (mascara) y en el resto, con el p-valor del t-test de Welch
+# y el tamaño del efecto (d de Cohen), todas las variables a la vez
+def comparar_grupos(df, mascara, variables=variables_interes):
+    comparacion = compare_groups(df, pd.Series(mascara, index=df.index).astype(bool), variables)
+    comparacion = comparacion.set_index("Variable").reindex(variables)
+    return pd.DataFrame({"Variable": variables,
+                         "Media Incidencias en Rojo": comparacion["Media Grupo"].to_numpy(dtype=float),
+                         "Media General": comparacion["Media Resto"].to_numpy(dtype=float),
+                         "P-valor": comparacion["P-valor"].to_numpy(dtype=float),
+                         "d de Cohen": comparacion["d de Cohen"].to_numpy(dtype=float)})
+
+
+# La misma comparación con la diferencia de medias, su intervalo bootstrap y el p-valor por permutación
+def comparar_grupos_remuestreo(df, mascara, variables=variables_interes, n_resamples=2000, seed=0):
+    remuestreo = diferencia_medias_remuestreo(df, mascara, variables, n_resamples, seed=seed)
+    return comparar_grupos(df, mascara, variables).merge(remuestreo, on="Variable", how="left")
+
+
+# Intervalo bootstrap y p-valor por permutación de la correlación de una pareja
+def correlacion_par_remuestreo(df, x, y, n_resamples=2000, seed=0):
+    return correlacion_remuestreo(df[x], df[y], n_resamples, seed=seed)
+
+
+# Comparación de cada grupo de una columna (país, RESULT, momento de incidencia...) frente al resto
+def comparar_por(df, grupos, variables=variables_interes):
+    return compare_groups(df, grupos, variables)
+
+
+# Memo de resultados por (versión del registro, estado de los filtros, cálculo, parámetros).
+# Los DataFrames y cubos quedan identificados por la versión y los filtros; en la clave entran
+# los parámetros escalares (variable o medida seleccionada), las listas de columnas, el nombre
+# de las Series (p. ej. la máscara indice["Fila Roja"]) y las columnas y máscaras de las vistas
+# (RegisterView), que solo se materializan si el resultado no está en caché.
+resultados_cache = FrameCache(max_bytes=256 * 1024 * 1024)
+
+
+def _parametro(valor):
+    if hasattr(valor, "materializar"):
+        return valor.clave
+    if isinstance(valor, (pd.DataFrame, pd.Index)) or hasattr(valor, "seleccionar"):
+        return None
+    if isinstance(valor, pd.Series):
+        return ("Series", valor.name)
+    if isinstance(valor, (list, tuple)):
+        return tuple(_parametro(v) for v in valor)
+    return valor
+
+
+def _materializar(valor):
+    return valor.materializar() if hasattr(valor, "materializar") else valor
+
+
+def memo(clave, func, *args, cache=resultados_cache):
+    key = clave + (func.__name__,) + tuple(_parametro(a) for a in args)
+    return cache.get_or_compute(key, lambda: func(*[_materializar(a) for a in args]))
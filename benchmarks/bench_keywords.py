@@ -0,0 +1,60 @@
+# Benchmark del detector de palabras clave: versión fila a fila (df.apply) frente al detector vectorizado.
+# Uso: python benchmarks/bench_keywords.py [registro.xlsx|registro.parquet] [--rows N]
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from incidents import KeywordMatcher, columnas_revisar, contiene_palabra_clave  # noqa: E402
+from ingestion import read_register  # noqa: E402
+
+
+# Registro sintético con textos libres parecidos a los del Excel
+def registro_sintetico(n, seed=0):
+    rng = np.random.default_rng(seed)
+    textos = ["NO INCIDENCIAS", "OK", "content", "molt bè", "Tornillo desprendido de la placa",
+              "separación intraplaques", "Després de la cirurgia dolor", "rotura placa", "dolor leve", None]
+    return pd.DataFrame({col: rng.choice(np.array(textos, dtype=object), n) for col in columnas_revisar})
+
+
+def medir(func, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        resultado = func()
+        tiempos.append(time.perf_counter() - t0)
+    return min(tiempos), resultado
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("registro", nargs="?")
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = read_register(args.registro, columns=columnas_revisar) if args.registro else registro_sintetico(args.rows)
+    matcher = KeywordMatcher()
+
+    t_apply, fila_a_fila = medir(lambda: df.apply(contiene_palabra_clave, axis=1), args.repeat)
+    t_vect, vectorizado = medir(lambda: matcher.match(df), args.repeat)
+
+    # Las palabras escritas sin acento pueden dar más filas que la versión original, nunca menos
+    perdidas = int((fila_a_fila & ~vectorizado["Fila Roja"]).sum())
+    extra = int((~fila_a_fila & vectorizado["Fila Roja"]).sum())
+
+    print(f"Filas: {len(df)}")
+    print(f"df.apply(contiene_palabra_clave): {t_apply * 1000:.1f} ms")
+    print(f"KeywordMatcher.match:             {t_vect * 1000:.1f} ms  (x{t_apply / t_vect:.1f})")
+    print(f"Filas rojas: {int(fila_a_fila.sum())} -> {int(vectorizado['Fila Roja'].sum())} "
+          f"(perdidas: {perdidas}, nuevas por palabras sin acento: {extra})")
+    return 1 if perdidas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+# Benchmark de arranque en frío: importa (en un proceso nuevo, con -X importtime) los mismos módulos
+# que importa dashboard.py al arrancar y comprueba el presupuesto de tiempo y que no se cargue el
+# stack científico pesado, que solo deben importar las secciones que lo usan.
+# Uso: python benchmarks/bench_startup.py [--max-ms 1500] [--repeat 3] [--top 10]
+import argparse
+import ast
+import os
+import re
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Módulos que no deben cargarse al arrancar (vista de resumen)
+modulos_diferidos = ["scipy", "seaborn", "matplotlib", "statsmodels"]
+
+patron_linea = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+# Sentencias import de nivel superior de dashboard.py
+def imports_dashboard(ruta=os.path.join(RAIZ, "dashboard.py")):
+    with open(ruta, encoding="utf-8") as f:
+        arbol = ast.parse(f.read())
+    return [ast.unparse(nodo) for nodo in arbol.body if isinstance(nodo, (ast.Import, ast.ImportFrom))]
+
+
+# Tiempo acumulado (µs) de cada módulo importado directamente y nombres de todos los módulos cargados
+def medir_imports(sentencias):
+    codigo = "\n".join(sentencias)
+    salida = subprocess.run([sys.executable, "-X", "importtime", "-c", codigo], cwd=RAIZ,
+                            capture_output=True, text=True, check=True).stderr
+    directos, cargados = {}, set()
+    for linea in salida.splitlines():
+        m = patron_linea.match(linea)
+        if not m:
+            continue
+        _, acumulado, sangria, modulo = m.groups()
+        cargados.add(modulo)
+        if sangria == "":
+            directos[modulo] = int(acumulado)
+    return directos, cargados
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-ms", type=float, default=1500, help="Presupuesto de importación en ms")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    sentencias = imports_dashboard()
+    mediciones = [medir_imports(sentencias) for _ in range(args.repeat)]
+    directos, cargados = min(mediciones, key=lambda m: sum(m[0].values()))
+    total_ms = sum(directos.values()) / 1000
+
+    print(f"Imports de dashboard.py: {len(sentencias)} sentencias, {len(cargados)} módulos cargados")
+    for modulo, us in sorted(directos.items(), key=lambda x: x[1], reverse=True)[:args.top]:
+        print(f"  {modulo:<30} {us / 1000:8.1f} ms")
+    print(f"Total: {total_ms:.1f} ms (presupuesto: {args.max_ms:.0f} ms)")
+
+    pesados = sorted({m.split(".")[0] for m in cargados} & set(modulos_diferidos))
+    if pesados:
+        print(f"Módulos que deberían importarse solo en las secciones que los usan: {', '.join(pesados)}")
+    return 1 if pesados or total_ms > args.max_ms else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+
+# Estadísticos suficientes por grupo (n, suma y suma de cuadrados de cada variable, sin vacíos)
+# en una pasada: con la matriz indicadora de grupos G y la máscara de valores informados M,
+# G.T @ M da los n, G.T @ X las sumas y G.T @ X² las sumas de cuadrados.
+def estadisticos_por_grupo(valores, codigos, n_grupos):
+    informados = ~np.isnan(valores)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        centro = np.where(informados, valores, 0.0).sum(axis=0) / informados.sum(axis=0)
+    x = np.where(informados, valores - centro, 0.0)
+    validos = codigos >= 0
+    g = np.zeros((len(codigos), n_grupos))
+    g[np.flatnonzero(validos), codigos[validos]] = 1.0
+    return g.T @ informados, g.T @ x, g.T @ (x * x), centro
+
+
+# t de Welch, grados de libertad (Welch-Satterthwaite), p-valor bilateral y d de Cohen
+# (desviación típica conjunta) a partir de n, medias y varianzas de los dos grupos
+def welch(n1, media1, var1, n2, media2, var2):
+    from scipy.stats import t as student_t
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        e1, e2 = var1 / n1, var2 / n2
+        t = (media1 - media2) / np.sqrt(e1 + e2)
+        gl = (e1 + e2) ** 2 / (e1 ** 2 / (n1 - 1) + e2 ** 2 / (n2 - 1))
+        p = 2 * student_t.sf(np.abs(t), gl)
+        conjunta = np.sqrt(((n1 - 1) * var1 + (n2 - 1) * var2) / (n1 + n2 - 2))
+        d = (media1 - media2) / conjunta
+    return t, gl, p, d
+
+
+def _media_varianza(n, suma, cuadrados):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        media = suma / n
+        varianza = (cuadrados - suma * media) / (n - 1)
+    return media, np.maximum(varianza, 0.0)
+
+
+# Comparación de cada grupo frente al resto para todas las variables a la vez (t-test de Welch).
+# grupos: máscara booleana (se compara el grupo True con el False) o cualquier columna de
+# etiquetas (país, RESULT, momento...): cada valor frente al resto de casos con etiqueta.
+# Devuelve una fila por (grupo, variable).
+def compare_groups(df, grupos, variables):
+    variables = [v for v in variables if v in df.columns]
+    valores = df[variables].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+    grupos = pd.Series(grupos, index=df.index) if not isinstance(grupos, pd.Series) else grupos.reindex(df.index)
+    booleana = pd.api.types.is_bool_dtype(grupos)
+    codigos, etiquetas = pd.factorize(grupos, sort=True)
+    n, suma, cuadrados, centro = estadisticos_por_grupo(valores, codigos, len(etiquetas))
+
+    # Resto = total de los casos con grupo menos el grupo
+    n_resto, suma_resto, cuadrados_resto = n.sum(axis=0) - n, suma.sum(axis=0) - suma, cuadrados.sum(axis=0) - cuadrados
+    media, varianza = _media_varianza(n, suma, cuadrados)
+    media_resto, varianza_resto = _media_varianza(n_resto, suma_resto, cuadrados_resto)
+    t, gl, p, d = welch(n, media, varianza, n_resto, media_resto, varianza_resto)
+
+    filas = range(len(etiquetas))
+    if booleana:
+        filas = [i for i, etiqueta in enumerate(etiquetas) if etiqueta]
+    partes = [pd.DataFrame({
+        "Grupo": etiquetas[i],
+        "Variable": variables,
+        "n Grupo": n[i].astype(np.int64),
+        "Media Grupo": media[i] + centro,
+        "n Resto": n_resto[i].astype(np.int64),
+        "Media Resto": media_resto[i] + centro,
+        "t": t[i],
+        "gl": gl[i],
+        "P-valor": p[i],
+        "d de Cohen": d[i],
+    }) for i in filas]
+    if not partes:
+        return pd.DataFrame(columns=["Grupo", "Variable", "n Grupo", "Media Grupo", "n Resto", "Media Resto",
+                                     "t", "gl", "P-valor", "d de Cohen"])
+    return pd.concat(partes, ignore_index=True)
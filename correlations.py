@@ -0,0 +1,111 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+
+# Matriz de correlaciones de todas las parejas de variables, cada una con sus casos completos
+# (pairwise-complete, como DataFrame.corr()): r, n, p-valor y su intervalo de confianza.
+class CorrelationMatrix(NamedTuple):
+    r: pd.DataFrame
+    n: pd.DataFrame  # casos con ambas variables informadas
+    p_valor: pd.DataFrame  # contraste bilateral de r = 0 (t de Student con n - 2 grados de libertad)
+    ic_inferior: pd.DataFrame  # intervalo de confianza de r (transformación z de Fisher)
+    ic_superior: pd.DataFrame
+    metodo: str  # "pearson" o "spearman"
+    confianza: float
+
+    @property
+    def empty(self):
+        return self.r.empty
+
+    def par(self, x, y):
+        return {"r": self.r.at[x, y], "n": int(self.n.at[x, y]), "p_valor": self.p_valor.at[x, y],
+                "ic_inferior": self.ic_inferior.at[x, y], "ic_superior": self.ic_superior.at[x, y]}
+
+    # Parejas (sin repetir ni la diagonal) con su r, n y p-valor, de mayor a menor |r|
+    def parejas(self):
+        i, j = np.triu_indices(len(self.r), k=1)
+        variables = self.r.index
+        tabla = pd.DataFrame({"x": variables[i], "y": variables[j], "r": self.r.to_numpy()[i, j],
+                              "n": self.n.to_numpy()[i, j], "p_valor": self.p_valor.to_numpy()[i, j]})
+        return tabla.reindex(tabla["r"].abs().sort_values(ascending=False).index).reset_index(drop=True)
+
+
+# Rangos medios (empates) de cada columna sobre sus valores informados; los vacíos siguen vacíos
+def _rangos(valores):
+    return pd.DataFrame(valores).rank(method="average").to_numpy()
+
+
+# Spearman por parejas con casos completos: los rangos de cada columna se calculan sobre todos sus
+# valores, así que las parejas que no comparten todos los casos de sus dos variables se vuelven a
+# ordenar sobre sus casos comunes (como DataFrame.corr(method="spearman"))
+def _spearman_parejas(valores, informados, r, n):
+    por_variable = np.diag(n)
+    i, j = np.triu_indices(len(n), k=1)
+    parciales = (n[i, j] >= 2) & ((n[i, j] < por_variable[i]) | (n[i, j] < por_variable[j]))
+    for a, b in zip(i[parciales], j[parciales]):
+        comunes = informados[:, a] & informados[:, b]
+        rangos = _rangos(valores[comunes][:, [a, b]])
+        r[a, b] = r[b, a] = np.corrcoef(rangos, rowvar=False)[0, 1]
+
+
+# Todas las parejas en una pasada: con la máscara de valores informados M y los valores centrados
+# X (0 donde falta), los productos matriciales dan n, las sumas y los productos cruzados de cada
+# pareja restringidos a sus casos completos.
+def correlation_matrix(df, variables, metodo="pearson", confianza=0.95):
+    from scipy.stats import norm, t as student_t
+
+    variables = [v for v in variables if v in df.columns]
+    valores = df[variables].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+    if metodo not in ("pearson", "spearman"):
+        raise ValueError(f"Método de correlación no soportado: {metodo}")
+    base = _rangos(valores) if metodo == "spearman" else valores
+
+    informados = ~np.isnan(valores)
+    m = informados.astype(np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        centro = np.where(informados, base, 0.0).sum(axis=0) / informados.sum(axis=0)
+        x = np.where(informados, base - centro, 0.0)
+        n = m.T @ m
+        suma = x.T @ m  # suma[i, j]: suma de la variable i en los casos con i y j informadas
+        cuadrados = (x * x).T @ m
+        cruzados = x.T @ x
+        cov = cruzados - suma * suma.T / n
+        var_i = cuadrados - suma ** 2 / n
+        r = cov / np.sqrt(var_i * var_i.T)
+        if metodo == "spearman":
+            _spearman_parejas(valores, informados, r, n)
+        r = np.clip(r, -1.0, 1.0)
+        r[n < 2] = np.nan
+
+        gl = n - 2
+        t = r * np.sqrt(gl / np.maximum(1.0 - r ** 2, 1e-300))
+        p = 2 * student_t.sf(np.abs(t), gl)
+        p[gl <= 0] = np.nan
+
+        z = np.arctanh(np.clip(r, -1 + 1e-15, 1 - 1e-15))
+        margen = norm.ppf(0.5 + confianza / 2) / np.sqrt(n - 3)
+        inferior, superior = np.tanh(z - margen), np.tanh(z + margen)
+        inferior[n <= 3] = np.nan
+        superior[n <= 3] = np.nan
+    np.fill_diagonal(p, 0.0)
+
+    def marco(arr):
+        return pd.DataFrame(arr, index=variables, columns=variables)
+
+    return CorrelationMatrix(marco(r), marco(n.astype(np.int64)), marco(p), marco(inferior), marco(superior),
+                             metodo, confianza)
+
+
+# Marca de significación para anotar el mapa de calor
+def significacion(p):
+    if pd.isna(p):
+        return ""
+    if p < 0.001:
+        return "***"
+    if p < 0.01:
+        return "**"
+    if p < 0.05:
+        return "*"
+    return ""
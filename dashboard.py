@@ -1,37 +1,77 @@
-import streamlit as st
+import os
+from itertools import combinations
+
+import numpy as np
 import pandas as pd
+import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
-import matplotlib.pyplot as plt
-import seaborn as sns
-from scipy.stats import skew, kurtosis, ttest_ind, pearsonr
-
-
-# Cargar datos
+from plotly.subplots import make_subplots
+
+import analytics
+import correlations
+import figures
+from aggregates import get_calendar_counts, get_count_cube, get_size_counts
+from forecasting import empalmar, get_forecast, previsiones_anuales, total_anual
+from incidents import get_incident_index, momentos, resumen_por_momento
+from incremental import update_register
+from ingestion import frame_cache, load_register
+from normalization import get_normalized, informe_memoria, normalized_cache
+from registry import dataset_registry
+from search import columnas_busqueda, get_search_index
+from views import RegisterView
+
+
+# Puntos a partir de los cuales las dispersiones se muestrean y los gráficos se agregan
+MAX_PUNTOS = 5000
+
+
+# Cargar datos (caché por hash del contenido: un rerun que solo cambia filtros no vuelve a leer el Excel).
+# El registro normalizado y sus agregados viven en el registro de datasets del proceso y se comparten
+# entre sesiones; cada sesión guarda solo una referencia a su versión (y sus filtros).
+# Si en la sesión ya había otra versión cargada (p. ej. la exportación del mes anterior), la nueva
+# se aplica de forma incremental: solo se recalculan los casos nuevos o modificados.
+# Devuelve la versión del registro y el DataFrame normalizado, que las secciones solo leen.
 def load_data(file):
-    df = pd.read_excel(file, header=1)
-    return df
-
-
-# Detectar filas con palabras clave en columnas específicas para incidencias separación tornillos intraplaca
-palabras_clave = ["INTRAPLACAS", "INTRAPLAQUES", "DESPRÈS", "DESPRENDIDO", "SEPARADO", "SEPARACIÓN", "SEPARADAS",
-                  "SOLTADO"]
-columnas_revisar = ['COMPLICATIONS INTRAOPERATORY', 'DIAGNOSIS 1', 'OBSERVATIONS 1', 'OBSERVATIOS 2', 'OBSERVATIONS2']
-
-
-def contiene_palabra_clave(fila):
-    return any(any(palabra in str(fila[col]).upper() for palabra in palabras_clave) for col in columnas_revisar)
+    version, raw = load_register(file, cache_dir=os.environ.get("PECTUSUP_CACHE_DIR"))
+    referencia = st.session_state.get("referencia_registro")
+    if referencia is None or referencia.version != version:
+        nueva = dataset_registry.adquirir(version)
+        # Si otra sesión ya cargó esta versión, su registro normalizado y sus agregados se comparten
+        # tal cual: solo se aplica la actualización incremental cuando la versión no está en caché
+        if referencia is not None:
+            if normalized_cache.get(version) is None:
+                cambios = update_register(referencia.version, version, raw)
+                if cambios:
+                    st.info(f"Actualización incremental: {cambios['insertados']} casos nuevos, "
+                            f"{cambios['modificados']} modificados y {cambios['eliminados']} eliminados.")
+            referencia.liberar()
+        st.session_state["referencia_registro"] = nueva
+    else:
+        dataset_registry.tocar(version)
+    return version, get_normalized(version, raw)
 
 
 # Interfaz Streamlit
 st.set_page_config(page_title="Pectus Up: Datos y Tendencias", layout="wide")
 st.title("Pectus Up: Datos y Tendencias")
 
-uploaded_file = st.file_uploader("Sube el archivo de Excel", type=["xls", "xlsx"])
+uploaded_file = st.file_uploader("Sube el archivo de Excel (o el registro convertido a Parquet)",
+                                 type=["xls", "xlsx", "parquet"])
 if uploaded_file:
-    df = load_data(uploaded_file)
+    version, df = load_data(uploaded_file)
     st.success("Datos cargados correctamente.")
 
+    # Cubo de conteos año × país × estado × kit × intervención × explantación (una vez por versión).
+    # Los filtros y los gráficos de resumen se responden recortando y sumando el cubo.
+    cubo = get_count_cube(version, df)
+
+    # Vista del registro: los filtros se componen como máscaras sobre el registro compartido y las
+    # columnas solo se copian cuando un cálculo o un gráfico las necesita
+    vista = RegisterView(df)
+    # Valores seleccionados por dimensión, para recortar igual los demás agregados de la versión
+    filtros_cubo = {}
+
 
     #Filtros Globales
 
@@ -39,11 +79,13 @@ if uploaded_file:
 
         #Filtro de Países
 
-    country_options = ["Todos"] + list(df["COUNTRY"].unique())
+    country_options = ["Todos"] + cubo.valores("COUNTRY")
     selected_countries = st.sidebar.multiselect("Países:", country_options, default="Todos")
 
     if "Todos" not in selected_countries:
-        df = df[df["COUNTRY"].isin(selected_countries)]
+        vista = vista.donde(vista.isin("COUNTRY", selected_countries))
+        filtros_cubo["COUNTRY"] = selected_countries
+        cubo = cubo.seleccionar({"COUNTRY": selected_countries})
     elif len(selected_countries) == 0:
         st.write("Ningún país ha sido seleccionado")
 
@@ -52,41 +94,71 @@ if uploaded_file:
 
         #Filtro de años
 
-    year_options = ["Todos"] + list(df["YEAR"].unique())
+    year_options = ["Todos"] + cubo.valores("YEAR")
     selected_years = st.sidebar.multiselect("Años:", year_options, default="Todos")
 
     if "Todos" not in selected_years:
-        df = df[df["YEAR"].isin(selected_years)]
-
-
-    # Pestañas para la organización
-    tabs = st.tabs(
-        ["Resumen General", "Análisis Comercial", "Análisis Técnico", "Incidencias",
-         "Exploración Adicional"])
+        vista = vista.donde(vista.isin("YEAR", selected_years))
+        filtros_cubo["YEAR"] = selected_years
+        cubo = cubo.seleccionar({"YEAR": selected_years})
+
+    # Inferencia por remuestreo (bootstrap y permutaciones) en las comparaciones y correlaciones
+    usar_remuestreo = st.sidebar.checkbox("Inferencia por remuestreo", value=True,
+                                          help="Intervalos bootstrap y p-valores por permutación, "
+                                               "más fiables que los paramétricos en muestras pequeñas y asimétricas")
+    n_remuestreos = st.sidebar.select_slider("Remuestreos:", [500, 1000, 2000, 5000, 10000], value=2000,
+                                             disabled=not usar_remuestreo)
+
+    # Histogramas y dispersiones agregados en el servidor (por defecto con registros grandes)
+    renderizado_agregado = st.sidebar.checkbox("Gráficos agregados (registros grandes)",
+                                               value=len(vista) > MAX_PUNTOS,
+                                               help=f"Histogramas precalculados y dispersiones WebGL con una "
+                                                    f"muestra de como máximo {MAX_PUNTOS} puntos")
+
+    # Previsión de informes, intervenciones y medidas (modelos por serie mensual, una vez por versión).
+    # Desactivada por defecto: el primer ajuste de una versión tarda segundos.
+    mostrar_previsiones = st.sidebar.checkbox("Mostrar previsiones", value=False,
+                                              disabled="Todos" not in selected_years,
+                                              help="Previsión hasta el final del año siguiente en las gráficas de "
+                                                   "evolución anual (con todos los años seleccionados)")
+    if mostrar_previsiones:
+        st.sidebar.caption("Las previsiones cuentan los informes y las medidas por mes del informe (DATE) y las "
+                           "intervenciones por mes de la cirugía (SURGERY DATE); las gráficas, por año del registro "
+                           "(YEAR). La línea de previsión parte del último año completo de la gráfica.")
+    paises_prevision = None if "Todos" in selected_countries else selected_countries
+
+    # Los resultados de cada sección se memorizan por versión del registro y estado de los filtros:
+    # volver a una sección ya vista (o cambiar de sección sin tocar los filtros) no recalcula nada
+    clave_filtros = (version, tuple(selected_countries), tuple(selected_years))
+
+    def calcular(func, *args):
+        return analytics.memo(clave_filtros, func, *args)
+
+    # Las previsiones solo se ajustan desde las secciones que las dibujan, y solo si se piden
+    def obtener_previsiones():
+        return get_forecast(version, df) if mostrar_previsiones and "Todos" in selected_years else None
+
+
+    # Secciones para la organización: solo se ejecuta la sección activa (con st.tabs se
+    # calculaban y dibujaban todas las pestañas en cada interacción)
+    secciones = ["Resumen General", "Análisis Comercial", "Análisis Técnico", "Incidencias",
+                 "Exploración Adicional"]
+    seccion = st.radio("Sección:", secciones, horizontal=True, label_visibility="collapsed",
+                       key="seccion_activa")
 
 
     # Resumen General (Fase 1)
-    with tabs[0]:
+    if seccion == "Resumen General":
         st.header("Datos Generales")
+        previsiones = obtener_previsiones()
         st.write(
             "Sección dedicada al análisis del estado general de los casos registrados en la base de datos. Se incluyen visualizaciones sobre la distribución de los casos según su estado, su evolución a lo largo del tiempo y el uso de diferentes kits en los procedimientos. Este análisis proporciona una visión clara del volumen y tipo de casos manejados, ayudando a entender tendencias y tomar decisiones estratégicas.")
 
         st.subheader("Estado de los Casos")
 
-        # Definir el mapeo de valores a nombres
-        estado_map = {
-            1: "1: Caso Abierto",
-            2: "2:Caso Aprobado",
-            3: "3: Informe Enviado",
-            4: "4: Caso Operado",
-            5: "5: Caso Retirado"
-        }
-
-        # Aplicar el mapeo de estados
-        df["STATE NUMBER"] = df["STATE NUMBER"].map(estado_map).fillna(df["STATE NUMBER"])
-
-        # Estado de los casos totales
-        status_counts = df["STATE NUMBER"].value_counts()
+        # Estado de los casos totales (STATE NUMBER ya viene mapeado a nombres en la normalización)
+        estado_casos = calcular(analytics.estado_casos, cubo)
+        status_counts = estado_casos.totales
         fig_pie = px.pie(names=status_counts.index, values=status_counts.values,
                          title="Distribución de Informes Totales por Estado",
                          labels={"names": "STATE NUMBER"})
@@ -95,7 +167,7 @@ if uploaded_file:
         # Estado de los casos según año
 
         # Crear DataFrame agrupado correctamente
-        sunburst_data = df.groupby(["YEAR", "STATE NUMBER"]).size().reset_index(name="Informes")
+        sunburst_data = estado_casos.por_anio
 
         fig_sunburst = px.sunburst(sunburst_data, path=["YEAR", "STATE NUMBER"], values="Informes",
                                    title="Distribución de Informes por Año y Estado")
@@ -108,45 +180,17 @@ if uploaded_file:
         st.subheader("Evolución Informes, Intervenciones y Explantaciones por Año")
 
 
-        # Convertir columnas de fecha
-        df["DATE"] = pd.to_datetime(df["DATE"], errors='coerce')
-        df["SURGERY DATE"] = pd.to_datetime(df["SURGERY DATE"], errors='coerce')
-        df["MONTHTAC"] = df["DATE"].dt.to_period("M").astype(str)
-
-        #Calcular número de casos operados/intervenidos
-        df["Intervenciones"] = df["SURGERY DATE"].notna().astype(int)
-        df_intervenciones = df[df["Intervenciones"] == 1]
-
-
-        #Calcular número de casos explantados
-        df["Explantaciones"] = df["DATE2"].notna().astype(int)
-        df_explantaciones = df[df["Explantaciones"] == 1]
-
-
-        # Contar casos, intervenciones y explantaciones por año
-        yearly_counts = df.groupby("YEAR").size().reset_index(name="Casos")
-        yearly_counts_interv = df_intervenciones.groupby("YEAR").size().reset_index(name="Casos")
-        yearly_counts_explant = df_explantaciones.groupby("YEAR").size().reset_index(name="Casos")
-
-        # Calcular el total de casos en todos los años
-        total_cases = yearly_counts["Casos"].sum()
-        total_interv = yearly_counts_interv["Casos"].sum()
-        total_explant = yearly_counts_explant["Casos"].sum()
-
-
-        # Calcular porcentaje respecto al total de TODOS los casos, intervenciones o explantaciones
-        yearly_counts["percentage"] = (yearly_counts["Casos"] / total_cases) * 100
-        yearly_counts_interv["percentage"] = (yearly_counts_interv["Casos"] / total_interv) * 100
-        yearly_counts_explant["percentage"] = (yearly_counts_explant["Casos"] / total_explant) * 100
+        # Casos, intervenciones y explantaciones por año, con su porcentaje respecto al total de todos los años
+        evolucion = calcular(analytics.evolucion_anual, cubo)
 
 
         #Seleccionar informes, intervenciones o explantaciones para visualizar en la gráfica
 
         # Crear diccionario con las opciones
         options = {
-            "Informes Totales": yearly_counts,
-            "Intervenciones": yearly_counts_interv,
-            "Explantaciones": yearly_counts_explant
+            "Informes Totales": evolucion.casos,
+            "Intervenciones": evolucion.intervenciones,
+            "Explantaciones": evolucion.explantaciones
         }
 
         # Selector en Streamlit
@@ -192,6 +236,14 @@ if uploaded_file:
         )
         fig2.update_traces(mode="markers+lines", line=dict(color="#32CD32"))
 
+        # Previsión del total (suma de los países seleccionados); las explantaciones no se prevén
+        series_prevision = {"Informes Totales": "Informes", "Intervenciones": "Intervenciones"}
+        if previsiones is not None and selected_option in series_prevision:
+            prevision_total = total_anual(previsiones_anuales(previsiones, series_prevision[selected_option],
+                                                              paises_prevision))
+            prevision_total = empalmar(prevision_total, selected_variable.set_index("YEAR")["Casos"])
+            figures.capa_prevision(fig2, prevision_total, previsiones.confianza, color="#32CD32")
+
         # Mostrar gráfico en Streamlit
         st.plotly_chart(fig2)
 
@@ -199,7 +251,8 @@ if uploaded_file:
         # Distribución kits utilizados
 
         st.subheader("Distribución de Kits Utilizados")
-        kit_counts = df["KIT"].value_counts()
+        uso_kits = calcular(analytics.uso_kits, cubo)
+        kit_counts = uso_kits.conteos
         fig3 = px.bar(kit_counts, x=kit_counts.index, y=kit_counts.values, title="Uso de Kits")
         fig3.update_traces(
             text=[f"{v} ({v / kit_counts.sum():.1%})" for v in kit_counts.values],
@@ -211,7 +264,7 @@ if uploaded_file:
         st.plotly_chart(fig3)
 
         st.subheader("Relación entre Kit y Estado del Caso")
-        kit_status_counts = df.groupby(["KIT", "STATE NUMBER"]).size().unstack().fillna(0)
+        kit_status_counts = uso_kits.por_estado
         fig4 = px.bar(kit_status_counts, barmode="stack", title="Casos por Kit y Estado")
         fig4.update_layout(
             yaxis_title="Frecuencia de Uso"  # Nombre del eje Y
@@ -219,35 +272,19 @@ if uploaded_file:
 
         st.plotly_chart(fig4)
 
-        # Calcular los porcentajes dentro de cada KIT
-        kit_status_percent = kit_status_counts.div(kit_status_counts.sum(axis=1), axis=0) * 100
-
-        # Crear un DataFrame con los datos en formato más claro
-        kit_status_summary = pd.DataFrame()
-
-        for kit in kit_status_counts.index:
-            for estado in kit_status_counts.columns:
-                total_casos = kit_status_counts.loc[kit, estado]
-                porcentaje = kit_status_percent.loc[kit, estado]
-                kit_status_summary.loc[f"Estado {estado}", f"Kit {kit}"] = f"{int(total_casos)} ({porcentaje:.1f}%)"
-
-        # Mostrar la tabla en Streamlit
-        st.dataframe(kit_status_summary)
+        # Casos y porcentaje dentro de cada KIT
+        st.dataframe(uso_kits.resumen)
 
         st.subheader("Uso de Medidas de Tornillos y Placas Elevadoras")
 
         if "b (screw length)" in df.columns and "a (elevator plate)" in df.columns:
 
-            # LIMPIAR Y CONVERTIR LOS DATOS A NÚMEROS
-            df["b (screw length)"] = pd.to_numeric(df["b (screw length)"], errors="coerce")
-            df["a (elevator plate)"] = df["a (elevator plate)"].astype(str).str.strip()  # Elimina espacios ocultos
-            df["a (elevator plate)"] = pd.to_numeric(df["a (elevator plate)"], errors="coerce")
-            df["a (elevator plate)"] = df["a (elevator plate)"].astype(float)  # Asegura que no sean categorías
-            df["YEAR"] = pd.to_numeric(df["YEAR"], errors="coerce")  # Asegurar que 'year' sea numérico
+            # Matrices año × medida de tornillo y de placa (una vez por versión), recortadas por los filtros.
+            # La frecuencia, la evolución de la medida elegida y los datos desconocidos se leen de ellas.
+            medidas = get_size_counts(version, df).seleccionar(filtros_cubo)
 
             # Contar valores y ordenar correctamente
-            screw_counts = df["b (screw length)"].value_counts().sort_index()
-            plate_counts = df["a (elevator plate)"].value_counts().sort_index()
+            screw_counts, plate_counts = calcular(analytics.frecuencia_medidas, medidas)
 
             # Convertir Series a DataFrame antes de graficar
             screw_counts_df = screw_counts.reset_index()
@@ -301,27 +338,15 @@ if uploaded_file:
             st.subheader("Evolución del uso de medidas específicas por año")
 
             # Opciones únicas de tornillos y placas
-            screw_options = sorted(df["b (screw length)"].dropna().unique())
-            plate_options = sorted(df["a (elevator plate)"].dropna().unique())
+            screw_options = screw_counts.index.to_numpy()
+            plate_options = plate_counts.index.to_numpy()
 
             # Selección de medida específica
             selected_screw = st.selectbox("Selecciona una medida de tornillo", screw_options)
 
-            # Filtrar el DataFrame por las medida seleccionada de tornillo
-            df_screw = df[df["b (screw length)"] == selected_screw]
-
-            # Contar número de casos por año para cada medida de tornillo
-            screw_yearly_counts = df_screw.groupby("YEAR").size().reset_index(name="count_screw")
-
-            # Calcular total de casos por año
-            total_cases_per_year = df.groupby("YEAR").size().reset_index(name="total_cases")
-
-            # Merge de datos para agregar el total de casos por año
-            screw_yearly_counts = screw_yearly_counts.merge(total_cases_per_year, on="YEAR", how="left")
-
-            # Calcular porcentaje de uso por año
-            screw_yearly_counts["percentage"] = (screw_yearly_counts["count_screw"] / screw_yearly_counts[
-                "total_cases"]) * 100
+            # Número de casos por año con la medida de tornillo seleccionada y porcentaje de uso por año
+            screw_yearly_counts = calcular(analytics.evolucion_medida, medidas, "b (screw length)", selected_screw,
+                                           "count_screw")
 
             # 🔹 GRAFICO EVOLUCIÓN DE TORNILLOS
             fig_screw = px.line(screw_yearly_counts, x="YEAR", y="count_screw",
@@ -330,12 +355,11 @@ if uploaded_file:
                                 title=f"Evolución del uso de tornillos de {selected_screw} mm")
 
             # Añadir anotaciones en los puntos (número de casos y porcentaje)
-            for i, row in screw_yearly_counts.iterrows():
-                fig_screw.add_annotation(
-                    x=row["YEAR"], y=row["count_screw"],
-                    text=f"{int(row['count_screw'])} ({row['percentage']:.1f}%)",
-                    showarrow=True, arrowhead=2, yshift=10, font=dict(color="#1F77B4")
-                )
+            fig_screw.update_layout(annotations=[
+                dict(x=x, y=y, text=f"{y} ({p:.1f}%)", showarrow=True, arrowhead=2, yshift=10,
+                     font=dict(color="#1F77B4"))
+                for x, y, p in zip(screw_yearly_counts["YEAR"].tolist(), screw_yearly_counts["count_screw"].tolist(),
+                                   screw_yearly_counts["percentage"].tolist())])
 
             # Personalización de trazos
             fig_screw.update_traces(mode="markers+lines", line=dict(color="#FF7F0E"))
@@ -343,6 +367,12 @@ if uploaded_file:
             # Configurar el eje X para que solo muestre años enteros
             fig_screw.update_layout(xaxis=dict(tickmode="linear", dtick=1))
 
+            # Previsión de la medida seleccionada (suma de los países seleccionados)
+            if previsiones is not None:
+                prevision_screw = total_anual(previsiones_anuales(previsiones, "Tornillo", paises_prevision, selected_screw))
+                prevision_screw = empalmar(prevision_screw, screw_yearly_counts.set_index("YEAR")["count_screw"])
+                figures.capa_prevision(fig_screw, prevision_screw, previsiones.confianza, color="#FF7F0E")
+
             # Mostrar gráfico de tornillos en Streamlit
             st.plotly_chart(fig_screw)
 
@@ -351,18 +381,9 @@ if uploaded_file:
             # Selección de medida específica
             selected_plate = st.selectbox("Selecciona una medida de placa", plate_options)
 
-            # Filtrar el DataFrame por las medida seleccionada de placa
-            df_plate = df[df["a (elevator plate)"] == selected_plate]
-
-            # Contar número de casos por año para cada medida de placa
-            plate_yearly_counts = df_plate.groupby("YEAR").size().reset_index(name="count_plate")
-
-            # Merge de datos para agregar el total de casos por año
-            plate_yearly_counts = plate_yearly_counts.merge(total_cases_per_year, on="YEAR", how="left")
-
-            # Calcular porcentaje de uso por año
-            plate_yearly_counts["percentage"] = (plate_yearly_counts["count_plate"] / plate_yearly_counts[
-                "total_cases"]) * 100
+            # Número de casos por año con la medida de placa seleccionada y porcentaje de uso por año
+            plate_yearly_counts = calcular(analytics.evolucion_medida, medidas, "a (elevator plate)", selected_plate,
+                                           "count_plate")
 
             fig_plate = px.line(plate_yearly_counts, x="YEAR", y="count_plate",
                                 markers=True,
@@ -370,12 +391,11 @@ if uploaded_file:
                                 title=f"Evolución del uso de placas de {selected_plate} mm")
 
             # Añadir anotaciones en los puntos (número de casos y porcentaje)
-            for i, row in plate_yearly_counts.iterrows():
-                fig_plate.add_annotation(
-                    x=row["YEAR"], y=row["count_plate"],
-                    text=f"{int(row['count_plate'])} ({row['percentage']:.1f}%)",
-                    showarrow=True, arrowhead=2, yshift=10, font=dict(color="#FF7F0E")
-                )
+            fig_plate.update_layout(annotations=[
+                dict(x=x, y=y, text=f"{y} ({p:.1f}%)", showarrow=True, arrowhead=2, yshift=10,
+                     font=dict(color="#FF7F0E"))
+                for x, y, p in zip(plate_yearly_counts["YEAR"].tolist(), plate_yearly_counts["count_plate"].tolist(),
+                                   plate_yearly_counts["percentage"].tolist())])
 
             # Personalización de trazos
             fig_plate.update_traces(mode="markers+lines", line=dict(color="#1F77B4"))
@@ -383,55 +403,17 @@ if uploaded_file:
             # Configurar el eje X para que solo muestre años enteros
             fig_plate.update_layout(xaxis=dict(tickmode="linear", dtick=1))
 
+            # Previsión de la medida seleccionada (suma de los países seleccionados)
+            if previsiones is not None:
+                prevision_plate = total_anual(previsiones_anuales(previsiones, "Placa", paises_prevision, selected_plate))
+                prevision_plate = empalmar(prevision_plate, plate_yearly_counts.set_index("YEAR")["count_plate"])
+                figures.capa_prevision(fig_plate, prevision_plate, previsiones.confianza, color="#1F77B4")
+
             # Mostrar gráfico de placas en Streamlit
             st.plotly_chart(fig_plate)
 
-            # CALCULAR DATOS CONOCIDOS Y DESCONOCIDOS
-
-            # 🔹 CALCULAR EL TOTAL DE CASOS POR AÑO **ANTES** DE FILTRAR POR MEDIDA
-            total_cases_per_year = df.groupby("YEAR").size().reset_index(name="total_cases")
-
-            # Asegurar que `total_cases_per_year` tenga TODOS los años posibles
-            all_years = sorted(df["YEAR"].dropna().unique())
-            total_cases_per_year = pd.DataFrame({"YEAR": all_years}).merge(total_cases_per_year, on="YEAR",
-                                                                           how="left").fillna(0)
-
-            # Convertir `total_cases_per_year` en diccionario para mapear valores
-            total_cases_dict = total_cases_per_year.set_index("YEAR")["total_cases"].to_dict()
-
-            # 🔹 CALCULAR DATOS CONOCIDOS Y DESCONOCIDOS PARA TORNILLOS
-            screw_yearly_counts = df.groupby("YEAR")["b (screw length)"].count().reset_index(name="known_cases")
-            screw_yearly_counts = pd.DataFrame({"YEAR": all_years}).merge(screw_yearly_counts, on="YEAR",
-                                                                          how="left").fillna(0)
-
-            # Obtener total de casos y calcular desconocidos
-            screw_yearly_counts["total_cases"] = screw_yearly_counts["YEAR"].map(total_cases_dict)
-            screw_yearly_counts["unknown_cases"] = screw_yearly_counts["total_cases"] - screw_yearly_counts[
-                "known_cases"]
-            screw_yearly_counts["unknown_cases"] = screw_yearly_counts["unknown_cases"].apply(
-                lambda x: max(x, 0))  # Evitar negativos
-
-            # Calcular porcentaje
-            screw_yearly_counts["known_percentage"] = (screw_yearly_counts["known_cases"] / screw_yearly_counts[
-                "total_cases"]) * 100
-            screw_yearly_counts["unknown_percentage"] = 100 - screw_yearly_counts["known_percentage"]
-
-            # 🔹 CALCULAR DATOS CONOCIDOS Y DESCONOCIDOS PARA PLACAS
-            plate_yearly_counts = df.groupby("YEAR")["a (elevator plate)"].count().reset_index(name="known_cases")
-            plate_yearly_counts = pd.DataFrame({"YEAR": all_years}).merge(plate_yearly_counts, on="YEAR",
-                                                                          how="left").fillna(0)
-
-            # Obtener total de casos y calcular desconocidos
-            plate_yearly_counts["total_cases"] = plate_yearly_counts["YEAR"].map(total_cases_dict)
-            plate_yearly_counts["unknown_cases"] = plate_yearly_counts["total_cases"] - plate_yearly_counts[
-                "known_cases"]
-            plate_yearly_counts["unknown_cases"] = plate_yearly_counts["unknown_cases"].apply(
-                lambda x: max(x, 0))  # Evitar negativos
-
-            # Calcular porcentaje
-            plate_yearly_counts["known_percentage"] = (plate_yearly_counts["known_cases"] / plate_yearly_counts[
-                "total_cases"]) * 100
-            plate_yearly_counts["unknown_percentage"] = 100 - plate_yearly_counts["known_percentage"]
+            # CALCULAR DATOS CONOCIDOS Y DESCONOCIDOS POR AÑO PARA TORNILLOS Y PLACAS
+            screw_yearly_counts, plate_yearly_counts = calcular(analytics.datos_desconocidos, medidas)
 
             # 🔹 GRAFICO BARRAS APILADAS - TORNILLOS
             fig_screw_bar = px.bar(
@@ -468,8 +450,9 @@ if uploaded_file:
             st.plotly_chart(fig_plate_bar)
 
     # Sección 2
-    with tabs[1]:
+    if seccion == "Análisis Comercial":
         st.header("Análisis Comercial")
+        previsiones = obtener_previsiones()
         st.write(
             "Sección dedidacada al análisis de tendencias de intervenciones por país, conversión de informes y tiempos de conversión.")
 
@@ -477,9 +460,16 @@ if uploaded_file:
 
         # Evolución anual de los informes por país
         st.subheader("Evolución Anual del Número de Informes e Intervenciones por País")
-        yearly_cases = df.groupby(["YEAR", "COUNTRY"]).size().reset_index(name="Número de Informes")
+        # Conteos por mes/semana de la fecha del TAC y país (una vez por versión), recortados por los filtros.
+        # Las líneas de evolución anual y el mapa de calor leen de este mismo almacén.
+        calendario = get_calendar_counts(version, df).seleccionar(filtros_cubo)
+        yearly_cases = calendario.anual().reset_index(name="Número de Informes")
         fig1 = px.line(yearly_cases, x="YEAR", y="Número de Informes", color="COUNTRY",
                        title="Evolución de Informes por País", markers=True)
+        if previsiones is not None:
+            prevision_pais = empalmar(previsiones_anuales(previsiones, "Informes", paises_prevision),
+                                      calendario.anual())
+            figures.capa_prevision(fig1, prevision_pais, previsiones.confianza)
 
         fig1.update_layout(
             xaxis_title="Año",  #Nombre eje X
@@ -491,9 +481,13 @@ if uploaded_file:
 
         # Evolución anual de las intervenciones por país
 
-        yearly_surgery_cases = df_intervenciones.groupby(["YEAR", "COUNTRY"]).size().reset_index(name="Número de Intervenciones")
+        yearly_surgery_cases = calendario.anual(solo_intervenciones=True).reset_index(name="Número de Intervenciones")
         fig1 = px.line(yearly_surgery_cases, x="YEAR", y="Número de Intervenciones", color="COUNTRY",
                        title="Evolución de Intervenciones por País", markers=True)
+        if previsiones is not None:
+            prevision_pais = empalmar(previsiones_anuales(previsiones, "Intervenciones", paises_prevision),
+                                      calendario.anual(solo_intervenciones=True))
+            figures.capa_prevision(fig1, prevision_pais, previsiones.confianza)
 
         fig1.update_layout(
             xaxis_title="Año",  # Nombre eje X
@@ -501,6 +495,10 @@ if uploaded_file:
         )
 
         st.plotly_chart(fig1, use_container_width=True)
+        if previsiones is not None:
+            st.caption(f"Líneas discontinuas: previsión con intervalo de predicción del {previsiones.confianza:.0%} "
+                       "(el año en curso suma los meses ya registrados y los previstos). Las intervenciones se "
+                       "prevén por fecha de cirugía y los informes por fecha del informe, no por año del registro.")
 
 
         # Comparación entre países
@@ -513,20 +511,17 @@ if uploaded_file:
         else:
             titulo_grafica = f"Comparación de Casos por País ({', '.join(map(str, selected_years))})"
 
-        informes_generados = df.groupby("COUNTRY").size().reset_index(name="Informes Generados")
-        intervenciones = df[df["Intervenciones"] == 1].groupby("COUNTRY")["Intervenciones"].count().reset_index()
-        comparacion = pd.merge(informes_generados, intervenciones, on="COUNTRY", how="left").fillna(0)
+        conversion = calcular(analytics.conversion, cubo)
+        comparacion = conversion.por_pais
 
-        st.write(intervenciones)
+        st.write(comparacion.loc[comparacion["Intervenciones"] > 0, ["COUNTRY", "Intervenciones"]])
 
         fig2 = px.bar(comparacion, x="COUNTRY", y=["Informes Generados", "Intervenciones"], barmode='group',
                       title=titulo_grafica)
         st.plotly_chart(fig2, use_container_width=True)
 
         # Tasa de conversión de informes a intervenciones
-        informes_generados = df.shape[0]
-        informes_convertidos = df["SURGERY DATE"].notna().sum()
-        tasa_conversion = (informes_convertidos / informes_generados) * 100 if informes_generados > 0 else 0
+        tasa_conversion = conversion.tasa_general
 
         # Determinar título con los años seleccionados
         if "Todos" in selected_years or not selected_years:
@@ -543,11 +538,8 @@ if uploaded_file:
             titulo_grafica3 = f"tasa de Conversión por País ({', '.join(map(str, selected_years))})"
 
 
-        # Calcular la tasa de conversión por país
-        conversion_por_pais = df.groupby("COUNTRY")["SURGERY DATE"].count() / df.groupby("COUNTRY").size()
-        # Resetear índice y renombrar columnas
-        conversion_por_pais = conversion_por_pais.reset_index()
-        conversion_por_pais.columns = ["País", "Tasa de Conversión"]
+        # Tasa de conversión por país
+        conversion_por_pais = comparacion[["COUNTRY", "Tasa de Conversión"]].rename(columns={"COUNTRY": "País"})
         # Filtrar países con tasa de conversión > 0
         conversion_por_pais = conversion_por_pais[conversion_por_pais["Tasa de Conversión"] > 0]
         # Crear gráfico de barras
@@ -562,6 +554,29 @@ if uploaded_file:
         # Mostrar
         st.plotly_chart(fig3, use_container_width=True)
 
+        # Embudo por estado del caso (Abierto → Aprobado → Informe Enviado → Operado → Retirado): casos que
+        # alcanzan cada etapa, conversión y abandonos, calculados sobre el cubo en una sola pasada
+        st.subheader("Embudo de Conversión por Estado del Caso")
+        desgloses = {"Total": None, "País": "COUNTRY", "Año": "YEAR", "Kit": "KIT"}
+        desglose = st.radio("Desglosar por:", list(desgloses), horizontal=True, key="desglose_embudo")
+        por = desgloses[desglose]
+        embudo = calcular(analytics.embudo_conversion, cubo, por)
+
+        fig_embudo = px.funnel(embudo.etapas.astype({"Grupo": str}), x="Casos", y="Etapa",
+                               color="Grupo" if por else None, title="Casos que Alcanzan cada Estado",
+                               labels={"Grupo": desglose})
+        st.plotly_chart(fig_embudo, use_container_width=True)
+        st.dataframe(embudo.etapas.rename(columns={"Grupo": desglose}).style.format(
+            {"Conversión": "{:.1%}", "Conversión Acumulada": "{:.1%}"}, na_rep="-"))
+        if embudo.sin_estado:
+            st.caption(f"{embudo.sin_estado} casos sin estado o con un estado fuera del embudo no se incluyen.")
+
+        # Tiempo en las etapas con fecha, de los casos que completan la transición
+        st.write("Días entre etapas (casos que completan la transición):")
+        tiempos_etapa = calcular(analytics.tiempos_embudo,
+                                 vista.con(["DATE", "SURGERY DATE", "DATE2"] + ([por] if por else [])), por)
+        st.dataframe(tiempos_etapa.rename(columns={"Grupo": desglose}))
+
 
 
         # Determinar título con los años seleccionados
@@ -571,15 +586,15 @@ if uploaded_file:
             titulo_grafica4 = f"Mapa de Calor de Intervenciones por País ({', '.join(map(str, selected_years))})"
 
 
-        # Generar la matriz de datos para el heatmap
-        matrix = df.pivot_table(values='Intervenciones', index='MONTHTAC', columns='COUNTRY', aggfunc='sum',
-                                fill_value=0)
-        # Filtrar países que tienen todas sus intervenciones = 0
-        matrix = matrix.loc[:, (matrix != 0).any(axis=0)]  # Elimina columnas donde todos los valores son 0
+        periodos = {"Semana": "W", "Mes": "M", "Trimestre": "Q"}
+        periodo = st.radio("Agrupar por:", list(periodos), index=1, horizontal=True, key="periodo_mapa")
+
+        # Generar la matriz de datos para el heatmap (sin países con todas sus intervenciones = 0)
+        matrix = calcular(analytics.intervenciones_por_periodo, calendario, periodos[periodo])
         # Crear el mapa de calor con un tamaño más grande
         fig6 = px.imshow(
             matrix,
-            labels={'x': 'País', 'y': 'Mes', 'color': 'Intervenciones'},
+            labels={'x': 'País', 'y': periodo, 'color': 'Intervenciones'},
             title=titulo_grafica4,
             color_continuous_scale='YlOrRd'  # Colores más visibles
         )
@@ -599,14 +614,11 @@ if uploaded_file:
 
         # Distribución del tiempo entre la recepción del TAC y la intervención
 
-        # Filtrar registros donde ambas fechas existen
-        df_filtered = df.dropna(subset=["DATE", "SURGERY DATE"]).copy()
-
-        # Calcular la diferencia en días
-        df_filtered["Tiempo TAC a Intervención"] = (df_filtered["SURGERY DATE"] - df_filtered["DATE"]).dt.days
-
-        df_sin_negativos = df_filtered[df_filtered[
-                                           "Tiempo TAC a Intervención"] > 0]  # Filtramos informes con días negativos ya que son informes realizados después de la cirugía
+        # Diferencia en días para los registros con ambas fechas. Se separan los días negativos ya que son
+        # informes realizados después de la cirugía
+        tiempos_tac = calcular(analytics.tiempos_tac_intervencion,
+                              vista.con(["DATE", "SURGERY DATE", "COUNTRY", "STATE NUMBER"]))
+        df_sin_negativos = tiempos_tac.positivos
 
         fig4 = px.histogram(df_sin_negativos, x="Tiempo TAC a Intervención",
                             title="Tiempo desde la Recepción del TAC hasta la Intervención",
@@ -617,7 +629,7 @@ if uploaded_file:
         st.plotly_chart(fig4, use_container_width=True)
 
         # Mostrar registros con días negativos
-        dias_negativos = df_filtered[df_filtered["Tiempo TAC a Intervención"] < 0]
+        dias_negativos = tiempos_tac.negativos
         if not dias_negativos.empty:
             st.subheader("Registros de Informes TAC Postquirúrgicos (Fecha Intervención - Fecha TAC < 0)")
             st.write(f"{dias_negativos.shape[0]} registros")
@@ -635,59 +647,100 @@ if uploaded_file:
         else:
             st.warning("No hay datos suficientes para calcular el tiempo entre TAC e intervención.")
 
-    with tabs[2]:
+        # Tiempo hasta el evento con censura (Kaplan-Meier): los casos aún no operados (o no explantados)
+        # cuentan hasta la fecha de corte del registro en lugar de descartarse
+        st.subheader("Tiempo hasta la Intervención y la Explantación (Kaplan-Meier)")
+        intervalos = {"TAC → Intervención": ("DATE", "SURGERY DATE"),
+                      "Intervención → Explantación": ("SURGERY DATE", "DATE2")}
+        intervalo = st.radio("Intervalo:", list(intervalos), horizontal=True, key="intervalo_km")
+        por_pais = st.checkbox("Curvas por país", value=True, key="km_por_pais")
+        inicio, fin = intervalos[intervalo]
+        corte = calcular(analytics.fecha_corte, df, pd.Timestamp.today().normalize())
+        km = calcular(analytics.tiempo_hasta_evento, vista.con([inicio, fin, "COUNTRY"]), inicio, fin, corte,
+                      por_pais)
+
+        if km.resumen["n"].sum() == 0:
+            st.warning("No hay casos con las fechas necesarias para este intervalo.")
+        else:
+            # Cada curva empieza en (0, 1) y baja en escalón en cada tiempo con eventos
+            curvas = pd.concat([km.resumen[["Estrato"]].assign(Tiempo=0.0, Supervivencia=1.0,
+                                                               **{"IC Inferior": 1.0, "IC Superior": 1.0}),
+                                km.curvas], ignore_index=True).sort_values(["Estrato", "Tiempo"], kind="stable")
+            evento = "intervención" if fin == "SURGERY DATE" else "explantación"
+            fig_km = px.line(curvas, x="Tiempo", y="Supervivencia", color="Estrato" if por_pais else None,
+                             line_shape="hv", title=f"Proporción de Casos sin {evento.capitalize()} ({intervalo})",
+                             labels={"Tiempo": "Días", "Supervivencia": f"Proporción sin {evento}",
+                                     "Estrato": "País"})
+            if not por_pais:
+                for banda in ["IC Inferior", "IC Superior"]:
+                    fig_km.add_trace(go.Scatter(x=curvas["Tiempo"], y=curvas[banda], mode="lines", line_shape="hv",
+                                                line=dict(dash="dot", width=1, color="#636EFA"),
+                                                name=f"{banda} {km.confianza:.0%}"))
+            fig_km.update_yaxes(range=[0, 1.02])
+            st.plotly_chart(fig_km, use_container_width=True)
+
+            st.write(f"Mediana del tiempo hasta la {evento} (días) con su IC {km.confianza:.0%}:")
+            st.dataframe(km.resumen.rename(columns={"Estrato": "País" if por_pais else "Estrato",
+                                                    "IC Inferior": "Mediana IC Inferior",
+                                                    "IC Superior": "Mediana IC Superior"}))
+            if pd.notna(corte):
+                st.caption(f"Los casos sin {evento}, o con la {evento} programada después del último informe, "
+                           f"se censuran en la fecha de corte del registro ({corte:%d/%m/%Y}); la mediana queda "
+                           f"vacía si la curva no baja del 50%.")
+
+    if seccion == "Análisis Técnico":
         st.header("Análisis Técnico")
         st.write(
             "En esta sección se incluyen estudios sobre índice de Haller, asimetría, rotación esternal y correlaciones técnicas.")
 
         st.markdown("<br>", unsafe_allow_html=True)
 
-        # Definir las columnas requeridas para el análisis técnico
+        # Definir las columnas requeridas para el análisis técnico (con los nombres canónicos de la normalización)
         columnas_requeridas = [
-            "INDICE€", "INDICE(D)", "d(Potencial Lifting Distance)MIN",
-            "g (Haller Index)", "f (Assymetry Index)", "h (Correction Index)", "a (Sternal angle)", "Sternum Density",
-            "Sternum Cortical Density (superior)", "Sternum Cortical Density (inferior)"
+            "Índice E", "Índice D", "Elevación Potencial",
+            "Índice de Haller", "Índice de Asimetría", "Índice de Corrección", "Rotación Esternal", "Densidad Esternal",
+            "Densidad Cortical Esternal (superior)", "Densidad Cortical Esternal (inferior)"
         ]
 
         # Verificar que todas las columnas requeridas estén en el DataFrame
         if not all(col in df.columns for col in columnas_requeridas):
             st.error(f"🚨 El archivo debe contener las columnas requeridas para el análisis: {columnas_requeridas}")
         else:
-            # Renombrar columnas clave para facilitar el análisis
-            df.rename(columns={
-                "INDICE€": "Índice E",
-                "INDICE(D)": "Índice D",
-                "d(Potencial Lifting Distance)MIN": "Elevación Potencial",
-                "g (Haller Index)": "Índice de Haller",
-                "f (Assymetry Index)": "Índice de Asimetría",
-                "a (Sternal angle)": "Rotación Esternal",
-                "h (Correction Index)": "Índice de Corrección",
-                "b(sternal Thickness)MIN": "Anchura del Esternón (mínima)",
-                "MAX": "Anchura del Esternón (máxima)",
-                "Sternum Density": "Densidad Esternal",
-                "Sternum Cortical Density (superior)": "Densidad Cortical Esternal (superior)",
-                "Sternum Cortical Density (inferior)": "Densidad Cortical Esternal (inferior)",
-                "AGE": "Edad"
-            }, inplace=True)
-
             # Distribución de variables anatómicas clave
             st.subheader("Distribución de Variables Anatómicas")
-            variables_anatomicas = ["Índice de Haller", "Índice de Asimetría", "Índice de Corrección",
-                         "Rotación Esternal", "Elevación Potencial", "Anchura del Esternón (mínima)", "Anchura del Esternón (máxima)", "Densidad Esternal", "Densidad Cortical Esternal (superior)",
-                         "Densidad Cortical Esternal (inferior)"]
-            selected_var = st.selectbox("Selecciona una variable para visualizar la distribución:", variables_anatomicas)
-
-            fig_hist = px.histogram(df, x=selected_var, nbins=20, marginal="box",
-                                    title=f"Distribución de {selected_var}")
+            selected_var = st.selectbox("Selecciona una variable para visualizar la distribución:",
+                                        analytics.variables_anatomicas)
+
+            if renderizado_agregado:
+                # Intervalos y cuantiles calculados aquí: al navegador no llega la columna completa
+                hist = calcular(analytics.histograma, vista.con(selected_var), 20)
+                fig_hist = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.2, 0.8],
+                                         vertical_spacing=0.03)
+                if hist.n:
+                    fig_hist.add_trace(go.Box(q1=[hist.caja["q1"]], median=[hist.caja["median"]],
+                                              q3=[hist.caja["q3"]], lowerfence=[hist.caja["lowerfence"]],
+                                              upperfence=[hist.caja["upperfence"]], mean=[hist.caja["mean"]],
+                                              name=selected_var, orientation="h", y=[selected_var],
+                                              marker_color="#636efa", showlegend=False), row=1, col=1)
+                    if len(hist.atipicos):
+                        fig_hist.add_trace(go.Scattergl(x=hist.atipicos, y=[selected_var] * len(hist.atipicos),
+                                                        mode="markers", marker_color="#636efa", showlegend=False),
+                                           row=1, col=1)
+                    fig_hist.add_trace(go.Bar(x=(hist.bordes[:-1] + hist.bordes[1:]) / 2, y=hist.conteos,
+                                              width=np.diff(hist.bordes), marker_color="#636efa", showlegend=False),
+                                       row=2, col=1)
+                fig_hist.update_yaxes(showticklabels=False, row=1, col=1)
+                fig_hist.update_layout(title=f"Distribución de {selected_var}", bargap=0)
+                fig_hist.update_xaxes(title_text=selected_var, row=2, col=1)
+                fig_hist.update_yaxes(title_text="count", row=2, col=1)
+            else:
+                fig_hist = px.histogram(vista.con([selected_var]).materializar(), x=selected_var, nbins=20, marginal="box",
+                                        title=f"Distribución de {selected_var}")
             st.plotly_chart(fig_hist, use_container_width=True)
 
             # 📊 Estadísticas clave
-            media = df[selected_var].mean()
-            desviacion = df[selected_var].std()
-            var_min = df[selected_var].min()
-            var_max = df[selected_var].max()
-            asimetria = skew(df[selected_var].dropna())
-            curtosis_val = kurtosis(df[selected_var].dropna())
+            media, desviacion, var_min, var_max, asimetria, curtosis_val = calcular(
+                analytics.estadisticas_variable, vista.con(selected_var))
 
             # Mostrar estadísticas
             col1, col2, col3 = st.columns(3)
@@ -712,11 +765,7 @@ if uploaded_file:
             st.subheader("Correlación entre Variables del TAC")
 
 
-                # Análisis de impacto en la efectividad del implante
-
-                # Calcular métricas de efectividad
-            df["Índice E"] = df["Índice E"] - df["Índice D"]
-            df["Efectividad"] = df["Índice E"] - df["Elevación Potencial"]
+                # Análisis de impacto en la efectividad del implante (Efectividad se calcula en la normalización)
 
             st.markdown("<br>", unsafe_allow_html=True)
 
@@ -764,18 +813,25 @@ Si la efectividad es alta (cercana a 0 o positiva), significa que la elevación
             st.markdown("#### **Mapa de Calor: Correlaciones entre Variables Anatómicas, Medidas Placas/Tornillos, Edad y Efectividad**")
 
 
-            variables_interes = ['Índice de Asimetría', 'Índice de Haller', 'Índice de Corrección', 'Rotación Esternal',
-                         'Densidad Esternal','Densidad Cortical Esternal (superior)', 'Densidad Cortical Esternal (inferior)',
-                         'b (screw length)', 'a (elevator plate)', 'Anchura del Esternón (mínima)',
-                         'Anchura del Esternón (máxima)','Elevación Potencial', 'Edad', 'Efectividad']
-            df_correlacion = df[variables_interes].apply(pd.to_numeric, errors='coerce')
-            correlaciones_anatomicas = df_correlacion.corr()
+            # r, n, p-valor e IC de todas las parejas en una sola pasada (memorizado por versión y filtros)
+            matriz_corr = calcular(analytics.matriz_correlacion, vista.con(analytics.variables_interes),
+                                   analytics.variables_interes)
+            correlaciones_anatomicas = matriz_corr.r
 
             if not correlaciones_anatomicas.empty:
-                fig, ax = plt.subplots(figsize=(12, 8))
-                sns.heatmap(correlaciones_anatomicas, annot=True, cmap='coolwarm', fmt='.2f', ax=ax)
-                plt.title('Mapa de Calor: Relación entre Variables de Interés')
-                st.pyplot(fig)
+                # Cada celda muestra r y su significación (* p<0.05, ** p<0.01, *** p<0.001)
+                anotaciones = correlaciones_anatomicas.map(lambda r: "" if pd.isna(r) else f"{r:.2f}") \
+                    + matriz_corr.p_valor.map(correlations.significacion)
+                # Figura cacheada por (hash de la matriz, estilo): interactiva con Plotly o imagen de seaborn
+                # (matplotlib solo se importa si se pide la imagen)
+                formato_mapa = st.radio("Formato del mapa de calor:", ["Interactivo", "Imagen"], horizontal=True)
+                titulo_mapa = 'Mapa de Calor: Relación entre Variables de Interés'
+                if formato_mapa == "Imagen":
+                    st.image(figures.heatmap_imagen(correlaciones_anatomicas, anotaciones, titulo_mapa))
+                else:
+                    st.plotly_chart(go.Figure(figures.heatmap_plotly(correlaciones_anatomicas, anotaciones,
+                                                                     titulo_mapa)), use_container_width=True)
+                st.caption("\\* p < 0.05, \\*\\* p < 0.01, \\*\\*\\* p < 0.001 (cada pareja con sus casos completos)")
                 st.write(
                     "**INTERPRETACIÓN:** "
                     "Este mapa de calor muestra las correlaciones entre diferentes variables anatómicas, medidas de tornillos y placas, edad y efectividad. ")
@@ -810,42 +866,56 @@ Si la efectividad es alta (cercana a 0 o positiva), significa que la elevación
 
             st.markdown("#### Visualización de correlaciones de interés")
 
-            correlation_pairs = [("Índice de Haller", "Elevación Potencial"),
-                                 ("Índice de Asimetría", "Rotación Esternal"),
-                                 ("Densidad Esternal", "Edad"),
-                                 ("Efectividad", "Índice de Haller"),
-                                 ("Efectividad", "Rotación Esternal")]
-
-            selected_pair = st.selectbox("Selecciona dos variables para evaluar su correlación:", correlation_pairs)
+            # Primero las parejas de interés y después cualquier otra pareja de variables
+            otras_parejas = [par for par in combinations(analytics.variables_interes, 2)
+                             if par not in analytics.correlation_pairs and par[::-1] not in analytics.correlation_pairs]
+            selected_pair = st.selectbox("Selecciona dos variables para evaluar su correlación:",
+                                         analytics.correlation_pairs + otras_parejas,
+                                         format_func=lambda par: f"{par[0]} ↔ {par[1]}")
 
             selected_x = selected_pair[0].strip()
             selected_y = selected_pair[1].strip()
 
-            df_corr = df_correlacion[[selected_x, selected_y]].dropna()
+            resultado_corr = calcular(analytics.correlacion_par, vista.con([selected_x, selected_y]), selected_x,
+                                      selected_y, matriz_corr)
+            df_corr = resultado_corr.datos
 
 
-            if len(df_filtered) > 1:
-                correlation, p_value = pearsonr(df_corr[selected_x], df_corr[selected_y])
-
-                # 🔹 Interpretación según Taylor (1990)
-                if abs(correlation) >= 0.80:
-                    interpretation = "✅ **Muy fuerte**"
-                elif abs(correlation) >= 0.60:
-                    interpretation = "🟢 **Fuerte**"
-                elif abs(correlation) >= 0.40:
-                    interpretation = "🔵 **Moderada**"
-                elif abs(correlation) >= 0.20:
-                    interpretation = "🟡 **Débil**"
-                else:
-                    interpretation = "🔴 **Muy débil**"
+            if resultado_corr.n > 1:
+                correlation, p_value = resultado_corr.r, resultado_corr.p_valor
 
 
                 # Crear gráfico de dispersión
-                fig_scatter = px.scatter(
-                    df_corr, x=selected_x, y=selected_y, trendline="ols",
-                    title=f"Correlación entre {selected_x} y {selected_y}"
-                )
+                if renderizado_agregado:
+                    # WebGL con una muestra que conserva la densidad; la recta OLS se ajusta sobre todos
+                    # los puntos y se memoriza por pareja y filtros
+                    muestra = calcular(analytics.submuestreo, df_corr, selected_x, selected_y, MAX_PUNTOS)
+                    ajuste = calcular(analytics.ajuste_ols, df_corr, selected_x, selected_y)
+                    titulo = f"Correlación entre {selected_x} y {selected_y}"
+                    if len(muestra) < len(df_corr):
+                        titulo += f" (muestra de {len(muestra)} de {len(df_corr)} casos)"
+                    fig_scatter = go.Figure(go.Scattergl(x=muestra[selected_x], y=muestra[selected_y],
+                                                         mode="markers", name="Casos"))
+                    fig_scatter.add_trace(go.Scattergl(x=ajuste.x, y=ajuste.y, mode="lines", name="OLS",
+                                                       hovertext=f"y = {ajuste.pendiente:.3g}·x + "
+                                                                 f"{ajuste.ordenada:.3g}, R² = {ajuste.r2:.3f}"))
+                    fig_scatter.update_layout(title=titulo, xaxis_title=selected_x, yaxis_title=selected_y,
+                                              showlegend=False)
+                else:
+                    fig_scatter = px.scatter(
+                        df_corr, x=selected_x, y=selected_y, trendline="ols",
+                        title=f"Correlación entre {selected_x} y {selected_y}"
+                    )
                 st.plotly_chart(fig_scatter, use_container_width=True)
+                st.caption(f"r = {correlation:.2f} (IC {matriz_corr.confianza:.0%}: {resultado_corr.ic_inferior:.2f} a "
+                           f"{resultado_corr.ic_superior:.2f}), p = {p_value:.3g}, n = {resultado_corr.n}")
+                if usar_remuestreo:
+                    remuestreo = calcular(analytics.correlacion_par_remuestreo, vista.con([selected_x, selected_y]),
+                                          selected_x, selected_y,
+                                          n_remuestreos)
+                    st.caption(f"Remuestreo ({remuestreo.n_resamples} réplicas): IC bootstrap "
+                               f"{remuestreo.ic_inferior:.2f} a {remuestreo.ic_superior:.2f}, "
+                               f"p por permutación = {remuestreo.p_valor:.3g}")
 
 
                 # Mensaje con la interpretación de la correlación
@@ -879,25 +949,41 @@ Si la efectividad es alta (cercana a 0 o positiva), significa que la elevación
 
 
 
-    with tabs[3]:
+    if seccion == "Incidencias":
         st.header("Análisis de Incidencias")
         st.write(
             "En esta sección se analizan las incidencias relacionadas con la sujeción de los tornillos intraplacas y otros problemas detectados.")
 
-        df['Fila Roja'] = df.apply(contiene_palabra_clave, axis=1)
+        # Indicadores de incidencia de las filas que pasan los filtros globales
+        # Índice de incidencias del registro completo (una vez por versión); los filtros solo seleccionan filas
+        indice_completo = get_incident_index(version, df)
+        indice = vista.sobre(indice_completo)
+        incidencias = {m: vista.donde(indice_completo[m].to_numpy(), m) for m in momentos + ["Fila Roja"]}
+
+        # Búsqueda en diagnósticos y observaciones sobre el índice invertido del registro (una vez por
+        # versión): sin acentos ni mayúsculas, con variantes catalanas, prefijos (dolor*) y "frases"
+        st.subheader("🔎 Buscar en Diagnósticos y Observaciones")
+        consulta = st.text_input("Términos, prefijos o frases entre comillas",
+                                 placeholder='placa, separ*, "rotura de tornillo"', key="busqueda_texto")
+        if consulta.strip():
+            indice_texto = get_search_index(version, df)
+            encontrados = vista.donde(indice_texto.mascara(consulta), ("busqueda", consulta))
+            st.write(f"**Casos que mencionan la búsqueda**: {len(encontrados)}")
+            if len(encontrados):
+                columnas_texto = [c for c in columnas_busqueda if c in df.columns]
+                resultados = encontrados.con(["CASE", "COUNTRY", "YEAR"] + columnas_texto).materializar()
+                coincidencias = indice_texto.columnas_coincidentes(consulta, np.flatnonzero(encontrados.mascara))
+                st.dataframe(resultados.assign(**{"Columna Coincidente": coincidencias.to_numpy()}))
 
         # Streamlit UI
 
         st.subheader("Incidencias Intraoperatorias")
 
         # Filtro para mostrar solo incidencias intraoperatorias
-        df_incidencias_intraoperatorias = df[
-            ((df['COMPLICATIONS INTRAOPERATORY'].notna()) & (df['COMPLICATIONS INTRAOPERATORY'] != 'NO INCIDENCIAS')) |
-            (df['RESULT'] == 'NO OK')
-            ]
+        df_incidencias_intraoperatorias = incidencias["Intraoperatorias"]
 
         st.write(f"**Número de incidencias intraoperatorias detectadas**: {len(df_incidencias_intraoperatorias)}")
-        st.dataframe(df_incidencias_intraoperatorias)
+        st.dataframe(df_incidencias_intraoperatorias.materializar())
 
 
 
@@ -905,9 +991,9 @@ Si la efectividad es alta (cercana a 0 o positiva), significa que la elevación
         st.write("#### 📊 Frecuencia de Incidencias Intraoperatorias")
 
         # Contar incidencias
-        frecuencia_incidencias = df_incidencias_intraoperatorias[
-            'COMPLICATIONS INTRAOPERATORY'].value_counts().reset_index()
-        frecuencia_incidencias.columns = ['Tipo de Incidencia', 'Frecuencia']
+        frecuencia_incidencias = calcular(analytics.frecuencia_valores,
+                                          df_incidencias_intraoperatorias.con(['COMPLICATIONS INTRAOPERATORY']),
+                                          ['COMPLICATIONS INTRAOPERATORY'])
 
         # Verificar si hay datos
         if not frecuencia_incidencias.empty:
@@ -941,32 +1027,18 @@ Si la efectividad es alta (cercana a 0 o positiva), significa que la elevación
 
         # Filtro de incidencias en el follow-up
         st.subheader("Incidencias Follow-Up")
-        df_incidencias_follow_up = df[
-            ((df['DIAGNOSIS 1'].notna()) & (df['DIAGNOSIS 1'] != 'OK') & ~df['DIAGNOSIS 1'].str.contains('NO SINTOMAS',
-                                                                                                         na=False,
-                                                                                                         case=False)) |
-            ((df['DIAGNOSIS 2'].notna()) & (df['DIAGNOSIS 2'] != 'OK') & ~df['DIAGNOSIS 2'].str.contains('NO SINTOMAS',
-                                                                                                         na=False,
-                                                                                                         case=False)) |
-            ((df['OBSERVATIONS 1'].notna()) & ~df['OBSERVATIONS 1'].str.contains('content', na=False, case=False) & ~df[
-                'OBSERVATIONS 1'].str.contains('molt bè', na=False, case=False)) |
-            ((df['OBSERVATIOS 2'].notna()) & ~df['OBSERVATIOS 2'].str.contains('Retirada de la placa', na=False,
-                                                                               case=False) & ~df[
-                'OBSERVATIOS 2'].str.contains('no ha presentado mas sintomas', na=False, case=False))]
+        df_incidencias_follow_up = incidencias["Follow-up"]
 
         st.write(f"**Número de incidencias durante el follow-up**: {len(df_incidencias_follow_up)}")
-        st.dataframe(df_incidencias_follow_up)
+        st.dataframe(df_incidencias_follow_up.materializar())
 
 
         st.write("#### 📊 Frecuencia de Incidencias Follow-Up")
 
         # Unir ambas columnas en una sola serie y contar las ocurrencias
-        frecuencia_incidencias = (
-            pd.concat([df_incidencias_follow_up['DIAGNOSIS 1'], df_incidencias_follow_up['DIAGNOSIS 2']])
-            .value_counts()
-            .reset_index()
-        )
-        frecuencia_incidencias.columns = ['Tipo de Incidencia', 'Frecuencia']
+        frecuencia_incidencias = calcular(analytics.frecuencia_valores,
+                                          df_incidencias_follow_up.con(['DIAGNOSIS 1', 'DIAGNOSIS 2']),
+                                          ['DIAGNOSIS 1', 'DIAGNOSIS 2'])
 
         # Verificar si hay datos
         if not frecuencia_incidencias.empty:
@@ -999,36 +1071,15 @@ Si la efectividad es alta (cercana a 0 o positiva), significa que la elevación
 
         # Filtro de incidencias en la explantación
         st.subheader("Incidencias Explantación")
-        df_incidencias_explantacion = df[
-            ((df['OBSERVATIONS2'].notna()) & ~df['OBSERVATIONS2'].str.contains('successful', na=False, case=False)) |
-            df['COMPLICATIONS'].notna() |
-            ((df['REMOVAL REASON'].notna()) & ~df['REMOVAL REASON'].str.contains('time for removal has been completed',
-                                                                                 na=False, case=False))
-            ]
+        df_incidencias_explantacion = incidencias["Explantación"]
         st.write(f"**Número de incidencias durante la explantación**: {len(df_incidencias_explantacion)}")
-        st.dataframe(df_incidencias_explantacion)
+        st.dataframe(df_incidencias_explantacion.materializar())
 
         st.subheader("Incidencias Totales")
 
-        # Concatenar los DataFrames y eliminar duplicados
-        df_incidencias = pd.concat(
-            [df_incidencias_intraoperatorias, df_incidencias_follow_up, df_incidencias_explantacion]).drop_duplicates()
-
-        # Contar el número total de incidencias
-        total_incidencias = len(df_incidencias)
-
-        # Contar incidencias en cada momento
-        incidencias_por_momento = {
-            "Intraoperatorias": len(df_incidencias_intraoperatorias),
-            "Follow-up": len(df_incidencias_follow_up),
-            "Explantación": len(df_incidencias_explantacion),
-        }
-
-        # Convertir a DataFrame
-        df_incidencias_momento = pd.DataFrame(list(incidencias_por_momento.items()), columns=["Momento", "Cantidad"])
-
-        # Calcular porcentaje
-        df_incidencias_momento["Porcentaje"] = (df_incidencias_momento["Cantidad"] / total_incidencias) * 100
+        # Incidencias únicas (una fila cuenta una vez aunque tenga incidencias en varios momentos)
+        # y cantidad/porcentaje por momento, a partir de los indicadores del índice
+        total_incidencias, df_incidencias_momento = resumen_por_momento(indice)
 
 
         st.write(f"**Total de incidencias únicas:** {total_incidencias}")
@@ -1064,28 +1115,17 @@ Si la efectividad es alta (cercana a 0 o positiva), significa que la elevación
         # Análisis de pacientes con incidencias en rojo
         st.subheader("🟥 Pacientes con Incidencias en Rojo vs. Base de Datos Completa")
         st.write("Pacientes con incidencias marcadas en rojo en el Excel:")
-        st.dataframe(df[df['Fila Roja']])
-
-        df_rojo = df[df['Fila Roja']]
-        df_normal = df[~df['Fila Roja']]
-
-        # Convertir a numérico, forzando errores a NaN
-        df_rojo[variables_interes] = df_rojo[variables_interes].apply(pd.to_numeric, errors='coerce')
-        df_normal[variables_interes] = df_normal[variables_interes].apply(pd.to_numeric, errors='coerce')
-
-        # Calcular medias
-        medias_rojo = df_rojo[variables_interes].mean()
-        medias_total = df_normal[variables_interes].mean()
-
-        # Prueba estadística (t-test)
-        p_values = [ttest_ind(df_rojo[var].dropna(), df_normal[var].dropna(), equal_var=False).pvalue for var in
-                    variables_interes]
-
-        # Construcción del DataFrame comparativo
-        df_comparacion = pd.DataFrame({"Variable": variables_interes,
-                                       "Media Incidencias en Rojo": medias_rojo,
-                                       "Media General": medias_total,
-                                       "P-valor": p_values})
+        st.dataframe(incidencias["Fila Roja"].materializar().join(
+            indice.loc[indice['Fila Roja'], ["Palabra Clave", "Columna Palabra Clave"]]))
+
+        # Medias de las filas rojas frente al resto y p-valor del t-test de Welch
+        if usar_remuestreo:
+            df_comparacion = calcular(analytics.comparar_grupos_remuestreo, vista.con(analytics.variables_interes),
+                                      indice['Fila Roja'],
+                                      analytics.variables_interes, n_remuestreos)
+        else:
+            df_comparacion = calcular(analytics.comparar_grupos, vista.con(analytics.variables_interes),
+                                      indice['Fila Roja'], analytics.variables_interes)
 
 
         # Resaltar diferencias significativas
@@ -1106,7 +1146,8 @@ Si la efectividad es alta (cercana a 0 o positiva), significa que la elevación
             return ''
 
         st.write("📊 Comparación de medidas entre incidencias en rojo y la base de datos completa:")
-        st.dataframe(df_comparacion.style.applymap(highlight_significant, subset=['P-valor']))
+        st.dataframe(df_comparacion.style.map(
+            highlight_significant, subset=[col for col in df_comparacion.columns if col.startswith('P-valor')]))
 
         # Gráfico de diferencias
         fig = go.Figure()
@@ -1118,8 +1159,30 @@ Si la efectividad es alta (cercana a 0 o positiva), significa que la elevación
                           xaxis_title="Variable", yaxis_title="Valor Medio", barmode='group')
         st.plotly_chart(fig)
 
+        # Cualquier agrupación (momento de incidencia, resultado, país): cada grupo frente al resto,
+        # con todas las variables en una pasada y sin crear subconjuntos del registro
+        st.subheader("Comparación de Medidas por Grupos")
+        agrupaciones = {"Incidencias en rojo": indice["Fila Roja"]}
+        agrupaciones.update({f"Incidencias {m}": indice[m] for m in momentos})
+        agrupaciones.update({col: vista.con(col) for col in ["RESULT", "COUNTRY"] if col in df.columns})
+        agrupacion = st.selectbox("Comparar por:", list(agrupaciones))
+        df_grupos = calcular(analytics.comparar_por, vista.con(analytics.variables_interes),
+                             agrupaciones[agrupacion], analytics.variables_interes)
+        st.dataframe(df_grupos.style.map(highlight_significant, subset=['P-valor']))
+
         st.success("✅ Análisis completado. Explora las visualizaciones interactivas y obtén insights en tiempo real.")
 
-    with tabs[4]:
+    if seccion == "Exploración Adicional":
         st.header("Exploración Adicional")
-        st.write("Sección abierta para explorar nuevos patrones y análisis adicionales avanzados.")
\ No newline at end of file
+        st.write("Sección abierta para explorar nuevos patrones y análisis adicionales avanzados.")
+
+        # Memoria de cada columna del registro tal como se leyó y tras normalizar (tipos compactos)
+        with st.expander("Memoria del registro por columna"):
+            registro_leido = frame_cache.get(version)
+            if registro_leido is None:
+                st.caption("El registro leído ya no está en memoria; vuelve a subir el fichero para ver el informe.")
+            else:
+                memoria = calcular(informe_memoria, registro_leido, df)
+                st.write(f"Total: **{memoria['Bytes Antes'].sum() / 1e6:.2f} MB** leídos → "
+                         f"**{memoria['Bytes Después'].sum() / 1e6:.2f} MB** normalizados")
+                st.dataframe(memoria)
\ No newline at end of file
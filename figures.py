@@ -0,0 +1,95 @@
+import hashlib
+import io
+
+import numpy as np
+import pandas as pd
+
+from ingestion import FrameCache
+
+
+# Figuras ya renderizadas (bytes PNG/SVG o especificación de Plotly), por (hash de la matriz, estilo).
+# Un rerun con la misma matriz no vuelve a dibujar nada.
+figure_cache = FrameCache(max_bytes=64 * 1024 * 1024)
+
+
+def hash_matriz(*marcos):
+    h = hashlib.sha256()
+    for marco in marcos:
+        if marco is None:
+            continue
+        h.update(pd.util.hash_pandas_object(marco, index=True).to_numpy().tobytes())
+        h.update("|".join(map(str, marco.columns)).encode())
+    return h.hexdigest()
+
+
+def _clave(tipo, matriz, anotaciones, estilo):
+    return (tipo, hash_matriz(matriz, anotaciones), tuple(sorted(estilo.items())))
+
+
+# Mapa de calor con matplotlib/seaborn como imagen (PNG o SVG). Las librerías de dibujo solo se
+# importan aquí, cuando se pide la imagen, y la figura se cierra tras guardarla.
+def heatmap_imagen(matriz, anotaciones=None, titulo="", formato="png", cmap="coolwarm", figsize=(12, 8),
+                   cache=figure_cache):
+    estilo = {"titulo": titulo, "formato": formato, "cmap": cmap, "figsize": figsize}
+
+    def render():
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+
+        fig, ax = plt.subplots(figsize=figsize)
+        try:
+            if anotaciones is None:
+                sns.heatmap(matriz, annot=True, cmap=cmap, fmt='.2f', ax=ax)
+            else:
+                sns.heatmap(matriz, annot=anotaciones, cmap=cmap, fmt='', ax=ax)
+            ax.set_title(titulo)
+            salida = io.BytesIO()
+            fig.savefig(salida, format=formato, bbox_inches="tight")
+            return salida.getvalue()
+        finally:
+            plt.close(fig)
+
+    return cache.get_or_compute(_clave("imagen", matriz, anotaciones, estilo), render)
+
+
+# Mapa de calor interactivo de Plotly; se guarda la especificación (dict) de la figura
+def heatmap_plotly(matriz, anotaciones=None, titulo="", colorscale="RdBu_r", zmin=-1, zmax=1, altura=700,
+                   cache=figure_cache):
+    estilo = {"titulo": titulo, "colorscale": colorscale, "zmin": zmin, "zmax": zmax, "altura": altura}
+
+    def render():
+        import plotly.graph_objects as go
+
+        valores = matriz.to_numpy(dtype=np.float64)
+        texto = anotaciones.to_numpy() if anotaciones is not None else np.vectorize(
+            lambda v: "" if np.isnan(v) else f"{v:.2f}")(valores)
+        fig = go.Figure(go.Heatmap(z=valores, x=list(matriz.columns), y=list(matriz.index), text=texto,
+                                   texttemplate="%{text}", colorscale=colorscale, zmin=zmin, zmax=zmax,
+                                   hoverongaps=False))
+        fig.update_layout(title=titulo, height=altura, yaxis=dict(autorange="reversed"))
+        return fig.to_dict()
+
+    return cache.get_or_compute(_clave("plotly", matriz, anotaciones, estilo), render)
+
+
+# Añade a una figura de evolución anual las líneas discontinuas de previsión (una por país, del color
+# de su traza observada) y la banda del intervalo de predicción. anuales: YEAR, COUNTRY, Previsión,
+# Inferior, Superior (forecasting.previsiones_anuales).
+def capa_prevision(fig, anuales, confianza, color=None):
+    import plotly.graph_objects as go
+
+    colores = {traza.name: traza.line.color for traza in fig.data}
+    for pais, datos in anuales.groupby("COUNTRY", sort=False):
+        tono = color or colores.get(pais) or "gray"
+        nombre = f"{pais} (previsión)" if color is None else "Previsión"
+        fig.add_trace(go.Scatter(x=np.concatenate([datos["YEAR"], datos["YEAR"][::-1]]),
+                                 y=np.concatenate([datos["Superior"], datos["Inferior"][::-1]]),
+                                 fill="toself", fillcolor=tono, opacity=0.15, line=dict(width=0),
+                                 hoverinfo="skip", showlegend=False, legendgroup=nombre))
+        fig.add_trace(go.Scatter(x=datos["YEAR"], y=datos["Previsión"], mode="lines+markers",
+                                 line=dict(dash="dash", color=tono), marker=dict(symbol="circle-open"),
+                                 name=nombre, legendgroup=nombre,
+                                 hovertemplate=f"%{{x}}: %{{y:.1f}} (IC {confianza:.0%})<extra>{nombre}</extra>"))
+    return fig
@@ -0,0 +1,245 @@
+import hashlib
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from aggregates import codigo_mes
+from ingestion import FrameCache
+
+
+# Series mensuales por país: (nombre, columna de fecha que fija el mes, columna de medida o None).
+# Las medidas de tornillo y placa se cuentan por mes del informe, como las gráficas de evolución.
+especificaciones = [
+    ("Informes", "DATE", None),
+    ("Intervenciones", "SURGERY DATE", None),
+    ("Tornillo", "DATE", "b (screw length)"),
+    ("Placa", "DATE", "a (elevator plate)"),
+]
+
+# Meses mínimos (desde el primer mes con casos) para ajustar un modelo; con menos, media reciente
+MIN_MESES = 12
+# A partir de este número de series por ajustar se reparten en un pool de procesos
+SERIES_POOL = 32
+# Nivel de los intervalos de predicción
+CONFIANZA = 0.8
+
+
+class SeriesMensuales(NamedTuple):
+    claves: pd.DataFrame  # una fila por serie: Serie, COUNTRY, Medida
+    meses: np.ndarray  # códigos de mes (año * 12 + mes - 1) de las columnas
+    valores: np.ndarray  # series × meses
+    ultimos: np.ndarray  # último mes observado de cada serie
+
+
+# Último mes completo de una columna de fechas (el de su última fecha solo cuenta si ya ha terminado).
+# Cada serie se corta en su propia columna: las explantaciones programadas o las cirugías posteriores
+# al último informe no alargan con ceros las series de informes.
+def ultimo_mes(fechas, corte=None):
+    ultima = pd.to_datetime(fechas, errors="coerce").max()
+    if corte is not None and pd.notna(ultima):
+        ultima = min(ultima, corte)
+    if pd.isna(ultima):
+        return None
+    return int(ultima.year * 12 + ultima.month - 1 - (0 if ultima.is_month_end else 1))
+
+
+# Conteos mensuales de todas las series en una matriz densa (vacía tras el último mes de cada serie)
+def series_mensuales(df, corte=None):
+    partes, ultimos = [], {}
+    for serie, col_fecha, col_medida in especificaciones:
+        if col_fecha not in df.columns or "COUNTRY" not in df.columns or (col_medida and col_medida not in df.columns):
+            continue
+        ultimo = ultimo_mes(df[col_fecha], corte)
+        if ultimo is None:
+            continue
+        meses = codigo_mes(pd.to_datetime(df[col_fecha], errors="coerce"))
+        datos = pd.DataFrame({"COUNTRY": df["COUNTRY"].astype(object), "MES": meses,
+                              "Medida": df[col_medida].astype(object) if col_medida else ""})
+        datos = datos[datos.notna().all(axis=1) & (datos["MES"] <= ultimo)]
+        if datos.empty:
+            continue
+        conteos = datos.groupby(["COUNTRY", "Medida", "MES"]).size()
+        partes.append(pd.concat({serie: conteos}, names=["Serie"]))
+        ultimos[serie] = ultimo
+    if not partes:
+        return SeriesMensuales(pd.DataFrame(columns=["Serie", "COUNTRY", "Medida"]),
+                               np.empty(0, dtype=np.int64), np.zeros((0, 0)), np.empty(0, dtype=np.int64))
+    matriz = pd.concat(partes).unstack("MES", fill_value=0)
+    meses = np.arange(int(matriz.columns.min()), max(ultimos.values()) + 1)
+    claves = matriz.index.to_frame(index=False)
+    ultimos = claves["Serie"].map(ultimos).to_numpy(dtype=np.int64)
+    valores = matriz.reindex(columns=meses, fill_value=0).to_numpy(dtype=np.float64)
+    valores[meses[None, :] > ultimos[:, None]] = np.nan
+    return SeriesMensuales(claves, meses, valores, ultimos)
+
+
+class Ajuste(NamedTuple):
+    parametros: np.ndarray  # parámetros del modelo (vacío si es la media reciente)
+    media: np.ndarray  # previsión de los meses del horizonte
+    inferior: np.ndarray
+    superior: np.ndarray
+    metodo: str
+
+
+# Se ejecuta en los procesos del pool: ETS con tendencia amortiguada (statsmodels) sobre la serie
+# desde su primer mes con casos; arranca de los parámetros del ajuste anterior si los hay
+def _ajustar(tarea):
+    historia, inicio, horizonte = tarea
+    if len(historia) < MIN_MESES or np.ptp(historia) == 0:
+        reciente = historia[-MIN_MESES:]
+        margen = NormalDist().inv_cdf(0.5 + CONFIANZA / 2) * reciente.std()
+        media = np.full(horizonte, reciente.mean())
+        return Ajuste(np.empty(0), media, np.maximum(media - margen, 0), media + margen, "Media reciente")
+
+    from statsmodels.tsa.exponential_smoothing.ets import ETSModel
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # avisos de convergencia de series cortas o con muchos ceros
+        modelo = ETSModel(pd.Series(historia), error="add", trend="add", damped_trend=True)
+        ajuste = modelo.fit(start_params=inicio, disp=False)
+        prediccion = ajuste.get_prediction(start=len(historia), end=len(historia) + horizonte - 1)
+        marco = prediccion.summary_frame(alpha=1 - CONFIANZA)
+    return Ajuste(np.asarray(ajuste.params), np.maximum(marco["mean"].to_numpy(), 0),
+                  np.maximum(marco["pi_lower"].to_numpy(), 0), np.maximum(marco["pi_upper"].to_numpy(), 0), "ETS")
+
+
+def _ejecutar(tareas, workers=None):
+    if workers is None:
+        workers = 1 if len(tareas) < SERIES_POOL else None
+    if workers == 1 or len(tareas) <= 1:
+        return [_ajustar(tarea) for tarea in tareas]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_ajustar, tareas, chunksize=8))
+
+
+# Modelos ajustados por (serie, historia, horizonte): entre versiones del registro solo se reajustan
+# las series que han cambiado
+modelos_cache = FrameCache(max_bytes=32 * 1024 * 1024)
+# Última historia y parámetros de cada serie, para arrancar el reajuste cuando llegan meses nuevos
+_ultimos = {}
+
+
+def _hash(historia):
+    return hashlib.sha256(historia.tobytes()).hexdigest()
+
+
+# Ajusta (o recupera) un modelo por serie, con el horizonte (meses) de cada una. Las series que solo
+# han crecido con meses nuevos se reajustan partiendo de los parámetros anteriores.
+def ajustar_series(series, horizontes, workers=None, cache=modelos_cache):
+    claves = list(series.claves.itertuples(index=False, name=None))
+    ajustes = [None] * len(claves)
+    pendientes = []
+    for i, (clave, fila) in enumerate(zip(claves, series.valores)):
+        fila = fila[~np.isnan(fila)]
+        historia = fila[np.argmax(fila > 0):]
+        key = (clave, _hash(historia), horizontes[i])
+        ajustes[i] = cache.get(key)
+        if ajustes[i] is not None:
+            continue
+        inicio = None
+        previa = _ultimos.get(clave)
+        if previa is not None and previa[1].size and len(previa[0]) < len(historia) \
+                and np.array_equal(previa[0], historia[:len(previa[0])]):
+            inicio = previa[1]
+        pendientes.append((i, key, clave, historia, inicio))
+
+    resultados = _ejecutar([(historia, inicio, horizontes[i]) for i, _, _, historia, inicio in pendientes], workers)
+    for (i, key, clave, historia, _), ajuste in zip(pendientes, resultados):
+        cache.put(key, ajuste)
+        _ultimos[clave] = (historia, ajuste.parametros)
+        ajustes[i] = ajuste
+    return ajustes
+
+
+class Prevision(NamedTuple):
+    series: SeriesMensuales
+    # Una fila por serie y mes previsto: Serie, COUNTRY, Medida, MES, Previsión, Inferior, Superior, Método
+    meses: pd.DataFrame
+    confianza: float
+
+
+# Previsión mensual de todas las series, desde su último mes observado hasta el final del año siguiente
+def prevision_mensual(df, corte=None, workers=None):
+    series = series_mensuales(df, corte)
+    horizontes = (series.ultimos // 12 + 1) * 12 + 11 - series.ultimos
+    ajustes = ajustar_series(series, horizontes, workers)
+
+    n = len(ajustes)
+    marco = series.claves.loc[np.repeat(np.arange(n), horizontes)].reset_index(drop=True)
+    marco["MES"] = np.concatenate([np.arange(u + 1, u + 1 + h) for u, h in zip(series.ultimos, horizontes)]) \
+        if n else np.empty(0, dtype=np.int64)
+    for columna, campo in [("Previsión", "media"), ("Inferior", "inferior"), ("Superior", "superior")]:
+        marco[columna] = np.concatenate([getattr(a, campo) for a in ajustes]) if n else np.empty(0)
+    marco["Método"] = np.repeat([a.metodo for a in ajustes], horizontes) if n else np.empty(0, dtype=object)
+    return Prevision(series, marco, CONFIANZA)
+
+
+def _seleccion(marco, serie, paises, medida):
+    filas = (marco["Serie"] == serie).to_numpy()
+    if paises is not None:
+        filas &= marco["COUNTRY"].isin(paises).to_numpy()
+    if medida is not None:
+        filas &= (marco["Medida"] == medida).to_numpy()
+    return filas
+
+
+# Totales anuales previstos de una serie (por país), sumando los meses ya observados del año y los
+# previstos. Empieza en el último año completo observado, punto de partida de la línea de previsión.
+# Los intervalos anuales suman los límites mensuales (conservadores).
+def previsiones_anuales(prevision, serie, paises=None, medida=None):
+    columnas = ["YEAR", "COUNTRY", "Previsión", "Inferior", "Superior"]
+    filas = _seleccion(prevision.series.claves, serie, paises, medida)
+    if not filas.any():
+        return pd.DataFrame(columns=columnas)
+
+    observados = pd.DataFrame(prevision.series.valores[filas], columns=prevision.series.meses)
+    observados["COUNTRY"] = prevision.series.claves.loc[filas, "COUNTRY"].to_numpy()
+    observados = observados.melt(id_vars="COUNTRY", var_name="MES", value_name="Previsión").dropna()
+    observados[["Inferior", "Superior"]] = observados[["Previsión", "Previsión"]].to_numpy()
+    previstos = prevision.meses.loc[_seleccion(prevision.meses, serie, paises, medida),
+                                    ["COUNTRY", "MES", "Previsión", "Inferior", "Superior"]]
+
+    todos = pd.concat([observados, previstos], ignore_index=True)
+    todos["YEAR"] = todos["MES"].astype(np.int64) // 12
+    ultimo = int(prevision.series.ultimos[filas].min())
+    primero = ultimo // 12 if ultimo % 12 == 11 else ultimo // 12 - 1
+    todos = todos[todos["YEAR"] >= primero]
+    return todos.groupby(["YEAR", "COUNTRY"], as_index=False)[["Previsión", "Inferior", "Superior"]].sum()[columnas]
+
+
+# Las series se cuentan por mes de su fecha (DATE o SURGERY DATE) y las gráficas por año del registro
+# (YEAR): el primer punto de la previsión (último año completo, ya observado) se sustituye por el valor
+# de la gráfica para que las dos líneas empalmen. observados: Series por YEAR (totales) o por
+# (YEAR, COUNTRY).
+def empalmar(anuales, observados):
+    if anuales.empty:
+        return anuales
+    if observados.index.nlevels == 1:
+        claves = pd.Index(anuales["YEAR"].astype(np.int64))
+        indice = pd.Index(observados.index.astype(np.int64))
+    else:
+        claves = pd.MultiIndex.from_arrays([anuales["YEAR"].astype(np.int64), anuales["COUNTRY"].astype(object)])
+        indice = pd.MultiIndex.from_arrays([observados.index.get_level_values(0).astype(np.int64),
+                                            observados.index.get_level_values(1).astype(object)])
+    valores = observados.set_axis(indice).reindex(claves).to_numpy(dtype=np.float64)
+    filas = (anuales["YEAR"] == anuales["YEAR"].min()).to_numpy() & ~np.isnan(valores)
+    anuales = anuales.copy()
+    for columna in ["Previsión", "Inferior", "Superior"]:
+        anuales.loc[filas, columna] = valores[filas]
+    return anuales
+
+
+# Totales anuales previstos de la suma de los países (COUNTRY = "Total")
+def total_anual(anuales):
+    return anuales.groupby("YEAR", as_index=False)[["Previsión", "Inferior", "Superior"]].sum().assign(COUNTRY="Total")
+
+
+forecast_cache = FrameCache()
+
+
+def get_forecast(version, df, cache=forecast_cache):
+    return cache.get_or_compute(version, lambda: prevision_mensual(df))
@@ -0,0 +1,103 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from normalization import estado_map
+
+
+# Etapas del embudo en orden (los estados del caso): un caso en el estado k ha pasado por 1..k
+etapas = list(estado_map.values())
+
+# Transiciones con fechas en el registro: (etapa de inicio, etapa final, columna inicio, columna final)
+transiciones_fechadas = [
+    (estado_map[3], estado_map[4], "DATE", "SURGERY DATE"),
+    (estado_map[4], estado_map[5], "SURGERY DATE", "DATE2"),
+]
+
+
+class Embudo(NamedTuple):
+    # Una fila por grupo y etapa: Grupo, Etapa, Casos (alcanzan la etapa), Abandonos (siguen en ella),
+    # Conversión (a la etapa siguiente), Conversión Acumulada (desde la primera etapa)
+    etapas: pd.DataFrame
+    sin_estado: int  # casos con un estado fuera del embudo o vacío
+
+
+# Embudo por estado a partir del cubo de conteos, en una sola pasada para todos los grupos: se suman
+# los casos por (grupo, código de estado) y los que alcanzan cada etapa son la suma acumulada inversa
+# sobre el eje de estados. Sin recorrer el registro.
+def conversion_funnel(cubo, por=None):
+    dims = ([por] if por else []) + ["STATE NUMBER"]
+    conteos = cubo.counts.sum(axis=tuple(i for i, dim in enumerate(cubo.dims) if dim not in dims))
+    if por and cubo.dims.index(por) > cubo.dims.index("STATE NUMBER"):
+        conteos = conteos.T
+    conteos = conteos.reshape(-1, conteos.shape[-1])
+
+    # Columnas en el orden de las etapas (las etapas sin casos en el cubo quedan a cero)
+    posiciones = cubo.labels["STATE NUMBER"].get_indexer(etapas)
+    por_etapa = np.where(posiciones >= 0, conteos[:, np.maximum(posiciones, 0)], 0)
+    sin_estado = int(conteos.sum() - por_etapa.sum())
+
+    # Grupos con casos en alguna etapa (sin el valor vacío)
+    grupos = cubo.labels[por] if por else pd.Index(["Total"])
+    con_casos = np.asarray(pd.notna(grupos)) & (por_etapa.sum(axis=1) > 0)
+    por_etapa, grupos = por_etapa[con_casos], grupos[con_casos]
+
+    alcanzan = np.cumsum(por_etapa[:, ::-1], axis=1)[:, ::-1]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        conversion = np.concatenate([alcanzan[:, 1:] / alcanzan[:, :-1],
+                                     np.full((len(alcanzan), 1), np.nan)], axis=1)
+        acumulada = alcanzan / alcanzan[:, :1]
+
+    n_etapas = len(etapas)
+    tabla = pd.DataFrame({
+        "Grupo": np.repeat(np.asarray(grupos, dtype=object), n_etapas),
+        "Etapa": pd.Categorical(np.tile(etapas, len(grupos)), categories=etapas, ordered=True),
+        "Casos": alcanzan.ravel().astype(np.int64),
+        "Abandonos": por_etapa.ravel().astype(np.int64),
+        "Conversión": conversion.ravel(),
+        "Conversión Acumulada": acumulada.ravel(),
+    })
+    return Embudo(tabla, sin_estado)
+
+
+# Cuantil (interpolación lineal, como np.quantile) de cada tramo de un array ordenado por tramos
+def _cuantil_tramos(valores, inicio, n, q):
+    posicion = inicio + q * (n - 1)
+    abajo = np.floor(posicion).astype(np.int64)
+    arriba = np.minimum(abajo + 1, inicio + n - 1)
+    return valores[abajo] + (posicion - abajo) * (valores[arriba] - valores[abajo])
+
+
+# Días entre las etapas con fecha (informe enviado -> operado -> retirado) de los casos que han
+# completado la transición: n, media, mediana y percentiles 25/75 por grupo. Se ordena una vez por
+# (grupo, días) y los cuantiles de todos los grupos se leen por posición.
+def tiempo_en_etapa(df, por=None):
+    if por and por in df.columns:
+        codigos, grupos = pd.factorize(df[por], sort=True)
+    else:
+        codigos, grupos = np.zeros(len(df), dtype=np.int64), pd.Index(["Total"])
+    partes = []
+    for inicio, fin, col_inicio, col_fin in transiciones_fechadas:
+        if col_inicio not in df.columns or col_fin not in df.columns:
+            continue
+        dias = (pd.to_datetime(df[col_fin], errors="coerce")
+                - pd.to_datetime(df[col_inicio], errors="coerce")).dt.days.to_numpy(dtype=np.float64)
+        validos = ~np.isnan(dias) & (dias >= 0) & (codigos >= 0)
+        orden = np.lexsort((dias[validos], codigos[validos]))
+        g, d = codigos[validos][orden], dias[validos][orden]
+        n = np.bincount(g, minlength=len(grupos))
+        con_datos = np.flatnonzero(n)
+        n_grupo = n[con_datos]
+        inicio_tramo = (np.cumsum(n) - n)[con_datos]
+        partes.append(pd.DataFrame({
+            "Grupo": np.asarray(grupos, dtype=object)[con_datos],
+            "Transición": f"{inicio} → {fin}",
+            "n": n_grupo,
+            "Mediana (días)": _cuantil_tramos(d, inicio_tramo, n_grupo, 0.5),
+            "Media (días)": np.bincount(g, weights=d, minlength=len(grupos))[con_datos] / n_grupo,
+            "P25 (días)": _cuantil_tramos(d, inicio_tramo, n_grupo, 0.25),
+            "P75 (días)": _cuantil_tramos(d, inicio_tramo, n_grupo, 0.75),
+        }))
+    columnas = ["Grupo", "Transición", "n", "Mediana (días)", "Media (días)", "P25 (días)", "P75 (días)"]
+    return pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=columnas)
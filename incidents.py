@@ -0,0 +1,191 @@
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from ingestion import FrameCache
+
+
+# Detectar filas con palabras clave en columnas específicas para incidencias separación tornillos intraplaca
+palabras_clave = ["INTRAPLACAS", "INTRAPLAQUES", "DESPRÈS", "DESPRENDIDO", "SEPARADO", "SEPARACIÓN", "SEPARADAS",
+                  "SOLTADO"]
+columnas_revisar = ['COMPLICATIONS INTRAOPERATORY', 'DIAGNOSIS 1', 'OBSERVATIONS 1', 'OBSERVATIOS 2', 'OBSERVATIONS2']
+
+
+# Versión original fila a fila (se mantiene como referencia para el benchmark)
+def contiene_palabra_clave(fila):
+    return any(any(palabra in str(fila[col]).upper() for palabra in palabras_clave) for col in columnas_revisar)
+
+
+# Plegado de acentos y mayúsculas: "Després" -> "DESPRES"
+def plegar(texto):
+    texto = unicodedata.normalize("NFKD", str(texto))
+    return "".join(c for c in texto if not unicodedata.combining(c)).upper()
+
+
+# Patrón de una palabra clave que admite cada letra acentuada con su acento o sin él, pero no con
+# otro acento: "DESPRÈS" (desprendido) -> DESPR[ÈE]S no coincide con "DESPRÉS" (después)
+def _patron_palabra(palabra, plegar_acentos=True):
+    if not plegar_acentos:
+        return re.escape(palabra)
+    partes = []
+    for letra in unicodedata.normalize("NFC", palabra):
+        base = plegar(letra)
+        partes.append(f"[{letra}{base}]" if base != letra else re.escape(letra))
+    return "".join(partes)
+
+
+# Detector vectorizado: una expresión regular con todas las palabras que se aplica sobre los
+# valores únicos de cada columna, no fila a fila. Con plegar_acentos, las palabras acentuadas
+# también se encuentran escritas sin acento.
+class KeywordMatcher:
+    def __init__(self, palabras=palabras_clave, columnas=columnas_revisar, plegar_acentos=True):
+        self.columnas = list(columnas)
+        # Palabras sin repetir, las más largas primero para que la alternancia prefiera la
+        # coincidencia más específica; cada una en su grupo para saber cuál ha coincidido
+        self.palabras = sorted(dict.fromkeys(palabras), key=len, reverse=True)
+        self.patron = re.compile("|".join(f"({_patron_palabra(p, plegar_acentos)})" for p in self.palabras))
+
+    def _buscar_columna(self, serie):
+        codes, uniques = pd.factorize(serie, use_na_sentinel=True)
+        resultado = np.full(len(serie), None, dtype=object)
+        if len(uniques) == 0:
+            return resultado
+        encontradas = np.array([self._buscar(v) for v in uniques], dtype=object)
+        validos = codes >= 0
+        resultado[validos] = encontradas[codes[validos]]
+        return resultado
+
+    def _buscar(self, valor):
+        m = self.patron.search(unicodedata.normalize("NFC", str(valor)).upper())
+        return self.palabras[m.lastindex - 1] if m else None
+
+    # Devuelve por fila: si hay coincidencia, la palabra encontrada y la columna donde aparece
+    # (la primera columna de la lista con coincidencia)
+    def match(self, df):
+        palabra = np.full(len(df), None, dtype=object)
+        columna = np.full(len(df), None, dtype=object)
+        for col in self.columnas:
+            if col not in df.columns:
+                continue
+            pendientes = pd.isna(palabra)
+            if not pendientes.any():
+                break
+            encontradas = self._buscar_columna(df[col])
+            nuevas = pendientes & pd.notna(encontradas)
+            palabra[nuevas] = encontradas[nuevas]
+            columna[nuevas] = col
+        return pd.DataFrame({
+            "Fila Roja": pd.notna(palabra),
+            "Palabra Clave": palabra,
+            "Columna Palabra Clave": columna,
+        }, index=df.index)
+
+
+keyword_matcher = KeywordMatcher()
+
+
+def detectar_palabras_clave(df, matcher=keyword_matcher):
+    return matcher.match(df)
+
+
+# Momentos de incidencia del índice
+momentos = ["Intraoperatorias", "Follow-up", "Explantación"]
+
+
+# Búsqueda de texto sin distinguir mayúsculas (equivale a .str.contains(texto, case=False, na=False)),
+# evaluada sobre los valores distintos de la columna
+def _contiene(serie, texto):
+    codes, uniques = pd.factorize(serie, use_na_sentinel=True)
+    texto = texto.lower()
+    encontrados = np.array([isinstance(v, str) and texto in v.lower() for v in uniques], dtype=bool)
+    resultado = np.zeros(len(serie), dtype=bool)
+    validos = codes >= 0
+    resultado[validos] = encontrados[codes[validos]]
+    return resultado
+
+
+def _columna(df, col):
+    return df[col] if col in df.columns else pd.Series(np.nan, index=df.index, dtype=object)
+
+
+# Comparación como array booleano; con cadenas de Arrow las comparaciones dan <NA> en los vacíos
+def _mascara(comparacion):
+    return comparacion.fillna(False).to_numpy(dtype=bool)
+
+
+# Condiciones de cada momento: lista de (columna, máscara). La fila es incidencia si cumple
+# alguna; el motivo es la primera columna que la cumple.
+def _condiciones(df):
+    intra = _columna(df, 'COMPLICATIONS INTRAOPERATORY')
+    result = _columna(df, 'RESULT')
+    diag1 = _columna(df, 'DIAGNOSIS 1')
+    diag2 = _columna(df, 'DIAGNOSIS 2')
+    obs1 = _columna(df, 'OBSERVATIONS 1')
+    obs2 = _columna(df, 'OBSERVATIOS 2')
+    obs_explant = _columna(df, 'OBSERVATIONS2')
+    complicaciones = _columna(df, 'COMPLICATIONS')
+    retirada = _columna(df, 'REMOVAL REASON')
+
+    return {
+        "Intraoperatorias": [
+            ('COMPLICATIONS INTRAOPERATORY', _mascara(intra.notna() & (intra != 'NO INCIDENCIAS'))),
+            ('RESULT', _mascara(result == 'NO OK')),
+        ],
+        "Follow-up": [
+            ('DIAGNOSIS 1', _mascara(diag1.notna() & (diag1 != 'OK')) & ~_contiene(diag1, 'NO SINTOMAS')),
+            ('DIAGNOSIS 2', _mascara(diag2.notna() & (diag2 != 'OK')) & ~_contiene(diag2, 'NO SINTOMAS')),
+            ('OBSERVATIONS 1', _mascara(obs1.notna()) & ~_contiene(obs1, 'content') & ~_contiene(obs1, 'molt bè')),
+            ('OBSERVATIOS 2', _mascara(obs2.notna()) & ~_contiene(obs2, 'Retirada de la placa')
+             & ~_contiene(obs2, 'no ha presentado mas sintomas')),
+        ],
+        "Explantación": [
+            ('OBSERVATIONS2', _mascara(obs_explant.notna()) & ~_contiene(obs_explant, 'successful')),
+            ('COMPLICATIONS', _mascara(complicaciones.notna())),
+            ('REMOVAL REASON', _mascara(retirada.notna())
+             & ~_contiene(retirada, 'time for removal has been completed')),
+        ],
+    }
+
+
+# Índice de incidencias: por fila, un indicador por momento (y fila roja) con su motivo.
+# Se calcula una vez por versión del registro sobre el registro completo; los filtros
+# globales solo seleccionan filas (indice.loc[df.index]).
+def build_incident_index(df, matcher=keyword_matcher):
+    indice = pd.DataFrame(index=df.index)
+    for momento, condiciones in _condiciones(df).items():
+        marca = np.zeros(len(df), dtype=bool)
+        motivo = np.full(len(df), None, dtype=object)
+        for col, mascara in condiciones:
+            motivo[mascara & ~marca] = col
+            marca |= mascara
+        indice[momento] = marca
+        indice[f"Motivo {momento}"] = pd.Categorical(motivo)
+
+    rojas = matcher.match(df)
+    indice["Fila Roja"] = rojas["Fila Roja"].to_numpy()
+    indice["Palabra Clave"] = pd.Categorical(rojas["Palabra Clave"])
+    indice["Columna Palabra Clave"] = pd.Categorical(rojas["Columna Palabra Clave"])
+    return indice
+
+
+# Incidencia en cualquier momento (sin contar dos veces la misma fila)
+def incidencia_total(indice):
+    return indice[momentos].any(axis=1)
+
+
+# Resumen por momento: cantidad y porcentaje sobre las incidencias únicas
+def resumen_por_momento(indice):
+    total = int(incidencia_total(indice).sum())
+    cantidades = indice[momentos].sum()
+    resumen = pd.DataFrame({"Momento": momentos, "Cantidad": cantidades.to_numpy()})
+    resumen["Porcentaje"] = (resumen["Cantidad"] / total) * 100 if total else 0.0
+    return total, resumen
+
+
+incident_index_cache = FrameCache()
+
+
+def get_incident_index(version, df, cache=incident_index_cache):
+    return cache.get_or_compute(version, lambda: build_incident_index(df))
@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+
+from aggregates import (CalendarCounts, CountCube, SizeCounts, calendar_cache, cube_cache, get_calendar_counts,
+                        get_count_cube, get_size_counts, size_cache)
+from incidents import build_incident_index, get_incident_index, incident_index_cache
+from ingestion import frame_cache
+from normalization import normalize_register, normalized_cache, restaurar_categorias
+
+
+# Columnas candidatas a identificar un caso entre exportaciones (la primera que exista y sea única)
+columnas_clave = ["CASE", "CASE NUMBER", "CASE ID", "ID", "Nº CASO", "CASO", "REF", "REFERENCE"]
+
+
+def detectar_clave(df):
+    for col in columnas_clave:
+        if col in df.columns and df[col].notna().all() and df[col].is_unique:
+            return col
+    return None
+
+
+# Filas que difieren entre dos DataFrames alineados (dos vacíos se consideran iguales)
+def _filas_distintas(viejo, nuevo):
+    distintas = np.zeros(len(nuevo), dtype=bool)
+    for col in nuevo.columns:
+        a, b = viejo[col], nuevo[col]
+        distintas |= (a.ne(b) & ~(a.isna() & b.isna())).to_numpy()
+    return distintas
+
+
+def _concatenar(partes, index):
+    return pd.concat(partes).reindex(index)
+
+
+# Actualización incremental: la nueva exportación se compara por clave de caso con una versión
+# ya cargada, y solo las filas nuevas o modificadas se normalizan, se clasifican como incidencias
+# y se suman a los cubos de conteos (las eliminadas o modificadas se restan). Los resultados se dejan
+# en las cachés de la nueva versión. Devuelve un resumen de los cambios, o None si no es posible
+# (versión base no cacheada, columnas distintas o sin clave de caso) y hay que calcular todo.
+def update_register(base_version, version, raw):
+    base_raw = frame_cache.get(base_version)
+    base_norm = normalized_cache.get(base_version)
+    if base_raw is None or base_norm is None:
+        return None
+    if list(base_raw.columns) != list(raw.columns):
+        return None
+    clave = detectar_clave(raw)
+    if clave is None or detectar_clave(base_raw) != clave:
+        return None
+
+    # El índice y el cubo de la versión base pueden no estar calculados todavía (se calculan al
+    # abrir la sección que los usa): se obtienen ahora a partir del registro normalizado
+    base_indice = get_incident_index(base_version, base_norm)
+    base_cubo = get_count_cube(base_version, base_norm)
+    base_calendario = get_calendar_counts(base_version, base_norm)
+    base_medidas = get_size_counts(base_version, base_norm)
+
+    raw = raw.reset_index(drop=True)
+    pos_base = pd.Series(np.arange(len(base_raw)), index=base_raw[clave].to_numpy())
+    pos_nueva = pd.Series(np.arange(len(raw)), index=raw[clave].to_numpy())
+
+    comunes = pos_nueva.index.intersection(pos_base.index)
+    comunes_base = pos_base.loc[comunes].to_numpy()
+    comunes_nueva = pos_nueva.loc[comunes].to_numpy()
+    distintas = _filas_distintas(base_raw.iloc[comunes_base].reset_index(drop=True),
+                                 raw.iloc[comunes_nueva].reset_index(drop=True))
+
+    insertadas = pos_nueva.drop(comunes).to_numpy()
+    eliminadas = pos_base.drop(comunes).to_numpy()
+    modificadas_base = comunes_base[distintas]
+    modificadas_nueva = comunes_nueva[distintas]
+    sin_cambios_base = comunes_base[~distintas]
+    sin_cambios_nueva = comunes_nueva[~distintas]
+
+    # Solo se normalizan las filas nuevas y las modificadas
+    delta = np.sort(np.concatenate([insertadas, modificadas_nueva]))
+    delta_norm = normalize_register(raw.iloc[delta])
+    conservadas = base_norm.iloc[sin_cambios_base].set_axis(sin_cambios_nueva)
+    df = restaurar_categorias(_concatenar([conservadas, delta_norm], raw.index))
+
+    # Índice de incidencias: se reutilizan los indicadores de las filas sin cambios
+    delta_indice = build_incident_index(delta_norm)
+    indice = _concatenar([base_indice.iloc[sin_cambios_base].set_axis(sin_cambios_nueva), delta_indice], raw.index)
+    for col in indice.columns:
+        if isinstance(delta_indice[col].dtype, pd.CategoricalDtype):
+            indice[col] = indice[col].astype(object).astype("category")
+
+    # Cubo: se restan las filas viejas que cambian o desaparecen y se suman las nuevas
+    salientes = base_norm.iloc[np.concatenate([modificadas_base, eliminadas])]
+    cubo = base_cubo.combinar(CountCube.from_frame(delta_norm)).combinar(CountCube.from_frame(salientes), signo=-1)
+    calendario = base_calendario.combinar(CalendarCounts.from_frame(delta_norm)) \
+        .combinar(CalendarCounts.from_frame(salientes), signo=-1)
+    medidas = base_medidas.combinar(SizeCounts.from_frame(delta_norm)).combinar(SizeCounts.from_frame(salientes), signo=-1)
+
+    normalized_cache.put(version, df)
+    incident_index_cache.put(version, indice)
+    cube_cache.put(version, cubo)
+    calendar_cache.put(version, calendario)
+    size_cache.put(version, medidas)
+    return {"insertados": len(insertadas), "modificados": len(modificadas_nueva), "eliminados": len(eliminadas)}
@@ -0,0 +1,293 @@
+import hashlib
+import io
+import os
+import sys
+from collections import OrderedDict
+from threading import Lock
+
+import pandas as pd
+
+
+# Columnas que se normalizan al cargar el registro
+columnas_fecha = ["DATE", "SURGERY DATE", "DATE2"]
+columnas_numericas = ["b (screw length)", "a (elevator plate)", "YEAR"]
+
+# Columnas que usa cada sección del dashboard (para leer del Parquet solo lo necesario).
+# Incidencias muestra las filas completas, así que necesita todas las columnas.
+columnas_seccion = {
+    "resumen": ["YEAR", "COUNTRY", "STATE NUMBER", "DATE", "SURGERY DATE", "DATE2", "KIT",
+                "b (screw length)", "a (elevator plate)"],
+    "comercial": ["YEAR", "COUNTRY", "STATE NUMBER", "DATE", "SURGERY DATE", "DATE2"],
+    "tecnico": ["YEAR", "COUNTRY", "INDICE€", "INDICE(D)", "d(Potencial Lifting Distance)MIN",
+                "g (Haller Index)", "f (Assymetry Index)", "h (Correction Index)", "a (Sternal angle)",
+                "b(sternal Thickness)MIN", "MAX", "Sternum Density", "Sternum Cortical Density (superior)",
+                "Sternum Cortical Density (inferior)", "AGE", "b (screw length)", "a (elevator plate)",
+                "DATE", "SURGERY DATE"],
+    "incidencias": None,
+}
+
+
+# Columnas que hay que leer para varias secciones: la unión de sus listas, o None (todas) si
+# alguna necesita el registro completo
+def columnas_para(secciones):
+    columnas = []
+    for seccion in secciones:
+        if columnas_seccion[seccion] is None:
+            return None
+        columnas.extend(c for c in columnas_seccion[seccion] if c not in columnas)
+    return columnas
+
+# Límite por defecto de la caché en memoria (bytes)
+MAX_BYTES_CACHE = 512 * 1024 * 1024
+
+
+# Huella del contenido del fichero: identifica la versión del registro
+def hash_contenido(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+# Leer los bytes de un fichero subido con Streamlit, un objeto tipo fichero o una ruta
+def leer_bytes(file):
+    if isinstance(file, (bytes, bytearray)):
+        return bytes(file)
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, "rb") as f:
+            return f.read()
+    if hasattr(file, "getvalue"):
+        return file.getvalue()
+    file.seek(0)
+    return file.read()
+
+
+# Conversión de tipos: fechas y medidas numéricas
+def coerce_types(df):
+    for col in columnas_fecha:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+
+    if "b (screw length)" in df.columns:
+        df["b (screw length)"] = pd.to_numeric(df["b (screw length)"], errors="coerce")
+    if "a (elevator plate)" in df.columns:
+        # Las placas vienen a veces como texto con espacios ocultos
+        plate = df["a (elevator plate)"].astype(str).str.strip()
+        df["a (elevator plate)"] = pd.to_numeric(plate, errors="coerce").astype(float)
+    if "YEAR" in df.columns:
+        df["YEAR"] = pd.to_numeric(df["YEAR"], errors="coerce")
+    return df
+
+
+# Parsear el Excel (la primera fila es el título, la cabecera está en la segunda)
+def parse_workbook(data):
+    df = pd.read_excel(io.BytesIO(data), header=1)
+    return coerce_types(df)
+
+
+# Preparar el DataFrame para Parquet: nombres de columna como texto y columnas de texto
+# libre sin mezcla de tipos (Excel mezcla números y texto en las observaciones)
+def _para_parquet(df):
+    df = df.copy()
+    df.columns = [str(c) for c in df.columns]
+    for col in df.columns:
+        if df[col].dtype == object:
+            valores = df[col].dropna()
+            if not valores.map(lambda v: isinstance(v, str)).all():
+                df[col] = df[col].map(lambda v: v if pd.isna(v) else str(v))
+    return df
+
+
+def write_parquet(df, ruta):
+    tmp = ruta + ".tmp"
+    _para_parquet(df).to_parquet(tmp, index=False)
+    os.replace(tmp, ruta)
+
+
+def read_parquet(ruta, columns=None):
+    if columns is not None:
+        # Solo las columnas que existen en el fichero (pyarrow se importa solo si se usa Parquet)
+        import pyarrow.parquet as pq
+
+        disponibles = set(pq.read_schema(ruta).names)
+        columns = [c for c in columns if c in disponibles]
+    return pd.read_parquet(ruta, columns=columns)
+
+
+# Fichero Parquet junto al Excel (registro.xlsx -> registro.parquet)
+def sidecar_path(path):
+    return os.path.splitext(os.fspath(path))[0] + ".parquet"
+
+
+# El sidecar es válido si es más reciente que el Excel del que sale
+def sidecar_is_fresh(path):
+    sidecar = sidecar_path(path)
+    return os.path.exists(sidecar) and os.path.getmtime(sidecar) >= os.path.getmtime(path)
+
+
+# Convertir un Excel al registro normalizado en Parquet
+def convert_workbook(path, out=None):
+    out = out or sidecar_path(path)
+    with open(path, "rb") as f:
+        df = parse_workbook(f.read())
+    write_parquet(df, out)
+    return out
+
+
+# Leer un registro desde una ruta: Parquet directamente, o el sidecar si está al día
+# (si no lo está, se regenera a partir del Excel)
+def read_register(path, columns=None):
+    path = os.fspath(path)
+    if path.endswith(".parquet"):
+        return read_parquet(path, columns)
+    if not sidecar_is_fresh(path):
+        convert_workbook(path)
+    return read_parquet(sidecar_path(path), columns)
+
+
+# Tamaño aproximado en memoria de lo que se guarda en las cachés (DataFrames, arrays o
+# resultados que los agrupan)
+def tamano_objeto(obj):
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep=True))
+    if hasattr(obj, "nbytes"):
+        return int(obj.nbytes)
+    if isinstance(obj, dict):
+        return sum(tamano_objeto(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(tamano_objeto(v) for v in obj)
+    if hasattr(obj, "__dict__"):
+        return sum(tamano_objeto(v) for v in vars(obj).values())
+    return sys.getsizeof(obj)
+
+
+# Caché LRU en memoria acotada por tamaño: clave = hash del contenido. Las claves fijadas (registros
+# en uso por alguna sesión) no se expulsan.
+class FrameCache:
+    def __init__(self, max_bytes=MAX_BYTES_CACHE):
+        self.max_bytes = max_bytes
+        self._frames = OrderedDict()
+        self._sizes = {}
+        self._fijadas = {}
+        self._lock = Lock()
+
+    def __contains__(self, key):
+        return key in self._frames
+
+    def __len__(self):
+        return len(self._frames)
+
+    @property
+    def nbytes(self):
+        return sum(self._sizes.values())
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._frames:
+                return None
+            self._frames.move_to_end(key)
+            return self._frames[key]
+
+    def put(self, key, df):
+        size = tamano_objeto(df)
+        with self._lock:
+            self._frames[key] = df
+            self._sizes[key] = size
+            self._frames.move_to_end(key)
+            # Expulsar los menos usados hasta respetar el límite (siempre se conserva el último)
+            while self.nbytes > self.max_bytes:
+                candidatas = (k for k in self._frames if k != key and not self._fijadas.get(k))
+                old = next(candidatas, None)
+                if old is None:
+                    break
+                self._quitar(old)
+
+    # Devolver lo cacheado o calcularlo (una vez por clave) y guardarlo
+    def get_or_compute(self, key, func):
+        valor = self.get(key)
+        if valor is None:
+            valor = func()
+            self.put(key, valor)
+        return valor
+
+    def _quitar(self, key):
+        del self._frames[key]
+        del self._sizes[key]
+
+    def fijar(self, key):
+        with self._lock:
+            self._fijadas[key] = self._fijadas.get(key, 0) + 1
+
+    def soltar(self, key):
+        with self._lock:
+            if self._fijadas.get(key, 0) <= 1:
+                self._fijadas.pop(key, None)
+            else:
+                self._fijadas[key] -= 1
+
+    # Quitar las entradas cuya clave cumple la condición (p. ej. todo lo de una versión del registro)
+    def descartar(self, condicion):
+        with self._lock:
+            for key in [k for k in self._frames if condicion(k)]:
+                self._quitar(key)
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self._sizes.clear()
+
+
+# Caché compartida por todo el proceso (sobrevive a los reruns de Streamlit)
+frame_cache = FrameCache()
+
+
+def _proyectar(df, columns):
+    if columns is None:
+        return df
+    return df[[c for c in columns if c in df.columns]]
+
+
+def _ruta_disco(cache_dir, key):
+    return os.path.join(cache_dir, f"{key}.parquet")
+
+
+# Los ficheros Parquet empiezan y terminan con la marca "PAR1"
+def es_parquet(data):
+    return data[:4] == b"PAR1" and data[-4:] == b"PAR1"
+
+
+def _parse(data):
+    if es_parquet(data):
+        return pd.read_parquet(io.BytesIO(data))
+    return parse_workbook(data)
+
+
+# Cargar el registro: memoria -> Parquet en disco (opcional) -> Excel.
+# Con `columns` solo se devuelven esas columnas; una lectura parcial del disco no se
+# guarda en la caché en memoria.
+def load_register(file, cache=frame_cache, cache_dir=None, columns=None):
+    data = leer_bytes(file)
+    key = hash_contenido(data)
+
+    df = cache.get(key)
+    if df is not None:
+        return key, _proyectar(df, columns)
+
+    ruta = _ruta_disco(cache_dir, key) if cache_dir else None
+    if ruta and os.path.exists(ruta):
+        df = read_parquet(ruta, columns)
+        if columns is not None:
+            return key, df
+    else:
+        df = _parse(data)
+        if ruta:
+            os.makedirs(cache_dir, exist_ok=True)
+            write_parquet(df, ruta)
+
+    cache.put(key, df)
+    return key, _proyectar(df, columns)
+
+
+# Uso: python ingestion.py registro.xlsx [...]  -> escribe registro.parquet junto a cada Excel
+if __name__ == "__main__":
+    for ruta in sys.argv[1:]:
+        print(convert_workbook(ruta))
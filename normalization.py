@@ -0,0 +1,171 @@
+import numpy as np
+import pandas as pd
+
+from ingestion import FrameCache, coerce_types
+
+
+# Mapeo de los estados del caso a nombres
+estado_map = {
+    1: "1: Caso Abierto",
+    2: "2:Caso Aprobado",
+    3: "3: Informe Enviado",
+    4: "4: Caso Operado",
+    5: "5: Caso Retirado"
+}
+
+# Nombres canónicos de las columnas técnicas
+nombres_tecnicos = {
+    "INDICE€": "Índice E",
+    "INDICE(D)": "Índice D",
+    "d(Potencial Lifting Distance)MIN": "Elevación Potencial",
+    "g (Haller Index)": "Índice de Haller",
+    "f (Assymetry Index)": "Índice de Asimetría",
+    "a (Sternal angle)": "Rotación Esternal",
+    "h (Correction Index)": "Índice de Corrección",
+    "b(sternal Thickness)MIN": "Anchura del Esternón (mínima)",
+    "MAX": "Anchura del Esternón (máxima)",
+    "Sternum Density": "Densidad Esternal",
+    "Sternum Cortical Density (superior)": "Densidad Cortical Esternal (superior)",
+    "Sternum Cortical Density (inferior)": "Densidad Cortical Esternal (inferior)",
+    "AGE": "Edad"
+}
+
+# Medidas que se guardan como float32
+columnas_medidas = ["b (screw length)", "a (elevator plate)"] + list(nombres_tecnicos.values())
+
+columnas_categoricas = ["COUNTRY", "KIT"]
+
+# Columnas de texto con pocos valores distintos (proporción sobre los valores informados) que se
+# guardan como categorías; el resto del texto libre se guarda como cadenas de Arrow
+PROPORCION_CATEGORIAS = 0.5
+
+
+# Estado del caso como categoría ordenada: primero los estados conocidos, después el resto
+def _categoria_estado(etiquetas):
+    conocidos = list(estado_map.values())
+    otros = sorted(set(etiquetas.dropna().astype(str)) - set(conocidos))
+    return pd.Categorical(etiquetas, categories=conocidos + otros, ordered=True)
+
+
+# Estado del caso con nombres (los valores fuera del mapeo se conservan como texto)
+def _normalizar_estado(estado):
+    etiquetas = estado.map(estado_map)
+    otros = estado[etiquetas.isna() & estado.notna()].astype(str)
+    return _categoria_estado(etiquetas.fillna(otros))
+
+
+# Normalización en una sola pasada: tipos, nombres canónicos y columnas derivadas.
+# Devuelve un DataFrame nuevo que las pestañas solo leen.
+def normalize_register(raw):
+    df = coerce_types(raw.copy())
+    df = df.rename(columns=nombres_tecnicos)
+
+    if "STATE NUMBER" in df.columns:
+        df["STATE NUMBER"] = _normalizar_estado(df["STATE NUMBER"])
+    for col in columnas_categoricas:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+
+    for col in columnas_medidas:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(np.float32)
+
+    if "YEAR" in df.columns:
+        df["YEAR"] = _anio_compacto(df["YEAR"])
+
+    if "SURGERY DATE" in df.columns:
+        df["Intervenciones"] = df["SURGERY DATE"].notna().astype(np.int8)
+    if "DATE2" in df.columns:
+        df["Explantaciones"] = df["DATE2"].notna().astype(np.int8)
+
+    # Efectividad = Índice de Corrección (cm) - Elevación Potencial, con
+    # Índice de Corrección (cm) = Índice E - Índice D
+    if all(col in df.columns for col in ["Índice E", "Índice D", "Elevación Potencial"]):
+        df["Índice de Corrección (cm)"] = df["Índice E"] - df["Índice D"]
+        df["Efectividad"] = df["Índice de Corrección (cm)"] - df["Elevación Potencial"]
+
+    return compactar_texto(df)
+
+
+# Año como entero pequeño (Int16 admite vacíos)
+def _anio_compacto(anio):
+    anio = pd.to_numeric(anio, errors="coerce")
+    if anio.dropna().mod(1).ne(0).any():
+        return anio.astype(np.float32)
+    return anio.astype(np.int16) if anio.notna().all() else anio.astype("Int16")
+
+
+def _tipo_texto():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return object
+    return "string[pyarrow]"
+
+
+# Columnas de texto (object) compactadas: categorías si tienen pocos valores distintos (las
+# agrupaciones trabajan sobre los códigos enteros) y cadenas de Arrow para el texto libre
+def compactar_texto(df, proporcion=PROPORCION_CATEGORIAS):
+    tipo_texto = _tipo_texto()
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
+        valores = df[col].dropna()
+        if len(valores) == 0:
+            continue
+        if not valores.map(lambda v: isinstance(v, str)).all():
+            df[col] = df[col].map(lambda v: v if pd.isna(v) else str(v))
+        if valores.nunique() <= proporcion * len(valores):
+            df[col] = df[col].astype("category")
+        elif tipo_texto is not object:
+            df[col] = df[col].astype(tipo_texto)
+    return df
+
+
+# Volver a convertir en categorías las columnas que lo eran tras unir trozos normalizados
+# por separado (pd.concat de categorías distintas devuelve texto)
+def restaurar_categorias(df):
+    if "STATE NUMBER" in df.columns:
+        df["STATE NUMBER"] = _categoria_estado(df["STATE NUMBER"].astype(object))
+    for col in columnas_categoricas:
+        if col in df.columns:
+            df[col] = df[col].astype(object).astype("category")
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype) and col not in columnas_categoricas + ["STATE NUMBER"]:
+            df[col] = df[col].astype(object)
+    return compactar_texto(df)
+
+
+# Memoria de cada columna antes (tal como se leyó) y después de normalizar, en bytes
+def informe_memoria(raw, df):
+    antes = raw.rename(columns=nombres_tecnicos).memory_usage(deep=True, index=False)
+    despues = df.memory_usage(deep=True, index=False)
+    informe = pd.DataFrame({
+        "Columna": despues.index,
+        "Tipo": [str(df[col].dtype) for col in despues.index],
+        "Bytes Antes": antes.reindex(despues.index, fill_value=0).to_numpy(),  # 0: columnas derivadas
+        "Bytes Después": despues.to_numpy(),
+    })
+    informe["Bytes Ahorrados"] = informe["Bytes Antes"] - informe["Bytes Después"]
+    return informe.sort_values("Bytes Ahorrados", ascending=False).reset_index(drop=True)
+
+
+# Caché de registros normalizados por versión (hash del fichero)
+normalized_cache = FrameCache()
+
+
+def get_normalized(version, raw, cache=normalized_cache):
+    return cache.get_or_compute(version, lambda: normalize_register(raw))
+
+
+# Uso: python normalization.py registro.xlsx  -> memoria por columna antes y después de normalizar
+if __name__ == "__main__":
+    import sys
+
+    from ingestion import read_register
+
+    for ruta in sys.argv[1:]:
+        raw = read_register(ruta)
+        informe = informe_memoria(raw, normalize_register(raw))
+        print(informe.to_string(index=False))
+        print(f"Total: {informe['Bytes Antes'].sum() / 1e6:.1f} MB -> {informe['Bytes Después'].sum() / 1e6:.1f} MB")
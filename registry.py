@@ -0,0 +1,96 @@
+import os
+import weakref
+from collections import OrderedDict
+from threading import Lock
+
+from aggregates import calendar_cache, cube_cache, size_cache
+from analytics import resultados_cache
+from forecasting import forecast_cache
+from incidents import incident_index_cache
+from ingestion import frame_cache
+from normalization import normalized_cache
+from search import search_index_cache
+
+
+# Presupuesto de memoria de los registros cargados en el proceso (todas las sesiones), en MB
+MAX_BYTES_REGISTRO = int(os.environ.get("PECTUSUP_CACHE_MB", "1024")) * 1024 * 1024
+
+
+# Referencia de una sesión a una versión del registro. Se guarda en st.session_state: cuando la
+# sesión carga otra versión o termina (y su estado se libera), la versión deja de estar en uso.
+class Referencia:
+    def __init__(self, registro, version):
+        self.version = version
+        self._finalizador = weakref.finalize(self, registro._liberar, version)
+
+    def liberar(self):
+        self._finalizador()
+
+
+# Registro de datasets compartido por todas las sesiones del proceso. Cada versión (hash del
+# contenido) se normaliza y se agrega una sola vez; las sesiones solo guardan su referencia y
+# sus filtros. Las versiones sin sesiones se expulsan por LRU cuando se supera el presupuesto.
+class DatasetRegistry:
+    def __init__(self, caches, resultados=None, max_bytes=MAX_BYTES_REGISTRO):
+        self.caches = list(caches)  # cachés con clave = versión
+        self.resultados = resultados  # caché con clave (versión, filtros, ...)
+        self.max_bytes = max_bytes
+        self._referencias = {}
+        self._uso = OrderedDict()
+        self._lock = Lock()
+
+    @property
+    def nbytes(self):
+        total = sum(cache.nbytes for cache in self.caches)
+        return total + (self.resultados.nbytes if self.resultados is not None else 0)
+
+    def sesiones(self, version):
+        return self._referencias.get(version, 0)
+
+    def adquirir(self, version):
+        with self._lock:
+            self._referencias[version] = self._referencias.get(version, 0) + 1
+            self._uso[version] = True
+            self._uso.move_to_end(version)
+        for cache in self.caches:
+            cache.fijar(version)
+        self.recortar()
+        return Referencia(self, version)
+
+    # Marcar la versión como usada recientemente (en cada rerun de una sesión)
+    def tocar(self, version):
+        with self._lock:
+            if version in self._uso:
+                self._uso.move_to_end(version)
+
+    def _liberar(self, version):
+        with self._lock:
+            restantes = self._referencias.get(version, 0) - 1
+            if restantes > 0:
+                self._referencias[version] = restantes
+            else:
+                self._referencias.pop(version, None)
+        for cache in self.caches:
+            cache.soltar(version)
+        self.recortar()
+
+    def descartar(self, version):
+        for cache in self.caches:
+            cache.descartar(lambda key: key == version)
+        if self.resultados is not None:
+            self.resultados.descartar(lambda key: key[0] == version)
+        with self._lock:
+            self._uso.pop(version, None)
+
+    # Expulsar las versiones sin sesiones, de la menos a la más usada, hasta respetar el presupuesto
+    def recortar(self):
+        while self.nbytes > self.max_bytes:
+            with self._lock:
+                libre = next((v for v in self._uso if not self._referencias.get(v)), None)
+            if libre is None:
+                break
+            self.descartar(libre)
+
+
+dataset_registry = DatasetRegistry([frame_cache, normalized_cache, incident_index_cache, cube_cache,
+                                    calendar_cache, size_cache, search_index_cache, forecast_cache], resultados_cache)
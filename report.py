@@ -0,0 +1,200 @@
+# Informe por lotes sin navegador: mismos cálculos que el dashboard sobre un registro, con las
+# tablas en CSV y las figuras en HTML/PNG dentro de una carpeta con un index.html.
+# Uso: python report.py registro.xlsx --out informe [--paises SPAIN ITALY] [--anios 2023 2024] [--workers 4]
+#      [--secciones resumen comercial tecnico]
+import argparse
+import html
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+import analytics
+from aggregates import CountCube
+from incidents import build_incident_index, momentos, plegar, resumen_por_momento
+from ingestion import columnas_para, columnas_seccion, read_register
+from normalization import normalize_register
+
+
+# Aplicar los filtros globales (países/años) al registro y al cubo
+def filtrar(df, cubo, paises=None, anios=None):
+    if paises:
+        df = df[df["COUNTRY"].isin(paises)]
+        cubo = cubo.seleccionar({"COUNTRY": paises})
+    if anios:
+        df = df[df["YEAR"].isin(anios)]
+        cubo = cubo.seleccionar({"YEAR": anios})
+    return df, cubo
+
+
+# Cada sección devuelve (tablas, figuras): {nombre: DataFrame}, {nombre: figura}
+
+def seccion_estados(cubo):
+    estados = analytics.estado_casos(cubo)
+    totales = estados.totales.rename_axis("Estado").reset_index(name="Informes")
+    figuras = {
+        "estados": px.pie(totales, names="Estado", values="Informes",
+                          title="Distribución de Informes Totales por Estado"),
+        "estados_por_anio": px.sunburst(estados.por_anio, path=["YEAR", "STATE NUMBER"], values="Informes",
+                                        title="Distribución de Informes por Año y Estado"),
+    }
+    return {"estados": totales, "estados_por_anio": estados.por_anio}, figuras
+
+
+def seccion_evolucion(cubo):
+    evolucion = analytics.evolucion_anual(cubo)
+    tabla = pd.concat({"Informes Totales": evolucion.casos.set_index("YEAR")["Casos"],
+                       "Intervenciones": evolucion.intervenciones.set_index("YEAR")["Casos"],
+                       "Explantaciones": evolucion.explantaciones.set_index("YEAR")["Casos"]},
+                      axis=1).fillna(0).astype(int).rename_axis("YEAR").reset_index()
+    fig = px.line(tabla, x="YEAR", y=["Informes Totales", "Intervenciones", "Explantaciones"], markers=True,
+                  title="Evolución de Informes, Intervenciones y Explantaciones por Año")
+    fig.update_layout(xaxis_title="Año", xaxis=dict(tickmode="linear", dtick=1))
+
+    por_pais = cubo.sumar(["YEAR", "COUNTRY"]).reset_index(name="Número de Informes")
+    fig_pais = px.line(por_pais, x="YEAR", y="Número de Informes", color="COUNTRY",
+                       title="Evolución de Informes por País", markers=True)
+    fig_pais.update_layout(xaxis_title="Año", xaxis=dict(tickmode="linear", dtick=1))
+    return {"evolucion_anual": tabla, "evolucion_por_pais": por_pais}, {"evolucion_anual": fig,
+                                                                         "evolucion_por_pais": fig_pais}
+
+
+def seccion_kits(cubo):
+    uso = analytics.uso_kits(cubo)
+    kits = uso.conteos.rename_axis("KIT").reset_index(name="Casos")
+    fig = px.bar(kits, x="KIT", y="Casos", title="Uso de Kits", text_auto=True)
+    fig.update_layout(yaxis_title="Frecuencia de Uso")
+    return {"kits": kits, "kit_por_estado": uso.resumen.reset_index(names="Estado")}, {"kits": fig}
+
+
+def seccion_conversion(cubo):
+    conversion = analytics.conversion(cubo)
+    por_pais = conversion.por_pais
+    fig = px.bar(por_pais[por_pais["Tasa de Conversión"] > 0], x="COUNTRY", y="Tasa de Conversión",
+                 title=f"Tasa de Conversión por País (general: {conversion.tasa_general:.2f}%)",
+                 color="Tasa de Conversión", color_continuous_scale="Viridis")
+    return {"conversion_por_pais": por_pais}, {"conversion_por_pais": fig}
+
+
+def seccion_tiempos(df):
+    positivos = analytics.tiempos_tac_intervencion(df).positivos
+    resumen = positivos.groupby("COUNTRY", observed=True)["Tiempo TAC a Intervención"].describe().reset_index()
+    figuras = {}
+    if not positivos.empty:
+        hist = px.histogram(positivos, x="Tiempo TAC a Intervención",
+                            title="Tiempo desde la Recepción del TAC hasta la Intervención")
+        hist.update_traces(xbins=dict(size=15))
+        figuras["tiempo_tac_intervencion"] = hist
+        figuras["tiempo_tac_intervencion_por_pais"] = px.box(
+            positivos, x="COUNTRY", y="Tiempo TAC a Intervención",
+            title="Tiempo entre Recepción del TAC y la Intervención Por Países")
+    return {"tiempo_tac_intervencion": resumen}, figuras
+
+
+def seccion_anatomia(df):
+    variables = [v for v in analytics.variables_anatomicas if v in df.columns]
+    tabla = pd.DataFrame([analytics.estadisticas_variable(df[v])._asdict() for v in variables], index=variables)
+    return {"estadisticas_anatomicas": tabla.rename_axis("Variable").reset_index()}, {}
+
+
+def seccion_incidencias(df, indice):
+    total, resumen = resumen_por_momento(indice)
+    tablas = {"incidencias_por_momento": resumen}
+    for momento in momentos:
+        tablas[f"incidencias_{plegar(momento).lower().replace('-', '_')}"] = df[indice[momento]]
+    tablas["incidencias_filas_rojas"] = df[indice["Fila Roja"]].join(
+        indice.loc[indice["Fila Roja"], ["Palabra Clave", "Columna Palabra Clave"]])
+    fig = px.pie(resumen, names="Momento", values="Cantidad", hole=0.3,
+                 title=f"Distribución de Incidencias ({total} incidencias únicas)")
+    return tablas, {"incidencias_por_momento": fig}
+
+
+# Secciones del informe por sección del dashboard (la misma clave que columnas_seccion)
+def calcular_informe(df, indice, cubo, secciones=tuple(columnas_seccion)):
+    informe = {}
+    if "resumen" in secciones:
+        informe["Estado de los Casos"] = seccion_estados(cubo)
+        informe["Evolución por Año"] = seccion_evolucion(cubo)
+        informe["Kits"] = seccion_kits(cubo)
+    if "comercial" in secciones:
+        informe["Conversión por País"] = seccion_conversion(cubo)
+        informe["Tiempo TAC a Intervención"] = seccion_tiempos(df)
+    if "tecnico" in secciones:
+        informe["Variables Anatómicas"] = seccion_anatomia(df)
+    if "incidencias" in secciones:
+        informe["Incidencias"] = seccion_incidencias(df, indice)
+    return informe
+
+
+# Se ejecuta en los procesos del pool: escribe una figura a partir de su especificación
+def _render(tarea):
+    spec, base, png = tarea
+    fig = go.Figure(spec)
+    fig.write_html(base + ".html", include_plotlyjs="cdn")
+    if png:
+        try:
+            fig.write_image(base + ".png")
+        except (ValueError, ImportError, RuntimeError) as e:
+            return f"PNG no generado para {os.path.basename(base)}: {e}"
+    return None
+
+
+def escribir_informe(secciones, out, workers=None, png=False):
+    os.makedirs(os.path.join(out, "tablas"), exist_ok=True)
+    os.makedirs(os.path.join(out, "figuras"), exist_ok=True)
+
+    tareas = []
+    partes = ["<html><head><meta charset='utf-8'><title>Pectus Up: Datos y Tendencias</title></head><body>",
+              "<h1>Pectus Up: Datos y Tendencias</h1>"]
+    for titulo, (tablas, figuras) in secciones.items():
+        partes.append(f"<h2>{html.escape(titulo)}</h2>")
+        for nombre, fig in figuras.items():
+            tareas.append((fig.to_dict(), os.path.join(out, "figuras", nombre), png))
+            partes.append(f"<iframe src='figuras/{nombre}.html' width='100%' height='520' frameborder='0'></iframe>")
+        for nombre, tabla in tablas.items():
+            tabla.to_csv(os.path.join(out, "tablas", f"{nombre}.csv"), index=False)
+            partes.append(f"<h3>{html.escape(nombre)} (<a href='tablas/{nombre}.csv'>CSV</a>, {len(tabla)} filas)</h3>")
+            partes.append(tabla.head(50).to_html(index=False, na_rep=""))
+    partes.append("</body></html>")
+
+    # Las figuras se renderizan en paralelo
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        avisos = [aviso for aviso in pool.map(_render, tareas) if aviso]
+
+    with open(os.path.join(out, "index.html"), "w", encoding="utf-8") as f:
+        f.write("\n".join(partes))
+    return avisos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Informe Pectus Up por lotes (sin navegador)")
+    parser.add_argument("registro", help="Excel del registro o su versión Parquet")
+    parser.add_argument("--out", default="informe")
+    parser.add_argument("--paises", nargs="*")
+    parser.add_argument("--anios", nargs="*", type=int)
+    parser.add_argument("--secciones", nargs="*", choices=list(columnas_seccion), default=list(columnas_seccion),
+                        help="Secciones del informe; sin incidencias solo se leen las columnas que usan")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--png", action="store_true", help="Exportar también PNG (requiere kaleido)")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    df = normalize_register(read_register(args.registro, columns=columnas_para(args.secciones)))
+    indice = build_incident_index(df) if "incidencias" in args.secciones else None
+    cubo = CountCube.from_frame(df)
+    df, cubo = filtrar(df, cubo, args.paises, args.anios)
+    if indice is not None:
+        indice = indice.loc[df.index]
+
+    avisos = escribir_informe(calcular_informe(df, indice, cubo, args.secciones), args.out, args.workers, args.png)
+    for aviso in dict.fromkeys(avisos):
+        print(aviso, file=sys.stderr)
+    print(f"Informe escrito en {os.path.join(args.out, 'index.html')} ({time.perf_counter() - t0:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
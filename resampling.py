@@ -0,0 +1,150 @@
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+
+# Elementos por bloque (remuestreos × casos) para acotar la memoria de las matrices de índices
+ELEMENTOS_BLOQUE = 4_000_000
+# A partir de este volumen de trabajo los bloques se reparten en un pool de procesos
+ELEMENTOS_POOL = 50_000_000
+
+
+# Bloques de remuestreos con una semilla independiente cada uno: el resultado depende solo de la
+# semilla y del número de remuestreos, no del número de procesos
+def _bloques(seed, n_resamples, casos):
+    tamano = max(1, ELEMENTOS_BLOQUE // max(casos, 1))
+    tamanos = [min(tamano, n_resamples - i) for i in range(0, n_resamples, tamano)]
+    return list(zip(np.random.SeedSequence(seed).spawn(len(tamanos)), tamanos))
+
+
+def _ejecutar(func, tareas, workers=None, elementos=0):
+    if workers is None:
+        workers = 1 if elementos < ELEMENTOS_POOL else None
+    if workers == 1 or len(tareas) == 1:
+        return [func(tarea) for tarea in tareas]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(func, tareas))
+
+
+def _p_valor(estadisticos, observado):
+    extremos = (np.abs(estadisticos) >= np.abs(observado) - 1e-12).sum(axis=0)
+    return np.where(np.isnan(observado), np.nan, (1 + extremos) / (1 + len(estadisticos)))
+
+
+def _intervalo(estadisticos, confianza):
+    alfa = (1 - confianza) / 2
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # variables sin datos en algún grupo
+        return np.nanquantile(estadisticos, [alfa, 1 - alfa], axis=0)
+
+
+# Correlación de Pearson de cada fila de dos matrices (un remuestreo por fila)
+def _r_filas(xs, ys):
+    xs = xs - xs.mean(axis=1, keepdims=True)
+    ys = ys - ys.mean(axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (xs * ys).sum(axis=1) / np.sqrt((xs * xs).sum(axis=1) * (ys * ys).sum(axis=1))
+
+
+def _bloque_correlacion(tarea):
+    (semilla, tamano), x, y = tarea
+    rng = np.random.default_rng(semilla)
+    n = len(x)
+    indices = rng.integers(0, n, size=(tamano, n))
+    bootstrap = _r_filas(x[indices], y[indices])
+    permutaciones = rng.permuted(np.broadcast_to(np.arange(n), (tamano, n)), axis=1)
+    permutacion = _r_filas(np.broadcast_to(x, (tamano, n)), y[permutaciones])
+    return bootstrap, permutacion
+
+
+class CorrelacionRemuestreo(NamedTuple):
+    r: float
+    ic_inferior: float  # intervalo bootstrap de percentiles
+    ic_superior: float
+    p_valor: float  # test de permutación bilateral de r = 0
+    n_resamples: int
+
+
+# Intervalo bootstrap y p-valor por permutación de la correlación de Pearson de dos variables
+# (casos completos)
+def correlacion_remuestreo(x, y, n_resamples=2000, confianza=0.95, seed=0, workers=None):
+    datos = pd.DataFrame({"x": pd.to_numeric(x, errors='coerce'), "y": pd.to_numeric(y, errors='coerce')}).dropna()
+    x, y = datos["x"].to_numpy(np.float64), datos["y"].to_numpy(np.float64)
+    if len(x) < 3:
+        return CorrelacionRemuestreo(np.nan, np.nan, np.nan, np.nan, n_resamples)
+    observado = float(_r_filas(x[None, :], y[None, :])[0])
+    tareas = [(bloque, x, y) for bloque in _bloques(seed, n_resamples, len(x))]
+    partes = _ejecutar(_bloque_correlacion, tareas, workers, n_resamples * len(x))
+    bootstrap = np.concatenate([p[0] for p in partes])
+    permutacion = np.concatenate([p[1] for p in partes])
+    inferior, superior = _intervalo(bootstrap, confianza)
+    return CorrelacionRemuestreo(observado, float(inferior), float(superior),
+                                 float(_p_valor(permutacion, observado)), n_resamples)
+
+
+# Media de cada variable (columnas) en cada remuestreo (filas) a partir de una matriz de pesos:
+# cuántas veces entra cada caso en el remuestreo
+def _medias(pesos, x, informados):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (pesos @ x) / (pesos @ informados)
+
+
+def _pesos(rng, tamano, n):
+    indices = rng.integers(0, n, size=(tamano, n)) + np.arange(tamano)[:, None] * n
+    return np.bincount(indices.ravel(), minlength=tamano * n).reshape(tamano, n).astype(np.float64)
+
+
+def _bloque_medias(tarea):
+    (semilla, tamano), x, informados, grupo, patrones = tarea
+    rng = np.random.default_rng(semilla)
+    x1, m1, x0, m0 = x[grupo], informados[grupo], x[~grupo], informados[~grupo]
+    # Bootstrap estratificado: se remuestrea cada grupo por separado
+    bootstrap = _medias(_pesos(rng, tamano, len(x1)), x1, m1) - _medias(_pesos(rng, tamano, len(x0)), x0, m0)
+    # Permutación de las etiquetas de grupo entre los casos con la variable informada; las
+    # variables con el mismo patrón de vacíos comparten las permutaciones
+    permutacion = np.full((tamano, x.shape[1]), np.nan)
+    for filas, columnas in patrones:
+        etiquetas = rng.permuted(np.broadcast_to(grupo[filas], (tamano, len(filas))), axis=1).astype(np.float64)
+        valores = x[np.ix_(filas, columnas)]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            permutacion[:, columnas] = (etiquetas @ valores) / etiquetas.sum(axis=1, keepdims=True) \
+                - ((1.0 - etiquetas) @ valores) / (1.0 - etiquetas).sum(axis=1, keepdims=True)
+    return bootstrap, permutacion
+
+
+# Filas informadas y columnas de cada patrón de vacíos
+def _patrones(informados):
+    unicos, inversa = np.unique(informados.T.astype(bool), axis=0, return_inverse=True)
+    inversa = np.ravel(inversa)
+    return [(np.flatnonzero(patron), np.flatnonzero(inversa == i)) for i, patron in enumerate(unicos)
+            if patron.any()]
+
+
+# Diferencia de medias (grupo - resto) de todas las variables a la vez, con su intervalo bootstrap y
+# el p-valor por permutación. Los vacíos de cada variable se excluyen con su máscara.
+def diferencia_medias_remuestreo(df, mascara, variables, n_resamples=2000, confianza=0.95, seed=0,
+                                 workers=None):
+    variables = [v for v in variables if v in df.columns]
+    valores = df[variables].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+    grupo = pd.Series(mascara, index=df.index).fillna(False).to_numpy(dtype=bool)
+    informados = (~np.isnan(valores)).astype(np.float64)
+    x = np.nan_to_num(valores)
+    columnas = ["Variable", "Diferencia de Medias", f"IC {confianza:.0%} Inferior (bootstrap)",
+                f"IC {confianza:.0%} Superior (bootstrap)", "P-valor (permutación)"]
+    if grupo.all() or not grupo.any():
+        vacio = np.full(len(variables), np.nan)
+        return pd.DataFrame(dict(zip(columnas, [variables, vacio, vacio, vacio, vacio])))
+
+    observado = _medias(grupo[None, :].astype(np.float64), x, informados)[0] \
+        - _medias((~grupo)[None, :].astype(np.float64), x, informados)[0]
+    patrones = _patrones(informados)
+    tareas = [(bloque, x, informados, grupo, patrones) for bloque in _bloques(seed, n_resamples, len(grupo))]
+    partes = _ejecutar(_bloque_medias, tareas, workers, n_resamples * len(grupo) * max(len(variables), 1))
+    bootstrap = np.concatenate([p[0] for p in partes])
+    permutacion = np.concatenate([p[1] for p in partes])
+    inferior, superior = _intervalo(bootstrap, confianza)
+    return pd.DataFrame(dict(zip(columnas, [variables, observado, inferior, superior,
+                                            _p_valor(permutacion, observado)])))
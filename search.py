@@ -0,0 +1,239 @@
+import re
+from bisect import bisect_left
+
+import numpy as np
+import pandas as pd
+
+from incidents import plegar
+from ingestion import FrameCache
+
+
+# Columnas de texto libre que se indexan para la búsqueda
+columnas_busqueda = ['COMPLICATIONS INTRAOPERATORY', 'DIAGNOSIS 1', 'DIAGNOSIS 2', 'OBSERVATIONS 1',
+                     'OBSERVATIOS 2', 'OBSERVATIONS2', 'COMPLICATIONS', 'REMOVAL REASON']
+
+# Variantes catalanas (y singulares) que se indexan con la misma forma que su equivalente castellano
+variantes = {
+    "PLAQUE": "PLACA", "INTRAPLAQUE": "INTRAPLACA", "CARGOL": "TORNILLO", "SEPARAT": "SEPARADO",
+    "SEPARACIO": "SEPARACION", "DESPRES": "DESPUES", "TRENCAMENT": "ROTURA", "INFECCIO": "INFECCION",
+    "SAGNAT": "SANGRADO", "SAGNADO": "SANGRADO", "MOLT": "MUY", "BE": "BIEN", "SENSE": "SIN",
+}
+
+# Consonantes finales de los singulares con plural en -ES (dolor/dolores, infección/infecciones).
+# Tras otra consonante la E es del singular (fiebre/fiebres) y solo se quita la S.
+consonantes_plural = set("DJLNRYZ")
+vocales = set("AEIOU")
+
+patron_palabra = re.compile(r"[A-Z0-9]+")
+
+
+# Forma indexada de una palabra ya plegada: sin plural en -ES/-S y con la variante unificada
+def _forma(palabra):
+    if len(palabra) > 3 and palabra.endswith("ES") and palabra[-3] in consonantes_plural \
+            and palabra[-4] in vocales:
+        palabra = palabra[:-2]
+    elif len(palabra) > 3 and palabra.endswith("S") and not palabra.endswith("SS"):
+        palabra = palabra[:-1]
+    return variantes.get(palabra, palabra)
+
+
+# Texto -> palabras normalizadas (sin acentos ni mayúsculas; "col·locació" -> "COLLOCACIO")
+def tokenizar(texto):
+    texto = plegar(texto).replace("·", "").replace("'", " ")
+    return [_forma(p) for p in patron_palabra.findall(texto)]
+
+
+# Consulta -> lista de (tipo, palabras): término, prefijo* o "frase entre comillas" (la última palabra
+# de la frase también puede llevar *). Todas las partes deben cumplirse (AND).
+def interpretar(consulta):
+    partes = []
+    for frase, palabra in re.findall(r'"([^"]*)"|(\S+)', consulta):
+        texto = (frase or palabra).strip()
+        prefijo = texto.endswith("*")
+        palabras = tokenizar(texto)
+        if prefijo and palabras:
+            # La última palabra de un prefijo solo se pliega (el índice guarda formas sin plural:
+            # TextIndex._con_prefijo añade la forma indexada si el prefijo es una palabra completa)
+            ultima = patron_palabra.findall(plegar(texto).replace("·", "").replace("'", " "))[-1]
+            palabras[-1] = ultima
+        if not palabras:
+            continue
+        if prefijo:
+            partes.append(("prefijo", palabras))
+        else:
+            partes.append(("termino", palabras) if len(palabras) == 1 else ("frase", palabras))
+    return partes
+
+
+# Índice invertido del texto libre del registro. Cada valor distinto de cada columna es un
+# documento (se tokeniza una sola vez aunque se repita en muchas filas); cada término apunta a sus
+# documentos y, ya resuelto, a las posiciones de fila donde aparece. Las consultas devuelven
+# posiciones de fila (las mismas que las máscaras de RegisterView).
+class TextIndex:
+    def __init__(self, n_filas, terminos, documentos, columnas, filas_documento, filas_termino):
+        self.n_filas = n_filas
+        self.terminos = terminos  # término -> array de documentos
+        self.documentos = documentos  # documento -> tupla de palabras
+        self.columnas = columnas  # documento -> columna
+        self.filas_documento = filas_documento  # documento -> array de posiciones de fila
+        self.filas_termino = filas_termino  # término -> array de posiciones de fila (todas las columnas)
+        self.vocabulario = sorted(terminos)
+
+    @classmethod
+    def from_frame(cls, df, columnas=columnas_busqueda):
+        documentos, cols, filas_documento = [], [], []
+        for col in columnas:
+            if col not in df.columns:
+                continue
+            codes, uniques = pd.factorize(df[col], use_na_sentinel=True)
+            validos = np.flatnonzero(codes >= 0)
+            if len(validos) == 0:
+                continue
+            # Filas de cada valor distinto, agrupando las posiciones por código
+            orden = validos[np.argsort(codes[validos], kind="stable")]
+            cortes = np.cumsum(np.bincount(codes[validos], minlength=len(uniques)))[:-1]
+            for valor, filas in zip(uniques, np.split(orden, cortes)):
+                documentos.append(tuple(tokenizar(valor)))
+                cols.append(col)
+                filas_documento.append(filas.astype(np.int32))
+
+        por_termino = {}
+        for doc, palabras in enumerate(documentos):
+            for palabra in set(palabras):
+                por_termino.setdefault(palabra, []).append(doc)
+        terminos = {t: np.array(docs, dtype=np.int32) for t, docs in por_termino.items()}
+        filas_termino = {t: cls._unir([filas_documento[d] for d in docs], len(df)) for t, docs in terminos.items()}
+        return cls(len(df), terminos, documentos, cols, filas_documento, filas_termino)
+
+    @staticmethod
+    def _unir(listas, n_filas=None):
+        if not listas:
+            return np.empty(0, dtype=np.int32)
+        if len(listas) == 1:
+            return listas[0]
+        if n_filas is None:
+            return np.unique(np.concatenate(listas))
+        # Con muchas filas, marcar una máscara es más rápido que ordenar la concatenación
+        mascara = np.zeros(n_filas, dtype=bool)
+        for filas in listas:
+            mascara[filas] = True
+        return np.flatnonzero(mascara).astype(np.int32)
+
+    @property
+    def nbytes(self):
+        arrays = list(self.terminos.values()) + list(self.filas_documento) + list(self.filas_termino.values())
+        return sum(a.nbytes for a in arrays)
+
+    def __len__(self):
+        return len(self.vocabulario)
+
+    # Términos del vocabulario que empiezan por el prefijo, más su forma indexada si el prefijo es una
+    # palabra completa en plural ("placas*" -> PLACA, "antes*" -> ANTE)
+    def _con_prefijo(self, prefijo):
+        inicio = bisect_left(self.vocabulario, prefijo)
+        terminos = self.vocabulario[inicio:bisect_left(self.vocabulario, prefijo + "\uffff", inicio)]
+        forma = _forma(prefijo)
+        if forma != prefijo and forma in self.terminos and forma not in terminos:
+            terminos.append(forma)
+        return terminos
+
+    # Documentos (valores distintos) que cumplen una parte de la consulta
+    def _documentos(self, tipo, palabras):
+        if tipo == "termino":
+            return self.terminos.get(palabras[0], np.empty(0, dtype=np.int32))
+        if tipo == "prefijo":
+            docs = self._unir([self.terminos[t] for t in self._con_prefijo(palabras[-1])])
+            if len(palabras) == 1:
+                return docs
+            # Frase cuya última palabra es un prefijo: "dolor en la pl*"
+            return np.array([d for d in docs if self._contiene_frase(self.documentos[d], palabras, True)],
+                            dtype=np.int32)
+        candidatos = None
+        for palabra in set(palabras):
+            docs = self.terminos.get(palabra, np.empty(0, dtype=np.int32))
+            candidatos = docs if candidatos is None else np.intersect1d(candidatos, docs)
+        return np.array([d for d in candidatos if self._contiene_frase(self.documentos[d], palabras)],
+                        dtype=np.int32)
+
+    @staticmethod
+    def _contiene_frase(texto, palabras, prefijo_final=False):
+        n = len(palabras)
+        forma = _forma(palabras[-1])
+        for i in range(len(texto) - n + 1):
+            ultima = texto[i + n - 1]
+            if texto[i:i + n - 1] == tuple(palabras[:-1]) and (
+                    ultima.startswith(palabras[-1]) or ultima == forma if prefijo_final else ultima == palabras[-1]):
+                return True
+        return False
+
+    # Posiciones de fila de una parte de la consulta
+    def _filas(self, tipo, palabras, columnas):
+        if columnas is None and (tipo == "termino" or (tipo == "prefijo" and len(palabras) == 1)):
+            if tipo == "termino":
+                return self.filas_termino.get(palabras[0], np.empty(0, dtype=np.int32))
+            return self._unir([self.filas_termino[t] for t in self._con_prefijo(palabras[0])], self.n_filas)
+        docs = self._documentos(tipo, palabras)
+        if columnas is not None:
+            docs = [d for d in docs if self.columnas[d] in columnas]
+        return self._unir([self.filas_documento[d] for d in docs], self.n_filas)
+
+    # Posiciones de fila (ordenadas) que cumplen todas las partes de la consulta, en cualquiera de
+    # las columnas indexadas o solo en las indicadas
+    def buscar(self, consulta, columnas=None):
+        partes = interpretar(consulta)
+        if not partes:
+            return np.empty(0, dtype=np.int32)
+        if len(partes) == 1:
+            return self._filas(*partes[0], columnas)
+        mascara = np.ones(self.n_filas, dtype=bool)
+        for tipo, palabras in partes:
+            parte = np.zeros(self.n_filas, dtype=bool)
+            parte[self._filas(tipo, palabras, columnas)] = True
+            mascara &= parte
+        return np.flatnonzero(mascara).astype(np.int32)
+
+    # Máscara booleana de las filas que cumplen la consulta (para RegisterView.donde)
+    def mascara(self, consulta, columnas=None):
+        mascara = np.zeros(self.n_filas, dtype=bool)
+        mascara[self.buscar(consulta, columnas)] = True
+        return mascara
+
+    # Columnas donde aparece alguna parte de la consulta, por posición de fila ("DIAGNOSIS 1, OBSERVATIONS 1")
+    def columnas_coincidentes(self, consulta, filas):
+        partes = interpretar(consulta)
+        coincidencias = [[] for _ in filas]
+        for col in dict.fromkeys(self.columnas):
+            en_columna = np.zeros(self.n_filas, dtype=bool)
+            for tipo, palabras in partes:
+                en_columna[self._filas(tipo, palabras, [col])] = True
+            for i in np.flatnonzero(en_columna[filas]):
+                coincidencias[i].append(col)
+        return pd.Series([", ".join(c) or None for c in coincidencias], index=pd.Index(filas), dtype=object)
+
+
+search_index_cache = FrameCache()
+
+
+def get_search_index(version, df, cache=search_index_cache):
+    return cache.get_or_compute(version, lambda: TextIndex.from_frame(df))
+
+
+# Uso: python search.py registro.xlsx "consulta" [...] -> filas que cumplen cada consulta y tiempo
+if __name__ == "__main__":
+    import sys
+    import time
+
+    from ingestion import load_register
+    from normalization import normalize_register
+
+    with open(sys.argv[1], "rb") as f:
+        _, registro = load_register(f, columns=columnas_busqueda)
+    registro = normalize_register(registro)
+    inicio = time.perf_counter()
+    indice = TextIndex.from_frame(registro)
+    print(f"Índice: {len(indice)} términos, {len(indice.documentos)} textos distintos "
+          f"({(time.perf_counter() - inicio) * 1000:.1f} ms)")
+    for consulta in sys.argv[2:]:
+        inicio = time.perf_counter()
+        filas = indice.buscar(consulta)
+        print(f"{consulta!r}: {len(filas)} filas ({(time.perf_counter() - inicio) * 1e6:.0f} µs)")
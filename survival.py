@@ -0,0 +1,116 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+
+class KaplanMeier(NamedTuple):
+    # Una fila por estrato y tiempo con eventos o censuras: Estrato, Tiempo, En Riesgo, Eventos,
+    # Censurados, Supervivencia, IC Inferior, IC Superior
+    curvas: pd.DataFrame
+    # Una fila por estrato: Estrato, n, Eventos, Censurados, Mediana, IC Inferior, IC Superior
+    resumen: pd.DataFrame
+    confianza: float
+
+
+# Duración (días) y evento de cada caso a partir de dos columnas de fechas. Los casos con fecha de
+# inicio y sin fecha final, o con una fecha final posterior al corte (programada, aún no ocurrida),
+# se censuran en la fecha de corte; los intervalos negativos (fecha final anterior a la inicial o
+# inicio posterior al corte) se excluyen.
+def duraciones(inicio, fin, corte):
+    inicio = pd.to_datetime(inicio, errors="coerce")
+    fin = pd.to_datetime(fin, errors="coerce")
+    evento = (fin.notna() if pd.isna(corte) else fin <= corte).to_numpy()
+    dias = (fin.where(evento, corte) - inicio).dt.days.to_numpy(dtype=np.float64)
+    validos = inicio.notna().to_numpy() & (dias >= 0)
+    return dias, evento, validos
+
+
+# Estimador de Kaplan-Meier de todos los estratos a la vez: los casos se ordenan por (estrato, tiempo)
+# y los conteos en riesgo, el producto de supervivencia y la varianza de Greenwood se calculan con
+# sumas acumuladas por tramos, sin recorrer los estratos. Intervalos log(-log) puntuales y de la
+# mediana (Brookmeyer-Crowley: primeros tiempos en que cada banda baja de 0,5).
+def kaplan_meier(tiempos, eventos, estratos=None, confianza=0.95):
+    from scipy.stats import norm
+
+    tiempos = np.asarray(tiempos, dtype=np.float64)
+    eventos = np.asarray(eventos, dtype=bool)
+    if estratos is None:
+        estratos = np.zeros(len(tiempos), dtype=np.int64)
+        etiquetas = pd.Index(["Total"])
+    else:
+        estratos, etiquetas = pd.factorize(pd.Series(estratos), sort=True)
+        etiquetas = pd.Index(etiquetas)
+    validos = ~np.isnan(tiempos) & (estratos >= 0)
+    tiempos, eventos, estratos = tiempos[validos], eventos[validos], estratos[validos]
+
+    # Pares (estrato, tiempo) distintos con sus eventos y casos
+    orden = np.lexsort((tiempos, estratos))
+    e_ord, t_ord, ev_ord = estratos[orden], tiempos[orden], eventos[orden]
+    nuevo = np.ones(len(t_ord), dtype=bool)
+    nuevo[1:] = (e_ord[1:] != e_ord[:-1]) | (t_ord[1:] != t_ord[:-1])
+    grupo = np.cumsum(nuevo) - 1
+    estrato = e_ord[nuevo]
+    tiempo = t_ord[nuevo]
+    casos = np.bincount(grupo, minlength=len(tiempo)).astype(np.float64)
+    d = np.bincount(grupo, weights=ev_ord, minlength=len(tiempo))
+
+    # En riesgo: casos del estrato con tiempo >= t (suma acumulada inversa dentro del estrato)
+    inicio_estrato = np.ones(len(tiempo), dtype=bool)
+    inicio_estrato[1:] = estrato[1:] != estrato[:-1]
+    n_estrato = np.bincount(estrato, weights=casos, minlength=len(etiquetas))
+    previos = np.cumsum(casos) - casos
+    previos -= _por_tramos(previos, inicio_estrato)
+    en_riesgo = n_estrato[estrato] - previos
+
+    # S(t) = prod(1 - d/n) y Greenwood = sum(d / (n (n - d))) acumulados por estrato
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factor = 1.0 - d / en_riesgo
+        agotado = factor <= 0
+        log_s = np.cumsum(np.log(np.where(agotado, 1.0, factor)))
+        log_s -= _por_tramos(log_s - np.log(np.where(agotado, 1.0, factor)), inicio_estrato)
+        ceros = np.cumsum(agotado)
+        ceros -= _por_tramos(ceros - agotado, inicio_estrato)
+        supervivencia = np.where(ceros > 0, 0.0, np.exp(log_s))
+        terminos = np.where(agotado, 0.0, d / (en_riesgo * (en_riesgo - d)))
+        greenwood = np.cumsum(terminos)
+        greenwood -= _por_tramos(greenwood - terminos, inicio_estrato)
+
+        z = norm.ppf(0.5 + confianza / 2)
+        se = np.sqrt(greenwood) / np.abs(np.log(supervivencia))
+        interior = (supervivencia > 0) & (supervivencia < 1)
+        inferior = np.where(interior, supervivencia ** np.exp(z * se), supervivencia)
+        superior = np.where(interior, supervivencia ** np.exp(-z * se), supervivencia)
+
+    curvas = pd.DataFrame({
+        "Estrato": etiquetas[estrato] if len(estrato) else pd.Index([], dtype=object),
+        "Tiempo": tiempo, "En Riesgo": en_riesgo.astype(np.int64), "Eventos": d.astype(np.int64),
+        "Censurados": (casos - d).astype(np.int64), "Supervivencia": supervivencia,
+        "IC Inferior": inferior, "IC Superior": superior,
+    })
+
+    n = n_estrato.astype(np.int64)
+    n_eventos = np.bincount(estrato, weights=d, minlength=len(etiquetas)).astype(np.int64)
+    resumen = pd.DataFrame({
+        "Estrato": etiquetas, "n": n, "Eventos": n_eventos, "Censurados": n - n_eventos,
+        "Mediana": _primer_tiempo(estrato, tiempo, supervivencia, len(etiquetas)),
+        "IC Inferior": _primer_tiempo(estrato, tiempo, inferior, len(etiquetas)),
+        "IC Superior": _primer_tiempo(estrato, tiempo, superior, len(etiquetas)),
+    })
+    return KaplanMeier(curvas, resumen, confianza)
+
+
+# Valor del acumulado al empezar el tramo de cada fila (para restarlo y reiniciar la suma en cada estrato)
+def _por_tramos(acumulado, inicio_tramo):
+    indices = np.maximum.accumulate(np.where(inicio_tramo, np.arange(len(acumulado)), 0))
+    return acumulado[indices]
+
+
+# Primer tiempo de cada estrato en que la curva baja de 0,5 (NaN si no llega)
+def _primer_tiempo(estrato, tiempo, curva, n_estratos):
+    resultado = np.full(n_estratos, np.nan)
+    bajo = np.flatnonzero(curva <= 0.5)
+    # Los tiempos van ordenados dentro de cada estrato: la primera aparición es el mínimo
+    estratos, primeras = np.unique(estrato[bajo], return_index=True)
+    resultado[estratos] = tiempo[bajo[primeras]]
+    return resultado
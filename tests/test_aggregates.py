@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregates import CalendarCounts, SizeCounts
+
+
+@pytest.fixture
+def registro():
+    rng = np.random.default_rng(3)
+    n = 400
+    fechas = pd.Timestamp("2022-11-01") + pd.to_timedelta(rng.integers(0, 500, n), unit="D")
+    df = pd.DataFrame({
+        "YEAR": fechas.year,
+        "COUNTRY": rng.choice(["ES", "IT", "FR", None], n, p=[0.5, 0.3, 0.15, 0.05]),
+        "DATE": fechas.where(rng.random(n) > 0.05),
+        "Intervenciones": (rng.random(n) < 0.5).astype(np.int8),
+        "b (screw length)": rng.choice([12.0, 14.0, 16.0, np.nan], n),
+    })
+    # Francia sin intervenciones: no tiene columna en el mapa de calor
+    df.loc[df["COUNTRY"] == "FR", "Intervenciones"] = 0
+    return df
+
+
+@pytest.mark.parametrize("periodo, formato", [("M", "%Y-%m"), ("W", None), ("Q", None), ("Y", "%Y")])
+def test_matriz_del_calendario_como_tabla_dinamica(registro, periodo, formato):
+    fechas = registro["DATE"]
+    if periodo == "W":
+        etiquetas = (fechas - pd.to_timedelta(fechas.dt.weekday, unit="D")).dt.strftime("%Y-%m-%d")
+    elif periodo == "Q":
+        etiquetas = fechas.dt.year.astype("Int64").astype(str) + "Q" + fechas.dt.quarter.astype("Int64").astype(str)
+    else:
+        etiquetas = fechas.dt.strftime(formato)
+    con_fecha = registro.assign(Periodo=etiquetas).dropna(subset=["DATE", "COUNTRY"])
+    esperado = con_fecha.pivot_table(
+        index="Periodo", columns="COUNTRY", values="Intervenciones", aggfunc="sum", fill_value=0)
+    esperado = esperado.loc[:, esperado.sum() != 0].reindex(sorted(con_fecha["Periodo"].unique()), fill_value=0)
+
+    matriz = CalendarCounts.from_frame(registro).matriz(periodo)
+    pd.testing.assert_frame_equal(matriz, esperado, check_dtype=False, check_names=False)
+    assert "FR" not in matriz.columns
+
+
+def test_calendario_anual(registro):
+    calendario = CalendarCounts.from_frame(registro)
+    pd.testing.assert_series_equal(calendario.anual(), registro.groupby(["YEAR", "COUNTRY"]).size(),
+                                   check_names=False, check_index_type=False)
+    intervenidos = registro[registro["Intervenciones"] == 1].groupby(["YEAR", "COUNTRY"]).size()
+    pd.testing.assert_series_equal(calendario.anual(solo_intervenciones=True), intervenidos,
+                                   check_names=False, check_index_type=False)
+
+
+def test_matriz_de_medidas_como_crosstab(registro):
+    medidas = SizeCounts.from_frame(registro).seleccionar({"COUNTRY": ["ES", "IT"]})
+    filtrado = registro[registro["COUNTRY"].isin(["ES", "IT"])]
+    columna = "b (screw length)"
+
+    matriz = medidas.matriz(columna)
+    pd.testing.assert_frame_equal(matriz.conteos, pd.crosstab(filtrado["YEAR"], filtrado[columna]),
+                                  check_dtype=False, check_index_type=False, check_names=False)
+    pd.testing.assert_series_equal(matriz.totales, filtrado.groupby("YEAR").size(),
+                                   check_dtype=False, check_index_type=False, check_names=False)
+    pd.testing.assert_series_equal(matriz.desconocidos, filtrado[columna].isna().groupby(filtrado["YEAR"]).sum(),
+                                   check_dtype=False, check_index_type=False, check_names=False)
+    pd.testing.assert_series_equal(medidas.frecuencia(columna), filtrado[columna].value_counts().sort_index(),
+                                   check_dtype=False, check_index_type=False, check_names=False)
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import ttest_ind
+
+from comparisons import compare_groups
+
+
+@pytest.fixture
+def registro():
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({"x": rng.normal(size=120), "y": rng.gamma(2.0, size=120),
+                       "pais": rng.choice(["ES", "IT", "FR"], size=120)})
+    df.loc[df.index % 7 == 0, "x"] = np.nan
+    df.loc["ES" == df["pais"], "y"] += 1.0
+    return df
+
+
+def test_cada_grupo_frente_al_resto_como_scipy(registro):
+    resultado = compare_groups(registro, registro["pais"], ["x", "y"]).set_index(["Grupo", "Variable"])
+    for pais in ["ES", "IT", "FR"]:
+        for variable in ["x", "y"]:
+            grupo = registro.loc[registro["pais"] == pais, variable].dropna()
+            resto = registro.loc[registro["pais"] != pais, variable].dropna()
+            referencia = ttest_ind(grupo, resto, equal_var=False)
+            fila = resultado.loc[(pais, variable)]
+            assert fila["t"] == pytest.approx(referencia.statistic)
+            assert fila["P-valor"] == pytest.approx(referencia.pvalue)
+            assert fila["Media Grupo"] == pytest.approx(grupo.mean())
+            assert (fila["n Grupo"], fila["n Resto"]) == (len(grupo), len(resto))
+
+
+def test_mascara_booleana_solo_compara_el_grupo_verdadero(registro):
+    mascara = registro["pais"] == "ES"
+    resultado = compare_groups(registro, mascara, ["y"])
+    assert resultado["Grupo"].tolist() == [True]
+    referencia = ttest_ind(registro.loc[mascara, "y"], registro.loc[~mascara, "y"], equal_var=False)
+    assert resultado["P-valor"].iloc[0] == pytest.approx(referencia.pvalue)
@@ -0,0 +1,16 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from correlations import correlation_matrix
+
+
+@pytest.mark.parametrize("metodo", ["pearson", "spearman"])
+def test_igual_que_pandas_con_vacios(metodo):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.normal(size=(300, 6)).cumsum(axis=1), columns=list("abcdef"))
+    df = df.mask(rng.random(df.shape) < 0.25)
+    df["c"] = df["c"].round()  # empates
+    resultado = correlation_matrix(df, df.columns, metodo)
+    np.testing.assert_allclose(resultado.r.to_numpy(), df.corr(method=metodo).to_numpy(), atol=1e-12)
+    assert resultado.n.at["a", "b"] == df[["a", "b"]].dropna().shape[0]
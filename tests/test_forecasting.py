@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import forecasting
+from forecasting import (ajustar_series, empalmar, prevision_mensual, previsiones_anuales, series_mensuales,
+                         total_anual, ultimo_mes)
+from ingestion import FrameCache
+
+
+@pytest.fixture
+def registro():
+    # Informes de enero a mayo de 2024 (dos por mes en ES, uno en IT); cirugías hasta julio
+    informes = pd.to_datetime([f"2024-{m:02d}-10" for m in range(1, 6) for _ in range(3)])
+    return pd.DataFrame({
+        "COUNTRY": ["ES", "ES", "IT"] * 5,
+        "DATE": informes,
+        "SURGERY DATE": informes + pd.Timedelta(days=60),
+        "b (screw length)": [12.0, 14.0, 12.0] * 5,
+    })
+
+
+def test_ultimo_mes_completo():
+    assert ultimo_mes(pd.Series(pd.to_datetime(["2024-03-05", "2024-05-31"]))) == 2024 * 12 + 4
+    assert ultimo_mes(pd.Series(pd.to_datetime(["2024-03-05", "2024-05-30"]))) == 2024 * 12 + 3
+    assert ultimo_mes(pd.Series(pd.to_datetime(["2024-05-31"])), corte=pd.Timestamp("2024-04-15")) == 2024 * 12 + 2
+    assert ultimo_mes(pd.Series([pd.NaT])) is None
+
+
+def test_cada_serie_se_corta_en_su_fecha(registro):
+    series = series_mensuales(registro)
+    claves = series.claves.assign(ultimo=series.ultimos).set_index(["Serie", "COUNTRY", "Medida"])
+    # Informes hasta abril (mayo no ha terminado); intervenciones hasta junio
+    assert claves.loc[("Informes", "ES", ""), "ultimo"] == 2024 * 12 + 3
+    assert claves.loc[("Intervenciones", "ES", ""), "ultimo"] == 2024 * 12 + 5
+    assert series.meses.tolist() == list(range(2024 * 12, 2024 * 12 + 6))
+    fila = series.valores[claves.index.get_loc(("Informes", "ES", ""))]
+    assert fila[:4].tolist() == [2, 2, 2, 2] and np.isnan(fila[4:]).all()
+    tornillo = series.valores[claves.index.get_loc(("Tornillo", "ES", 12.0))]
+    assert tornillo[:4].tolist() == [1, 1, 1, 1]
+
+
+def test_previsiones_anuales_de_series_cortas(registro):
+    prevision = prevision_mensual(registro, workers=1)
+    meses = prevision.meses[prevision.meses["Serie"] == "Informes"]
+    # Menos de MIN_MESES meses: media reciente hasta diciembre del año siguiente
+    assert set(meses["Método"]) == {"Media reciente"}
+    assert meses.groupby("COUNTRY")["MES"].agg(["min", "max"]).values.tolist() == [[2024 * 12 + 4, 2025 * 12 + 11]] * 2
+
+    anuales = previsiones_anuales(prevision, "Informes").set_index(["YEAR", "COUNTRY"])
+    assert anuales.index.get_level_values("YEAR").unique().tolist() == [2024, 2025]
+    assert anuales.loc[(2024, "ES"), "Previsión"] == pytest.approx(24)  # 4 meses observados + 8 previstos
+    assert anuales.loc[(2025, "IT"), "Previsión"] == pytest.approx(12)
+
+    total = total_anual(previsiones_anuales(prevision, "Informes"))
+    assert total.set_index("YEAR").loc[2025, "Previsión"] == pytest.approx(36)
+    assert (total["COUNTRY"] == "Total").all()
+
+
+def test_empalmar_sustituye_el_primer_anio():
+    anuales = pd.DataFrame({"YEAR": [2023, 2023, 2024, 2024], "COUNTRY": ["ES", "IT", "ES", "IT"],
+                            "Previsión": [10.0, 5.0, 12.0, 6.0], "Inferior": [10.0, 5.0, 9.0, 4.0],
+                            "Superior": [10.0, 5.0, 15.0, 8.0]})
+    observados = pd.Series([11, 3], index=pd.MultiIndex.from_tuples([(2023, "ES"), (2024, "IT")]))
+    empalmado = empalmar(anuales, observados)
+    assert empalmado["Previsión"].tolist() == [11.0, 5.0, 12.0, 6.0]
+    assert empalmado.loc[0, ["Inferior", "Superior"]].tolist() == [11.0, 11.0]
+    totales = empalmar(total_anual(anuales), pd.Series([20], index=[2023]))
+    assert totales["Previsión"].tolist() == [20.0, 18.0]
+
+
+def test_modelos_en_cache_por_historia(registro, monkeypatch):
+    series = series_mensuales(registro)
+    horizontes = np.full(len(series.claves), 3)
+    cache = FrameCache()
+    primeros = ajustar_series(series, horizontes, workers=1, cache=cache)
+
+    llamadas = []
+    original = forecasting._ejecutar
+    monkeypatch.setattr(forecasting, "_ejecutar", lambda tareas, workers=None: llamadas.append(len(tareas))
+                        or original(tareas, workers))
+    segundos = ajustar_series(series, horizontes, workers=1, cache=cache)
+    assert llamadas == [0]
+    assert all(a is b for a, b in zip(primeros, segundos))
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregates import CountCube
+from funnel import conversion_funnel, etapas, tiempo_en_etapa
+from normalization import estado_map
+
+
+@pytest.fixture
+def registro():
+    estados = [1, 2, 3, 3, 4, 4, 4, 5, 5, 5]
+    return pd.DataFrame({
+        "COUNTRY": ["ES"] * 6 + ["IT"] * 4,
+        "STATE NUMBER": [estado_map[e] for e in estados],
+        "DATE": pd.to_datetime(["2023-01-01"] * 10),
+        "SURGERY DATE": pd.to_datetime([None] * 4 + ["2023-01-11", "2023-01-21", "2023-01-31",
+                                        "2023-01-05", "2023-01-09", "2023-02-10"]),
+        "DATE2": pd.to_datetime([None] * 7 + ["2023-03-01", None, "2023-02-20"]),
+    })
+
+
+def test_embudo_a_mano(registro):
+    registro.loc[9, "STATE NUMBER"] = None
+    embudo = conversion_funnel(CountCube.from_frame(registro))
+    tabla = embudo.etapas
+    assert tabla["Etapa"].tolist() == etapas
+    # Estados 1, 2, 3, 3, 4, 4, 4, 5, 5 (el último caso sin estado)
+    assert tabla["Abandonos"].tolist() == [1, 1, 2, 3, 2]
+    assert tabla["Casos"].tolist() == [9, 8, 7, 5, 2]
+    assert tabla["Conversión"].iloc[:-1].tolist() == pytest.approx([8 / 9, 7 / 8, 5 / 7, 2 / 5])
+    assert np.isnan(tabla["Conversión"].iloc[-1])
+    assert tabla["Conversión Acumulada"].tolist() == pytest.approx([1, 8 / 9, 7 / 9, 5 / 9, 2 / 9])
+    assert embudo.sin_estado == 1
+
+
+def test_embudo_por_pais(registro):
+    tabla = conversion_funnel(CountCube.from_frame(registro), por="COUNTRY").etapas
+    casos = tabla.pivot(index="Grupo", columns="Etapa", values="Casos")
+    assert casos.loc["ES"].tolist() == [6, 5, 4, 2, 0]
+    assert casos.loc["IT"].tolist() == [4, 4, 4, 4, 3]
+
+
+def test_tiempo_en_etapa_como_pandas(registro):
+    resultado = tiempo_en_etapa(registro, por="COUNTRY").set_index(["Grupo", "Transición"])
+    for (pais, transicion), fila in resultado.iterrows():
+        inicio, fin = ("DATE", "SURGERY DATE") if transicion.startswith(estado_map[3]) else ("SURGERY DATE", "DATE2")
+        dias = (registro[fin] - registro[inicio]).dt.days[registro["COUNTRY"] == pais].dropna()
+        assert fila["n"] == len(dias)
+        assert fila["Media (días)"] == pytest.approx(dias.mean())
+        assert [fila["P25 (días)"], fila["Mediana (días)"], fila["P75 (días)"]] == \
+            pytest.approx(dias.quantile([0.25, 0.5, 0.75]).tolist())
+    assert resultado.loc[("IT", f"{estado_map[4]} → {estado_map[5]}"), "n"] == 2
@@ -0,0 +1,33 @@
+import pandas as pd
+
+from incidents import KeywordMatcher
+
+
+def _palabras(textos, **kwargs):
+    df = pd.DataFrame({"DIAGNOSIS 1": textos})
+    return KeywordMatcher(**kwargs).match(df)["Palabra Clave"].tolist()
+
+
+def test_despres_despues_no_es_incidencia():
+    assert _palabras(["Després de la cirurgia", "DESPRÉS DE LA CIRURGIA"]) == [None, None]
+
+
+def test_despres_desprendido_con_y_sin_acento():
+    assert _palabras(["Plaque desprès", "placa despres"]) == ["DESPRÈS", "DESPRÈS"]
+
+
+def test_palabras_sin_acento():
+    assert _palabras(["separacion de la barra", "Separación"]) == ["SEPARACIÓN", "SEPARACIÓN"]
+
+
+def test_sin_plegado_solo_coincidencia_exacta():
+    assert _palabras(["separacion", "SEPARACIÓN", "desprès"], plegar_acentos=False) == [None, "SEPARACIÓN", "DESPRÈS"]
+
+
+def test_primera_columna_con_coincidencia():
+    df = pd.DataFrame({"DIAGNOSIS 1": ["sin incidencias", "intraplaques"],
+                       "OBSERVATIONS 1": ["tornillo soltado", "desprendido"]})
+    resultado = KeywordMatcher().match(df)
+    assert resultado["Fila Roja"].tolist() == [True, True]
+    assert resultado["Columna Palabra Clave"].tolist() == ["OBSERVATIONS 1", "DIAGNOSIS 1"]
+    assert resultado["Palabra Clave"].tolist() == ["SOLTADO", "INTRAPLAQUES"]
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregates import (CalendarCounts, CountCube, SizeCounts, calendar_cache, cube_cache, dimensiones_cubo,
+                        size_cache)
+from incidents import build_incident_index, incident_index_cache
+from incremental import update_register
+from ingestion import frame_cache
+from normalization import normalize_register, normalized_cache
+
+
+def _exportacion(n, seed):
+    rng = np.random.default_rng(seed)
+    fechas = pd.Timestamp("2021-01-01") + pd.to_timedelta(rng.integers(0, 900, n), unit="D")
+    operado = rng.random(n) < 0.6
+    return pd.DataFrame({
+        "CASE": [f"C{i:04d}" for i in range(n)],
+        "YEAR": fechas.year,
+        "COUNTRY": rng.choice(["ES", "IT", "FR"], n),
+        "STATE NUMBER": np.where(operado, rng.choice([4, 5], n), rng.choice([1, 2, 3], n)),
+        "KIT": rng.choice(["A", "B", None], n),
+        "DATE": fechas,
+        "SURGERY DATE": fechas.where(operado) + pd.Timedelta(days=30),
+        "DATE2": pd.NaT,
+        "b (screw length)": rng.choice([12.0, 14.0, np.nan], n),
+        "a (elevator plate)": rng.choice(["10", " 12", None], n),
+        "DIAGNOSIS 1": rng.choice(["sin incidencias", "placa desplazada", "tornillo soltado"], n),
+    })
+
+
+# Conteos distintos de cero por combinación de etiquetas (independiente del orden de los ejes)
+def _conteos(cubo):
+    etiquetas = [[None if pd.isna(v) else v for v in cubo.labels[dim]] for dim in cubo.dims]
+    posiciones = np.argwhere(cubo.counts != 0)
+    return {tuple(etiquetas[eje][i] for eje, i in enumerate(pos)): int(cubo.counts[tuple(pos)]) for pos in posiciones}
+
+
+def test_combinar_equivale_a_contar_todo():
+    df = normalize_register(_exportacion(200, 0))
+    a, b = df.iloc[:120], df.iloc[120:]
+    assert _conteos(CountCube.from_frame(a).combinar(CountCube.from_frame(b))) == _conteos(CountCube.from_frame(df))
+    assert _conteos(CountCube.from_frame(df).combinar(CountCube.from_frame(b), signo=-1)) == _conteos(CountCube.from_frame(a))
+
+
+@pytest.fixture
+def versiones():
+    base = _exportacion(300, 1)
+    nueva = base.drop(index=[3, 50, 51]).copy()
+    nueva.loc[[10, 20, 30], "STATE NUMBER"] = 5
+    nueva.loc[20, "COUNTRY"] = "PT"
+    nueva.loc[30, "DIAGNOSIS 1"] = "placa desplazada"
+    nueva = pd.concat([nueva, _exportacion(20, 2).assign(CASE=[f"N{i:02d}" for i in range(20)])], ignore_index=True)
+    nueva = nueva.sample(frac=1, random_state=0).reset_index(drop=True)
+
+    frame_cache.put("base", base)
+    normalized_cache.put("base", normalize_register(base))
+    yield base, nueva
+    for cache in (frame_cache, normalized_cache, incident_index_cache, cube_cache, calendar_cache, size_cache):
+        cache.descartar(lambda version: version in ("base", "nueva"))
+
+
+def test_actualizacion_equivale_a_recalcular(versiones):
+    _, nueva = versiones
+    cambios = update_register("base", "nueva", nueva)
+    assert cambios == {"insertados": 20, "modificados": 3, "eliminados": 3}
+
+    completo = normalize_register(nueva)
+    incremental = normalized_cache.get("nueva")
+    pd.testing.assert_frame_equal(incremental[completo.columns].astype(object), completo.astype(object))
+
+    pd.testing.assert_frame_equal(incident_index_cache.get("nueva").astype(object),
+                                  build_incident_index(completo).astype(object))
+    assert _conteos(cube_cache.get("nueva")) == _conteos(CountCube.from_frame(completo, dimensiones_cubo))
+    calendario, referencia = calendar_cache.get("nueva"), CalendarCounts.from_frame(completo)
+    assert _conteos(calendario.mensual) == _conteos(referencia.mensual)
+    assert _conteos(calendario.semanal) == _conteos(referencia.semanal)
+    medidas, referencia = size_cache.get("nueva"), SizeCounts.from_frame(completo)
+    for col, cubo in referencia.cubos.items():
+        assert _conteos(medidas.cubos[col]) == _conteos(cubo)
+
+
+def test_sin_clave_de_caso_no_hay_actualizacion(versiones):
+    _, nueva = versiones
+    assert update_register("base", "nueva", nueva.assign(CASE="X")) is None
+    assert update_register("otra", "nueva", nueva) is None
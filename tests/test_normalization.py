@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from normalization import estado_map, informe_memoria, normalize_register, restaurar_categorias
+
+
+def _exportacion(n=200):
+    rng = np.random.default_rng(4)
+    return pd.DataFrame({
+        "YEAR": rng.choice([2022.0, 2023.0, np.nan], n),
+        "COUNTRY": rng.choice(["ES", "IT"], n),
+        "STATE NUMBER": rng.choice(np.array([1, 4, 5, "Anulado"], dtype=object), n),
+        "SURGERY DATE": pd.to_datetime(rng.choice(["2023-01-10", None], n)),
+        "b (screw length)": rng.choice([12, 14], n),
+        "INDICE€": rng.normal(size=n),
+        "DIAGNOSIS 1": [f"diagnóstico {i}" for i in range(n)],
+        "KIT": rng.choice(["A", "B"], n),
+        "SIDE": rng.choice(["Izquierda", "Derecha"], n),
+    })
+
+
+def test_tipos_compactos():
+    raw = _exportacion()
+    df = normalize_register(raw)
+    assert str(df["YEAR"].dtype) == "Int16"
+    assert df["b (screw length)"].dtype == np.float32 and df["Índice E"].dtype == np.float32
+    assert df["Intervenciones"].dtype == np.int8
+    assert isinstance(df["SIDE"].dtype, pd.CategoricalDtype)
+    assert not isinstance(df["DIAGNOSIS 1"].dtype, pd.CategoricalDtype)
+    assert df["STATE NUMBER"].cat.categories.tolist() == list(estado_map.values()) + ["Anulado"]
+    assert (df["Índice E"].to_numpy() == raw["INDICE€"].to_numpy(dtype=np.float32)).all()
+
+
+def test_restaurar_categorias_tras_unir_trozos():
+    raw = _exportacion()
+    completo = normalize_register(raw)
+    unido = restaurar_categorias(pd.concat([normalize_register(raw.iloc[:50]), normalize_register(raw.iloc[50:])]))
+    for col in ["COUNTRY", "KIT", "STATE NUMBER", "SIDE"]:
+        assert isinstance(unido[col].dtype, pd.CategoricalDtype)
+        assert unido[col].astype(object).equals(completo[col].astype(object))
+    assert unido["STATE NUMBER"].cat.categories.tolist() == completo["STATE NUMBER"].cat.categories.tolist()
+
+
+def test_informe_memoria():
+    raw = _exportacion()
+    informe = informe_memoria(raw, normalize_register(raw)).set_index("Columna")
+    assert informe.loc["Intervenciones", "Bytes Antes"] == 0  # columna derivada
+    assert informe.loc["SIDE", "Bytes Ahorrados"] > 0
+    assert (informe["Bytes Ahorrados"] == informe["Bytes Antes"] - informe["Bytes Después"]).all()
+    assert informe["Bytes Ahorrados"].is_monotonic_decreasing
@@ -0,0 +1,59 @@
+import gc
+
+import numpy as np
+import pytest
+
+from ingestion import FrameCache
+from registry import DatasetRegistry
+
+
+@pytest.fixture
+def memorias():
+    return FrameCache(), FrameCache(), FrameCache()
+
+
+def _cargar(caches, resultados, version):
+    for cache in caches:
+        cache.put(version, np.zeros(1000))
+    resultados.put((version, (), "resumen"), np.zeros(100))
+
+
+def test_referencias_por_sesion(memorias):
+    *caches, resultados = memorias
+    registro = DatasetRegistry(caches, resultados, max_bytes=10 ** 9)
+    _cargar(caches, resultados, "v1")
+    a, b = registro.adquirir("v1"), registro.adquirir("v1")
+    assert registro.sesiones("v1") == 2
+    a.liberar()
+    a.liberar()  # liberar dos veces no descuenta otra sesión
+    assert registro.sesiones("v1") == 1
+    del b
+    gc.collect()  # el estado de la sesión se libera: la referencia también
+    assert registro.sesiones("v1") == 0
+
+
+def test_solo_se_expulsan_versiones_sin_sesiones(memorias):
+    *caches, resultados = memorias
+    registro = DatasetRegistry(caches, resultados, max_bytes=10 ** 9)
+    for version in ("v1", "v2", "v3"):
+        _cargar(caches, resultados, version)
+    en_uso = registro.adquirir("v1")
+    registro.adquirir("v2").liberar()
+    registro.adquirir("v3").liberar()
+    registro.tocar("v2")
+
+    # Presupuesto para dos versiones: sale v3 (la menos usada sin sesiones), no v1 (en uso)
+    registro.max_bytes = registro.nbytes * 2 // 3 + 1
+    registro.recortar()
+    assert "v1" in caches[0] and "v2" in caches[0] and "v3" not in caches[0]
+    assert ("v3", (), "resumen") not in resultados and ("v1", (), "resumen") in resultados
+
+    # Sin presupuesto solo queda la versión en uso, fijada también frente al LRU de cada caché
+    registro.max_bytes = 0
+    registro.recortar()
+    assert [v for v in ("v1", "v2", "v3") if v in caches[1]] == ["v1"]
+    caches[1].max_bytes = 0
+    caches[1].put("v4", np.zeros(10))
+    assert "v1" in caches[1]
+    en_uso.liberar()
+    assert "v1" not in caches[0]
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import resampling
+from resampling import correlacion_remuestreo, diferencia_medias_remuestreo
+
+
+@pytest.fixture
+def registro():
+    rng = np.random.default_rng(2)
+    x = rng.normal(size=200)
+    df = pd.DataFrame({"x": x, "y": 0.6 * x + rng.normal(size=200), "z": rng.normal(size=200)})
+    df.loc[df.index % 5 == 0, "z"] = np.nan
+    return df
+
+
+def test_correlacion_reproducible_con_la_semilla(registro):
+    a = correlacion_remuestreo(registro["x"], registro["y"], n_resamples=500, seed=7)
+    b = correlacion_remuestreo(registro["x"], registro["y"], n_resamples=500, seed=7)
+    c = correlacion_remuestreo(registro["x"], registro["y"], n_resamples=500, seed=8)
+    assert a == b
+    assert a.ic_inferior != c.ic_inferior
+    assert a.r == pytest.approx(registro["x"].corr(registro["y"]))
+    assert a.ic_inferior < a.r < a.ic_superior
+    assert a.p_valor == pytest.approx(1 / 501)  # ninguna permutación llega a la r observada
+
+
+def test_resultado_independiente_de_bloques_y_procesos(registro, monkeypatch):
+    mascara = registro["x"] > 0
+    serie = diferencia_medias_remuestreo(registro, mascara, ["y", "z"], n_resamples=300, seed=3, workers=1)
+    # Bloques más pequeños repartidos en procesos: mismas semillas por bloque, mismo resultado
+    monkeypatch.setattr(resampling, "ELEMENTOS_BLOQUE", 200 * 50)
+    en_pool = diferencia_medias_remuestreo(registro, mascara, ["y", "z"], n_resamples=300, seed=3, workers=2)
+    otra = diferencia_medias_remuestreo(registro, mascara, ["y", "z"], n_resamples=300, seed=3, workers=1)
+    pd.testing.assert_frame_equal(en_pool, otra)
+    pd.testing.assert_series_equal(serie["Diferencia de Medias"], en_pool["Diferencia de Medias"])
+
+
+def test_diferencia_de_medias_observada(registro):
+    mascara = registro["x"] > 0
+    resultado = diferencia_medias_remuestreo(registro, mascara, ["y", "z"], n_resamples=200).set_index("Variable")
+    for variable in ["y", "z"]:
+        esperada = registro.loc[mascara, variable].mean() - registro.loc[~mascara, variable].mean()
+        assert resultado.at[variable, "Diferencia de Medias"] == pytest.approx(esperada)
+    assert resultado.at["y", "P-valor (permutación)"] < 0.01
@@ -0,0 +1,44 @@
+import pandas as pd
+
+from search import TextIndex, tokenizar
+
+
+def test_plurales_en_es():
+    assert tokenizar("infecciones dolores separaciones") == ["INFECCION", "DOLOR", "SEPARACION"]
+
+
+def test_plurales_en_s_tras_consonante():
+    assert tokenizar("fiebres placas tornillos") == ["FIEBRE", "PLACA", "TORNILLO"]
+
+
+def _indice():
+    df = pd.DataFrame({
+        "DIAGNOSIS 1": ["infecciones de herida", "dolores intensos", None, "separaciones de la barra"],
+        "OBSERVATIONS 1": ["sin incidencias", None, "infección leve", "dolor en la placa"],
+    })
+    return TextIndex.from_frame(df)
+
+
+def test_singular_encuentra_plural():
+    indice = _indice()
+    assert indice.buscar("infeccion").tolist() == [0, 2]
+    assert indice.buscar("dolor").tolist() == [1, 3]
+    assert indice.buscar("separacion").tolist() == [3]
+
+
+def test_plural_encuentra_singular():
+    indice = _indice()
+    assert indice.buscar("infecciones").tolist() == [0, 2]
+    assert indice.buscar('"dolores intensos"').tolist() == [1]
+    assert indice.buscar("separación barra").tolist() == [3]
+
+
+def test_prefijo_con_palabra_completa_en_plural():
+    df = pd.DataFrame({"DIAGNOSIS 1": ["dolor antes de la cirugía", "infecciones varias", "placas sueltas",
+                                       "dolor en las placas", "placajes"]})
+    indice = TextIndex.from_frame(df)
+    assert indice.buscar("placas*").tolist() == [2, 3]
+    assert indice.buscar("antes*").tolist() == [0]
+    assert indice.buscar("infecciones*").tolist() == [1]
+    assert indice.buscar('"en las placas*"').tolist() == [3]
+    assert indice.buscar("plac*").tolist() == [2, 3, 4]
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics import fecha_corte, tiempo_hasta_evento
+from survival import duraciones, kaplan_meier
+
+
+def test_kaplan_meier_calculado_a_mano():
+    # t=1: 5 en riesgo, 1 evento -> 0.8; t=2: 4 en riesgo, 1 evento y 1 censura -> 0.6;
+    # t=3: 2 en riesgo, 1 evento -> 0.3; t=4: censura
+    km = kaplan_meier([1, 2, 2, 3, 4], [1, 1, 0, 1, 0])
+    curva = km.curvas
+    assert curva["Tiempo"].tolist() == [1, 2, 3, 4]
+    assert curva["En Riesgo"].tolist() == [5, 4, 2, 1]
+    assert curva["Eventos"].tolist() == [1, 1, 1, 0]
+    np.testing.assert_allclose(curva["Supervivencia"], [0.8, 0.6, 0.3, 0.3])
+
+    # Greenwood en t=3 e intervalo log(-log) al 95%
+    greenwood = 1 / (5 * 4) + 1 / (4 * 3) + 1 / (2 * 1)
+    se = np.sqrt(greenwood) / abs(np.log(0.3))
+    z = 1.959963984540054
+    assert curva["IC Inferior"].iloc[2] == pytest.approx(0.3 ** np.exp(z * se))
+    assert curva["IC Superior"].iloc[2] == pytest.approx(0.3 ** np.exp(-z * se))
+    assert km.resumen["Mediana"].iloc[0] == 3
+    assert km.resumen[["n", "Eventos", "Censurados"]].iloc[0].tolist() == [5, 3, 2]
+
+
+def test_estratos_independientes():
+    km = kaplan_meier([1, 2, 1, 3], [1, 1, 1, 0], estratos=["A", "A", "B", "B"])
+    curvas = km.curvas.set_index(["Estrato", "Tiempo"])["Supervivencia"]
+    assert curvas[("A", 1)] == 0.5 and curvas[("A", 2)] == 0
+    assert curvas[("B", 1)] == 0.5 and curvas[("B", 3)] == 0.5
+
+
+def test_fecha_final_futura_se_censura_en_el_corte():
+    corte = pd.Timestamp("2024-06-30")
+    inicio = pd.Series(pd.to_datetime(["2024-01-01", "2024-01-01", "2024-01-01"]))
+    fin = pd.Series(pd.to_datetime(["2024-03-01", "2025-02-01", None]))
+    dias, evento, validos = duraciones(inicio, fin, corte)
+    assert evento.tolist() == [True, False, False]
+    assert dias.tolist() == [60, 181, 181]
+    assert validos.all()
+
+
+def test_corte_es_el_ultimo_informe_sin_pasar_de_hoy():
+    df = pd.DataFrame({"DATE": pd.to_datetime(["2024-01-10", "2024-06-30"]),
+                       "SURGERY DATE": pd.to_datetime(["2024-02-01", "2025-03-01"]),
+                       "DATE2": pd.to_datetime([None, "2026-01-01"])})
+    assert fecha_corte(df, hoy="2025-01-01") == pd.Timestamp("2024-06-30")
+    assert fecha_corte(df, hoy="2024-05-01") == pd.Timestamp("2024-05-01")
+
+    km = tiempo_hasta_evento(df, "DATE", "SURGERY DATE", fecha_corte(df, hoy="2025-01-01"))
+    assert km.resumen[["n", "Eventos", "Censurados"]].iloc[0].tolist() == [2, 1, 1]
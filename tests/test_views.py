@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from views import RegisterView
+
+
+@pytest.fixture
+def registro():
+    return pd.DataFrame({
+        "COUNTRY": pd.Categorical(["ES", "IT", "ES", "FR", None, "IT"]),
+        "YEAR": [2021, 2022, 2022, 2023, 2023, 2023],
+        "Edad": [10.0, 12.0, np.nan, 15.0, 11.0, 13.0],
+    })
+
+
+def test_filtros_componen_como_pandas(registro):
+    vista = RegisterView(registro)
+    paises = vista.donde(vista.isin("COUNTRY", ["ES", "IT"]))
+    recientes = paises.donde(registro["YEAR"] >= 2022, nombre="recientes")
+    esperado = registro[registro["COUNTRY"].isin(["ES", "IT"]) & (registro["YEAR"] >= 2022)]
+    pd.testing.assert_frame_equal(recientes.materializar(), esperado)
+    assert len(recientes) == 3
+    assert recientes.index.tolist() == [1, 2, 5]
+    pd.testing.assert_series_equal(recientes.con("Edad").materializar(), esperado["Edad"])
+    assert recientes.con(["Edad", "YEAR"]).clave == ("vista", ("recientes",), ("Edad", "YEAR"))
+
+
+def test_interseccion_de_vistas(registro):
+    vista = RegisterView(registro)
+    a = vista.donde(registro["YEAR"] == 2023, nombre="2023")
+    b = vista.donde(registro["Edad"] > 11, nombre="mayores")
+    ambas = a & b
+    assert ambas.index.tolist() == [3, 5]
+    assert ambas.nombres == ("2023", "mayores")
+    assert (vista & a).index.tolist() == [3, 4, 5]
+    assert a.sobre(registro["Edad"]).tolist() == [15.0, 11.0, 13.0]
+    with pytest.raises(ValueError):
+        a & RegisterView(registro.copy())
+
+
+def test_sin_filtros_no_copia(registro):
+    vista = RegisterView(registro)
+    assert vista.materializar() is registro
+    assert len(vista) == len(registro)
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+
+# Vista de un subconjunto del registro: el registro base (compartido, no se copia) y una máscara
+# booleana de filas. Los filtros se componen con & sobre las máscaras y las columnas solo se
+# copian (materializan) cuando un cálculo o un gráfico las necesita.
+class RegisterView:
+    def __init__(self, base, mascara=None, columnas=None, nombres=()):
+        self.base = base
+        self._mascara = mascara  # None = todas las filas
+        self.columnas = columnas  # None = todas; str = una columna (Series)
+        self.nombres = tuple(nombres)  # máscaras aplicadas además de los filtros globales
+
+    @property
+    def mascara(self):
+        if self._mascara is None:
+            return np.ones(len(self.base), dtype=bool)
+        return self._mascara
+
+    def __len__(self):
+        return len(self.base) if self._mascara is None else int(self._mascara.sum())
+
+    @property
+    def index(self):
+        return self.base.index if self._mascara is None else self.base.index[self._mascara]
+
+    # Máscara de "col in valores"; en columnas categóricas se compara sobre los códigos enteros
+    def isin(self, col, valores):
+        serie = self.base[col]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            categorias = np.flatnonzero(serie.cat.categories.isin(valores))
+            return np.isin(serie.cat.codes.to_numpy(), categorias)
+        return serie.isin(valores).to_numpy()
+
+    # Nueva vista con la máscara combinada (AND). nombre identifica la máscara en las claves de caché.
+    def donde(self, mascara, nombre=None):
+        mascara = np.asarray(mascara, dtype=bool)
+        combinada = mascara if self._mascara is None else self._mascara & mascara
+        nombres = self.nombres + ((nombre,) if nombre else ())
+        return RegisterView(self.base, combinada, self.columnas, nombres)
+
+    def __and__(self, otra):
+        if otra.base is not self.base:
+            raise ValueError("Solo se pueden combinar vistas del mismo registro")
+        vista = self if otra._mascara is None else self.donde(otra._mascara)
+        return RegisterView(self.base, vista._mascara, self.columnas, self.nombres + otra.nombres)
+
+    # La misma vista limitada a unas columnas (una lista, o un nombre para obtener una Series)
+    def con(self, columnas):
+        return RegisterView(self.base, self._mascara, columnas, self.nombres)
+
+    # Filas de la vista en otro DataFrame alineado con el registro (p. ej. el índice de incidencias)
+    def sobre(self, marco):
+        return marco if self._mascara is None else marco[self._mascara]
+
+    def materializar(self):
+        if isinstance(self.columnas, str):
+            datos = self.base[self.columnas]
+        elif self.columnas is not None:
+            datos = self.base[[c for c in self.columnas if c in self.base.columns]]
+        else:
+            datos = self.base
+        return datos if self._mascara is None else datos[self._mascara]
+
+    # Identificación de la vista en las claves de caché (la versión y los filtros globales van aparte)
+    @property
+    def clave(self):
+        columnas = tuple(self.columnas) if isinstance(self.columnas, list) else self.columnas
+        return ("vista", self.nombres, columnas)